@@ -0,0 +1,141 @@
+"""
+Offline fixtures shared by the benchmarks: a HexoApi whose resource schema is
+loaded from a temporary stash file, and canned requests.Response objects.
+"""
+
+import json
+import os
+import pickle
+import sys
+import tempfile
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import hexoskin.client  # noqa: E402
+
+BASE_URL = "http://127.0.0.1:8000"
+API_ROOT = "/api/v1/"
+RESOURCES = (
+    "account",
+    "activitytype",
+    "annotation",
+    "bundle",
+    "client",
+    "data",
+    "datafilter",
+    "datatype",
+    "device",
+    "healthprofile",
+    "metric",
+    "organization",
+    "oauthclient",
+    "oxygenconsumption",
+    "profileimage",
+    "range",
+    "record",
+    "report",
+    "study",
+    "timezone",
+    "trainingroutine",
+    "unit",
+    "user",
+    "userprofile",
+)
+
+
+def _field(type_="string", related_type=None, related_schema=None):
+    field = {"type": type_, "nullable": True, "readonly": False}
+    if related_type:
+        field["related_type"] = related_type
+        field["related_schema"] = related_schema
+    return field
+
+
+def resource_conf():
+    """A resource schema shaped like the one served by the Hexoskin API."""
+    conf = {}
+    for name in RESOURCES:
+        fields = {
+            "id": _field("integer"),
+            "resource_uri": _field(),
+            "name": _field(),
+            "start": _field("integer"),
+            "end": _field("integer"),
+            "status": _field(),
+            "rank": _field("integer"),
+            "context": _field("dict"),
+            "note": _field(),
+            "dataset": _field("list"),
+            "last_modified": _field("datetime"),
+        }
+        if name != "user":
+            fields["user"] = _field("related", "to_one", "%suser/schema/" % API_ROOT)
+            fields["record"] = _field(
+                "related", "to_one", "%srecord/schema/" % API_ROOT
+            )
+        conf[name] = {
+            "allowed_detail_http_methods": ["get", "put", "patch", "delete"],
+            "allowed_list_http_methods": ["get", "post", "patch"],
+            "fields": fields,
+            "filtering": {"user": 2, "start": 1, "end": 1, "last_modified": 1},
+            "list_endpoint": "%s%s/" % (API_ROOT, name),
+            "schema": "%s%s/schema/" % (API_ROOT, name),
+            "name": name,
+        }
+    return conf
+
+
+def make_api(base_url=BASE_URL, **kwargs):
+    """A HexoApi loading resource_conf() from a stash file, without network."""
+    fd, path = tempfile.mkstemp(prefix="hexoskin_bench_stash_")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(resource_conf(), f)
+    api = hexoskin.client.HexoApi(
+        "key", "secret", auth="user@example.com:pass", base_url=base_url, **kwargs
+    )
+    api._resource_cache = path
+    api.build_resources()
+    return api
+
+
+def make_object(resource, i, n_users=10, n_records=50):
+    user = "%suser/%s/" % (API_ROOT, i % n_users + 1)
+    return {
+        "id": i,
+        "resource_uri": "%s%s/%s/" % (API_ROOT, resource, i),
+        "name": "%s %s" % (resource, i),
+        "start": 400000000000 + i * 256 * 60,
+        "end": 400000000000 + (i + 1) * 256 * 60,
+        "status": "complete",
+        "rank": i % 7,
+        "context": {"activitytype": None, "tags": []},
+        "note": "",
+        "dataset": [],
+        "last_modified": "2024-01-01T00:00:00",
+        "user": user,
+        "record": "%srecord/%s/" % (API_ROOT, i % n_records + 1),
+    }
+
+
+def make_page(resource, n, offset=0, total_count=None, next_url=None):
+    return {
+        "meta": {
+            "limit": n,
+            "next": next_url,
+            "offset": offset,
+            "previous": None,
+            "total_count": n if total_count is None else total_count,
+        },
+        "objects": [make_object(resource, offset + i) for i in range(n)],
+    }
+
+
+def make_response(body, url=BASE_URL + API_ROOT, content_type="application/json"):
+    response = requests.models.Response()
+    response.status_code = 200
+    response._content = body if isinstance(body, bytes) else json.dumps(body).encode()
+    response.headers["content-type"] = content_type
+    response.url = url
+    return response
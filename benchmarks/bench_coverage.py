@@ -0,0 +1,59 @@
+"""
+Time the coverage analysis of 24 hours of 256 Hz data with gaps, in 1 hour
+chunks, against a plain Python loop over the points.
+
+    python benchmarks/bench_coverage.py
+"""
+
+import time
+
+import _fixtures  # noqa: F401, puts the repository on sys.path
+import numpy
+
+from hexoskin.coverage import CoverageAnalyzer
+
+
+def python_gaps(points, period, gap_factor=2.0):
+    gaps = []
+    previous = None
+    for ts, _ in points:
+        if previous is not None and ts - previous > period * gap_factor:
+            gaps.append((previous + period, ts))
+        previous = ts
+    return gaps
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print("%-28s %8.1f ms" % (label, (time.perf_counter() - start) * 1e3))
+    return result
+
+
+def main(hours=24, rate=256):
+    timestamps = numpy.arange(hours * 3600 * rate, dtype=numpy.int64)
+    # A 1 minute gap every 10 minutes.
+    timestamps = timestamps[timestamps % (600 * rate) >= 60 * rate]
+    values = numpy.zeros(len(timestamps), dtype=numpy.int16)
+    chunk = 3600 * rate
+
+    points = [[int(t), 0] for t in timestamps[:chunk]]
+    timed("python loop, 1 h of pairs", lambda: python_gaps(points, 1))
+
+    def analyze(chunks):
+        analyzer = CoverageAnalyzer(rate, 0, hours * 3600 * rate)
+        for points in chunks:
+            analyzer.add_points(4, points)
+        return analyzer.report()
+
+    timed("analyzer, 1 h of pairs", lambda: analyze([points]))
+    arrays = [
+        (timestamps[i : i + chunk], values[i : i + chunk])
+        for i in range(0, len(timestamps), chunk)
+    ]
+    report = timed("analyzer, %s h of arrays" % hours, lambda: analyze(arrays))
+    print(report[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Time the downsampling of 6 hours of 256 Hz data to 2000 points, against a
+plain Python min/max loop.
+
+    python benchmarks/bench_downsample.py
+"""
+
+import time
+
+import _fixtures  # noqa: F401, puts the repository on sys.path
+import numpy
+
+from hexoskin.downsample import Downsampler, downsample
+from hexoskin.series import CompactSeries
+
+
+def python_minmax(points, n):
+    start, end = points[0][0], points[-1][0] + 1
+    buckets = {}
+    for ts, value in points:
+        b = (ts - start) * (n // 2) // (end - start)
+        lo, hi = buckets.get(b, ((ts, value), (ts, value)))
+        buckets[b] = (
+            min(lo, (ts, value), key=lambda p: p[1]),
+            max(hi, (ts, value), key=lambda p: p[1]),
+        )
+    return [p for b in sorted(buckets) for p in sorted(set(buckets[b]))]
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print("%-28s %8.1f ms" % (label, (time.perf_counter() - start) * 1e3))
+    return result
+
+
+def main(seconds=6 * 3600, rate=256, n=2000):
+    timestamps = numpy.arange(seconds * rate, dtype=numpy.int64)
+    values = (numpy.sin(timestamps / 300) * 2000).astype(numpy.int16)
+    points = [[int(t), int(v)] for t, v in zip(timestamps, values)]
+
+    timed("python minmax, pairs", lambda: python_minmax(points, n))
+    timed("minmax, pairs", lambda: downsample(points, n))
+    series = CompactSeries.from_points(points)
+    timed("minmax, CompactSeries", lambda: downsample(series, n))
+    for method in ("minmax", "mean", "lttb"):
+        timed(
+            "%s, arrays" % method, lambda: downsample((timestamps, values), n, method)
+        )
+
+    def chunked():
+        sampler = Downsampler(n, 0, len(timestamps), "lttb")
+        for i in range(0, len(timestamps), 3600 * rate):
+            sampler.add((timestamps[i : i + 3600 * rate], values[i : i + 3600 * rate]))
+        return sampler.result()
+
+    timed("lttb, 1 h chunks", chunked)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Measure the memory held by the object cache after parsing `range` pages.
+
+    python benchmarks/bench_memory.py
+"""
+
+import gc
+import json
+import tracemalloc
+
+from _fixtures import make_api, make_page, make_response
+
+import hexoskin.client
+
+
+def main(n_pages=50, page_size=1000):
+    api = make_api()
+    # The bodies are decoded once up front so only the parsed objects count.
+    pages = [
+        make_response(make_page("range", page_size, offset=i * page_size))
+        for i in range(n_pages)
+    ]
+    for page in pages:
+        body = json.loads(page.content)
+        page.json = lambda body=body: json.loads(json.dumps(body))
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    lists = [hexoskin.client.ApiResourceList(page, api.range) for page in pages]
+    del lists
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    n_objects = len(api._object_cache._objects)
+    print(
+        "object cache: %s instances, %.1f MiB, %.0f bytes/instance"
+        % (n_objects, (after - before) / 2**20, (after - before) / n_objects)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Measure the pickled size and the dumps + loads time of results sent to
+multiprocessing workers.
+
+    python benchmarks/bench_pickle.py
+"""
+
+import pickle
+import time
+
+from _fixtures import make_api, make_page, make_response
+
+import hexoskin.client
+
+
+def measure(label, obj, protocol=pickle.HIGHEST_PROTOCOL):
+    start = time.perf_counter()
+    buffers = []
+    body = pickle.dumps(obj, protocol, buffer_callback=buffers.append)
+    pickle.loads(body, buffers=buffers)
+    elapsed = time.perf_counter() - start
+    size = len(body) + sum(memoryview(b).nbytes for b in buffers)
+    print(
+        "%-32s %8.2f MiB, %3s out-of-band buffers %8.1f ms"
+        % (label, size / 2**20, len(buffers), elapsed * 1e3)
+    )
+
+
+def main(seconds=3600):
+    api = make_api()
+    resources = hexoskin.client.ApiResourceList(
+        make_response(make_page("range", 1000)), api.range
+    )
+    data = hexoskin.client.ApiDataList(
+        make_response(
+            [
+                {
+                    "user": "/api/v1/user/1/",
+                    "data": {
+                        str(dt): [[ts, ts % 1024] for ts in range(seconds * 256)]
+                        for dt in (4, 19)
+                    },
+                }
+            ]
+        ),
+        api.data,
+    )
+    measure("resource list, 1000 ranges", resources)
+    measure("data list, 2 x 1 h at 256 Hz", data)
+    measure("same, compact", data.compact())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Time the parsing of a 1,000-object `range` page into an ApiResourceList, and
+field reads on its instances, with and without typed instances.
+
+    python benchmarks/bench_resource_list.py
+"""
+
+import timeit
+
+from _fixtures import make_api, make_page, make_response
+
+import hexoskin.client
+
+
+def main(n_objects=1000, repeat=7, number=5):
+    content = make_response(make_page("range", n_objects)).content
+    for typed in (False, True):
+        api = make_api(typed_instances=typed)
+        label = "typed" if typed else "untyped"
+
+        def parse():
+            api.clear_object_cache()
+            # A new response each time, so its body is decoded again.
+            return hexoskin.client.ApiResourceList(make_response(content), api.range)
+
+        best = min(timeit.repeat(parse, repeat=repeat, number=number)) / number
+        print(
+            "ApiResourceList, %s objects, %s: %.2f ms/page, %.1f us/object"
+            % (n_objects, label, best * 1e3, best * 1e6 / n_objects)
+        )
+
+        instances = list(parse())
+
+        def read():
+            for r in instances:
+                r.start
+                r.end
+                r.name
+                r.user
+
+        best = min(timeit.repeat(read, repeat=repeat, number=number)) / number
+        print("4 field reads, %s: %.0f ns/read" % (label, best * 1e9 / (4 * n_objects)))
+
+
+if __name__ == "__main__":
+    main()
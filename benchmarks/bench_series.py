@@ -0,0 +1,61 @@
+"""
+Compare the memory and serialized size of decoded data points with the same
+points in a CompactSeries.
+
+    python benchmarks/bench_series.py
+"""
+
+import gc
+import json
+import pickle
+import tracemalloc
+
+from _fixtures import make_api, make_response
+
+import hexoskin.client
+from hexoskin.series import CompactSeries
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return obj, size
+
+
+def main(seconds=3600, rate=256):
+    # One hour of ECG-like data with a gap, timestamps at 256 Hz.
+    body = json.dumps(
+        [
+            [ts, ts * 37 % 4096 - 2048]
+            for ts in range(seconds * rate)
+            if not 600 * rate <= ts < 660 * rate
+        ]
+    ).encode()
+
+    points, points_size = measure(lambda: json.loads(body))
+    series, series_size = measure(lambda: CompactSeries.from_points(points))
+    assert list(series) == [tuple(p) for p in points]
+
+    pickled = len(pickle.dumps(points, protocol=pickle.HIGHEST_PROTOCOL))
+    compact = len(series.to_bytes())
+    print("%s points, %s segments" % (len(series), len(series.segments)))
+    print(
+        "memory:  list %.1f MiB, compact %.2f MiB (%.0fx)"
+        % (points_size / 2**20, series_size / 2**20, points_size / series_size)
+    )
+    print(
+        "on disk: json %.1f MiB, pickle %.1f MiB, compact %.2f MiB (%.0fx)"
+        % (len(body) / 2**20, pickled / 2**20, compact / 2**20, pickled / compact)
+    )
+
+    flat = hexoskin.client.ApiFlatDataList(make_response(body), make_api().data)
+    assert flat.compact() == series
+
+
+if __name__ == "__main__":
+    main()
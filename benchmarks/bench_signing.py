@@ -0,0 +1,45 @@
+"""
+Requests per second the request signers can sign.
+
+    python benchmarks/bench_signing.py
+"""
+
+import timeit
+
+import _fixtures  # noqa: F401
+import requests
+
+import hexoskin.client
+
+
+def rate(auth, request, number=20000):
+    best = min(timeit.repeat(lambda: auth(request), repeat=5, number=number))
+    return number / best
+
+
+def main():
+    request = requests.Request(
+        "GET",
+        "https://api.hexoskin.com/api/v1/range/",
+        params={"user": 123, "start__gte": 400000000000, "limit": 100},
+    ).prepare()
+    signers = {
+        "HexoAuth": hexoskin.client.HexoAuth(
+            "key", "secret", "user@example.com:password"
+        ),
+        "OAuth1Token": hexoskin.client.OAuth1Token(
+            "key", "secret", oauth_token="token", oauth_token_secret="token secret"
+        ),
+        "OAuth2Token": hexoskin.client.OAuth2Token(
+            "key", "secret", access_token="token"
+        ),
+    }
+    for name, auth in signers.items():
+        try:
+            print("%-12s %10.0f requests/s" % (name, rate(auth, request)))
+        except Exception as e:
+            print("%-12s failed: %r" % (name, e))
+
+
+if __name__ == "__main__":
+    main()
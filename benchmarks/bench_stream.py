@@ -0,0 +1,77 @@
+"""
+Measure the peak memory and time of decoding a large `data` response with
+response.json(), as list() does, and with the incremental parser of
+stream(), from a canned body.
+
+    python benchmarks/bench_stream.py
+"""
+
+import gc
+import io
+import time
+import tracemalloc
+
+import requests
+from _fixtures import make_api, make_response
+
+import hexoskin.client
+
+
+def measure(label, func):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        "%-12s %8.1f ms, peak %7.1f MiB, held %7.1f MiB"
+        % (label, elapsed * 1e3, peak / 2**20, held / 2**20)
+    )
+    return result
+
+
+def streamed_response(content):
+    """A response reading `content` as it would from the network."""
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "application/json"
+    response.raw = io.BytesIO(content)
+    return response
+
+
+def main(seconds=1800, rate=256):
+    api = make_api()
+    content = make_response(
+        [
+            {
+                "user": "/api/v1/user/1/",
+                "data": {
+                    str(dt): [[ts, ts % 1024] for ts in range(seconds * rate)]
+                    for dt in (4, 19)
+                },
+            }
+        ]
+    ).content
+    print("body: %.1f MiB" % (len(content) / 2**20))
+
+    def parse(stream):
+        if stream:
+            response = streamed_response(content)
+            api._decode_data_stream(response)
+        else:
+            response = make_response(content)
+        return hexoskin.client.ApiDataList(response, api.data)
+
+    measure("json()", lambda: parse(False))
+    measure("stream", lambda: parse(True))
+    for label, stream in (("json()", False), ("stream", True)):
+        start = time.perf_counter()
+        parse(stream)
+        elapsed = time.perf_counter() - start
+        print("%-12s %8.1f ms without tracemalloc" % (label, elapsed * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+A local stand-in for the Hexoskin API, good enough to exercise the client
+without network access.
+
+    server = FakeHexoskinServer(n_objects=5000, latency=0.01).start()
+    api = hexoskin.client.HexoApi("key", "secret", auth="u:p", base_url=server.url)
+    ...
+    server.stop()
+
+Serves /api/, the resource schemas, paginated meta/objects lists, detail
+objects, `data` responses (JSON, flat JSON, CSV, EDF-like and zip payloads)
+of a configurable size and rate, and accepts POST/PUT/PATCH/DELETE.
+`latency` (seconds) is added to every response and `error_rate` is the
+probability of answering 500 instead.  Data requests for more than
+`max_points` points per datatype get a 504, like a server timing out.
+"""
+
+import csv
+import io
+import json
+import random
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from _fixtures import API_ROOT, make_object, resource_conf
+
+TICKS_PER_SECOND = 256
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping streamed or failed responses aren't worth a traceback.
+        pass
+
+
+class FakeHexoskinServer:
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        n_objects=1000,
+        page_size=20,
+        data_rate=256,
+        latency=0.0,
+        error_rate=0.0,
+        seed=0,
+        max_points=None,
+    ):
+        self.conf = resource_conf()
+        self.n_objects = n_objects
+        self.page_size = page_size
+        self.data_rate = data_rate
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_points = max_points
+        self.random = random.Random(seed)
+        self.requests = []
+        self._httpd = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return "http://%s:%s" % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, "GET")
+
+            def do_POST(self):
+                server._handle(self, "POST")
+
+            def do_PUT(self):
+                server._handle(self, "PUT")
+
+            def do_PATCH(self):
+                server._handle(self, "PATCH")
+
+            def do_DELETE(self):
+                server._handle(self, "DELETE")
+
+        return Handler
+
+    def _handle(self, handler, method):
+        url = urlparse(handler.path)
+        args = {}
+        for k, v in parse_qsl(url.query):
+            # Repeated parameters, eg. datatype__in=4&datatype__in=19.
+            args[k] = "%s,%s" % (args[k], v) if k in args else v
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        self.requests.append((method, handler.path))
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return self._send(handler, 500, {"errors": "Injected error"})
+        try:
+            status, payload, ctype = self._route(
+                method, url.path, args, body, handler.headers.get("Accept", "")
+            )
+        except KeyError:
+            status, payload, ctype = 404, {"errors": "Not found"}, None
+        return self._send(handler, status, payload, ctype)
+
+    def _send(self, handler, status, payload, ctype=None):
+        if isinstance(payload, bytes):
+            content = payload
+        elif isinstance(payload, str):
+            content = payload.encode()
+        else:
+            content = json.dumps(payload).encode()
+            ctype = "application/json"
+        handler.send_response(status)
+        handler.send_header("Content-Type", ctype or "application/json")
+        handler.send_header("Content-Length", str(len(content)))
+        handler.end_headers()
+        handler.wfile.write(content)
+
+    def _route(self, method, path, args, body, accept):
+        if path == "/api/":
+            return 200, self._api_root(), None
+        name, _, rest = path[len(API_ROOT) :].partition("/")
+        conf = self.conf[name]
+        if rest == "schema/":
+            schema = {k: v for k, v in conf.items() if k not in ("name",)}
+            return 200, schema, None
+        if name == "data":
+            return self._data(args, accept)
+        if rest:
+            id = int(rest.strip("/"))
+            if method == "DELETE":
+                return 204, b"", "text/plain"
+            obj = make_object(name, id)
+            if method == "PUT":
+                obj.update(json.loads(body))
+            return 200, obj, None
+        if method == "POST":
+            obj = dict(json.loads(body), id=self.n_objects + 1)
+            obj["resource_uri"] = "%s%s/%s/" % (API_ROOT, name, obj["id"])
+            return 201, obj, None
+        if method == "PATCH":
+            return 202, b"", "text/plain"
+        return 200, self._page(name, args), None
+
+    def _api_root(self):
+        return {
+            name: {"list_endpoint": c["list_endpoint"], "schema": c["schema"]}
+            for name, c in self.conf.items()
+        }
+
+    def _page(self, name, args):
+        limit = int(args.get("limit", self.page_size))
+        offset = int(args.get("offset", 0))
+        ids = range(self.n_objects)
+        if "user" in args and name != "user":
+            # Same user assignment as make_object().
+            ids = [i for i in ids if i % 10 + 1 == int(args["user"])]
+        end = min(offset + limit, len(ids))
+        next_url = None
+        if end < len(ids):
+            query = dict(args, limit=limit, offset=end)
+            next_url = "%s%s/?%s" % (API_ROOT, name, urlencode(query))
+        return {
+            "meta": {
+                "limit": limit,
+                "next": next_url,
+                "offset": offset,
+                "previous": None,
+                "total_count": len(ids),
+            },
+            "objects": [make_object(name, i) for i in ids[offset:end]],
+        }
+
+    def _samples(self, args):
+        start = int(args.get("start", 0))
+        end = int(args.get("end", start + 60 * TICKS_PER_SECOND))
+        step = max(TICKS_PER_SECOND // self.data_rate, 1)
+        datatypes = (args.get("datatype__in") or args.get("datatype") or "4").split(",")
+        return {
+            dt: [[ts, (ts // step) % 1024] for ts in range(start, end, step)]
+            for dt in datatypes
+        }
+
+    def _data(self, args, accept):
+        samples = self._samples(args)
+        if self.max_points and any(len(v) > self.max_points for v in samples.values()):
+            return 504, {"errors": "Gateway timeout"}, None
+        if "text/csv" in accept:
+            out = io.StringIO()
+            writer = csv.writer(out)
+            datatypes = sorted(samples)
+            writer.writerow(["time"] + datatypes)
+            columns = [samples[dt] for dt in datatypes]
+            for row in zip(*columns):
+                writer.writerow([row[0][0]] + [v for _, v in row])
+            return 200, out.getvalue(), "text/csv"
+        if "application/x-edf" in accept:
+            values = [v for dt in samples for _, v in samples[dt]]
+            payload = b"0       " + b" " * 248 + bytes(v % 256 for v in values)
+            return 200, payload, "application/x-edf"
+        if "application/octet-stream" in accept:
+            out = io.BytesIO()
+            with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+                for dt, values in samples.items():
+                    archive.writestr(
+                        "%s.csv" % dt, "\n".join("%s,%s" % (t, v) for t, v in values)
+                    )
+            return 200, out.getvalue(), "application/octet-stream"
+        if args.get("flat"):
+            values = next(iter(samples.values()))
+            if args.get("no_timestamps"):
+                values = [v for _, v in values]
+            return 200, values, None
+        user = "%suser/%s/" % (API_ROOT, args.get("user", 1))
+        return 200, [{"user": user, "data": samples}], None
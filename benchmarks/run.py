@@ -0,0 +1,218 @@
+"""
+Offline benchmark suite for the parsing and paging hot paths.
+
+    python benchmarks/run.py                      # run everything
+    python benchmarks/run.py -k parse -k data     # only matching benchmarks
+    python benchmarks/run.py --save before.json
+    python benchmarks/run.py --compare before.json
+
+Every benchmark talks to a FakeHexoskinServer on localhost, or parses canned
+responses.  Results are the best and median seconds per run over `--repeat`
+runs; --save writes them with the Python version and git revision, and
+--compare prints the ratio against a saved run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _fixtures import make_api, make_page, make_response
+from fake_server import FakeHexoskinServer
+
+import hexoskin.client
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def fresh(response):
+    """A copy of a canned response, so the JSON body is decoded again."""
+    return make_response(
+        response.content, response.url, response.headers["content-type"]
+    )
+
+
+@benchmark
+def build_resources_fetch(ctx):
+    # Includes the 0.1 s pause between schema requests.
+    api = hexoskin.client.HexoApi("key", "secret", auth="u:p", base_url=ctx.url)
+    api._resource_cache = None
+    api.build_resources()
+
+
+@benchmark
+def build_resources_stash(ctx):
+    api = hexoskin.client.HexoApi("key", "secret", auth="u:p", base_url=ctx.url)
+    api._resource_cache = ctx.stash
+    api.build_resources()
+
+
+@benchmark
+def parse_resource_list_1000(ctx):
+    ctx.api.clear_object_cache()
+    hexoskin.client.ApiResourceList(fresh(ctx.page_1000), ctx.api.range)
+
+
+@benchmark
+def parse_resource_list_1000_cached(ctx):
+    # Every related object is already in the object cache.
+    hexoskin.client.ApiResourceList(fresh(ctx.page_1000), ctx.api.range)
+
+
+@benchmark
+def iter_all(ctx):
+    ctx.api.clear_object_cache()
+    for _ in ctx.api.range.list(limit=100).iter_all():
+        pass
+
+
+@benchmark
+def prefetch_all(ctx):
+    ctx.api.clear_object_cache()
+    ctx.api.range.list(limit=100).prefetch_all()
+
+
+@benchmark
+def data_list_decode(ctx):
+    hexoskin.client.ApiDataList(fresh(ctx.data_response), ctx.api.data)
+
+
+@benchmark
+def data_list_fetch(ctx):
+    ctx.api.data.list(start=0, end=600 * 256, datatype__in=(4, 19))
+
+
+@benchmark
+def flat_data_fetch(ctx):
+    ctx.api.data.list(start=0, end=600 * 256, datatype=4, flat=1)
+
+
+@benchmark
+def data_csv_fetch(ctx):
+    ctx.api.data.list(
+        {"start": 0, "end": 600 * 256, "datatype__in": (4, 19)}, "text/csv"
+    )
+
+
+@benchmark
+def data_edf_fetch(ctx):
+    ctx.api.data.list(
+        {"start": 0, "end": 600 * 256, "datatype__in": (4, 19)}, "application/x-edf"
+    )
+
+
+@benchmark
+def object_cache_get_set(ctx):
+    cache = ctx.api._object_cache
+    for inst in ctx.instances:
+        cache.set(inst)
+    for inst in ctx.instances:
+        cache.get(inst.fields["resource_uri"])
+
+
+class Context:
+    def __init__(self, server):
+        self.url = server.url
+        self.api = make_api(base_url=server.url)
+        self.stash = self.api._resource_cache
+        self.page_1000 = make_response(make_page("range", 1000))
+        self.data_response = make_response(
+            [
+                {
+                    "user": "/api/v1/user/1/",
+                    "data": {
+                        str(dt): [[ts, ts % 1024] for ts in range(0, 256 * 600)]
+                        for dt in (4, 19)
+                    },
+                }
+            ]
+        )
+        self.instances = list(
+            hexoskin.client.ApiResourceList(fresh(self.page_1000), self.api.range)
+        )
+
+
+def run(names, repeat):
+    results = {}
+    with FakeHexoskinServer(n_objects=1000, page_size=100, data_rate=256) as server:
+        ctx = Context(server)
+        for name in names:
+            func = BENCHMARKS[name]
+            func(ctx)  # warm up
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func(ctx)
+                times.append(time.perf_counter() - start)
+            results[name] = {"best": min(times), "median": statistics.median(times)}
+            print(
+                "%-34s best %9.2f ms   median %9.2f ms"
+                % (name, results[name]["best"] * 1e3, results[name]["median"] * 1e3)
+            )
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__),
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, path):
+    with open(path) as f:
+        baseline = json.load(f)["results"]
+    print("\nCompared with %s (new/old, lower is better):" % path)
+    for name, r in results.items():
+        if name in baseline:
+            print("%-34s %6.2fx" % (name, r["best"] / baseline[name]["best"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", action="append", default=[], help="name filter")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file written by --save")
+    args = parser.parse_args(argv)
+
+    names = [n for n in BENCHMARKS if not args.k or any(k in n for k in args.k)]
+    stash_prefix = hexoskin.client.CACHED_API_RESOURCE_LIST
+    hexoskin.client.CACHED_API_RESOURCE_LIST = os.path.join(tempfile.mkdtemp(), "stash")
+    try:
+        results = run(names, args.repeat)
+    finally:
+        hexoskin.client.CACHED_API_RESOURCE_LIST = stash_prefix
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "revision": git_revision(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Learns, per datatype, how many seconds of data a single `data` request can
+return in reasonable time.  Every ApiHelper has one, `api.chunk_sizer`,
+used by ApiResourceAccessor.iter_chunks().
+"""
+
+from __future__ import annotations
+
+import threading
+
+
+class AdaptiveChunkSizer:
+    """
+    Spans are in seconds.  A span grows by `grow` after a response taking
+    less than half of `target_seconds`, is scaled down towards the target
+    after a slower one.  After a failure it goes back to the last span that
+    worked, or is multiplied by `shrink`, then grows by bisection towards
+    the failed span, staying below it until `probe_after` requests of the
+    datatype succeeded.  A request with several datatypes uses the smallest
+    of their spans.
+
+    Args:
+        initial (): span of a datatype not seen yet
+        min_span (): smallest span, in seconds
+        max_span (): largest span, in seconds
+        target_seconds (): wanted duration of a request
+        grow (): growth factor after a fast response
+        shrink (): reduction factor after a failure
+        probe_after (): successes before trying a span that failed again
+    """
+
+    def __init__(
+        self,
+        initial=3600,
+        min_span=10,
+        max_span=7 * 86400,
+        target_seconds=5.0,
+        grow=2.0,
+        shrink=0.5,
+        probe_after=100,
+    ):
+        self.initial = initial
+        self.min_span = min_span
+        self.max_span = max_span
+        self.target_seconds = target_seconds
+        self.grow = grow
+        self.shrink = shrink
+        self.probe_after = probe_after
+        self.spans = {}
+        # datatype -> [failed span, successes since]
+        self._ceilings = {}
+        # datatype -> last span that worked
+        self._good = {}
+        self._lock = threading.Lock()
+
+    def span(self, datatypes):
+        with self._lock:
+            return min(self.spans.get(dt, self.initial) for dt in datatypes or (None,))
+
+    def success(self, datatypes, span, elapsed):
+        """Records that a request of `span` seconds took `elapsed` seconds."""
+        if elapsed <= self.target_seconds / 2:
+            new = self._clamp(span * self.grow)
+        elif elapsed > self.target_seconds:
+            new = self._clamp(span * self.target_seconds / elapsed)
+        else:
+            new = span
+        with self._lock:
+            for dt in datatypes or (None,):
+                self._good[dt] = span
+                dt_new = new
+                ceiling = self._ceilings.get(dt)
+                if ceiling is not None:
+                    ceiling[1] += 1
+                    if ceiling[1] >= self.probe_after:
+                        del self._ceilings[dt]
+                    elif dt_new >= ceiling[0]:
+                        # Bisect between the span that worked and the one
+                        # that failed.
+                        if ceiling[0] > span * 1.1:
+                            dt_new = (span + ceiling[0]) / 2
+                        else:
+                            dt_new = span
+                current = self.spans.get(dt, self.initial)
+                # A datatype limited by another one in the same request keeps
+                # its larger span after a fast response.
+                if dt_new >= span:
+                    self.spans[dt] = max(current, dt_new)
+                else:
+                    self.spans[dt] = min(current, dt_new)
+
+    def failure(self, datatypes, span):
+        """Records that a request of `span` seconds failed, returns the new span."""
+        with self._lock:
+            for dt in datatypes or (None,):
+                # Back to the last span that worked when probing above it.
+                good = self._good.pop(dt, None)
+                if good is not None and good < span:
+                    new = good
+                else:
+                    new = self._clamp(span * self.shrink)
+                self.spans[dt] = min(self.spans.get(dt, self.initial), new)
+                self._ceilings[dt] = [span, 0]
+            return min(self.spans[dt] for dt in datatypes or (None,))
+
+    def _clamp(self, span):
+        return min(max(span, self.min_span), self.max_span)
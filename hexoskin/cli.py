@@ -0,0 +1,209 @@
+"""
+The `hexoskin` command.
+
+    hexoskin export --study 42 --format edf --format csv --datatype 4 -o export/
+    hexoskin export --record 1234 --record 1235 --format zip -j 8
+    hexoskin export --user 99 --start 2024-01-01 --end 2024-02-01 --format csv
+
+Credentials are read from the --api-key, --api-secret and --auth options or
+the HEXOSKIN_API_KEY, HEXOSKIN_API_SECRET and HEXOSKIN_AUTH environment
+variables.  Running the same export command again resumes it, see
+hexoskin.export.StudyExporter; running another one into the same output
+directory needs --replan.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import sys
+
+from .client import HexoApi, OAuth2TokenStore
+from .columnar import COLUMNAR_FORMATS
+from .errors import HttpBadRequest
+from .export import FORMATS, StudyExporter
+from .timestamps import to_ticks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="hexoskin", description=__doc__.split("\n\n")[0]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser(
+        "export",
+        help="download records, ranges, users or a study to files",
+        description="Downloads the data of records, ranges, users or a study. "
+        "Running the same command again only downloads what is missing.",
+    )
+    _add_api_arguments(export)
+    what = export.add_argument_group("what to export")
+    what.add_argument("--record", type=int, action="append", help="record id")
+    what.add_argument("--range", type=int, action="append", help="range id")
+    what.add_argument(
+        "--user", type=int, action="append", help="every record of a user"
+    )
+    what.add_argument("--study", type=int, help="every record of the study members")
+    what.add_argument(
+        "--datatype",
+        type=int,
+        action="append",
+        help="datatype id, for every format but edf",
+    )
+    what.add_argument(
+        "--start", help="timestamp in ticks, or an ISO date/datetime (UTC if naive)"
+    )
+    what.add_argument("--end", help="same as --start")
+    how = export.add_argument_group("how")
+    how.add_argument(
+        "-f",
+        "--format",
+        action="append",
+        choices=sorted(FORMATS) + sorted(COLUMNAR_FORMATS),
+        help="one file per record and format, default edf; parquet and arrow "
+        "write a dataset partitioned by user and record, they need pyarrow",
+    )
+    how.add_argument(
+        "--by-day", action="store_true", help="also partition columnar data by day"
+    )
+    how.add_argument("-o", "--output", default=".", help="output directory")
+    how.add_argument("-j", "--jobs", type=int, default=4, help="parallel downloads")
+    how.add_argument(
+        "--per-user", type=int, default=2, help="parallel downloads for one user"
+    )
+    how.add_argument("--retries", type=int, default=2)
+    how.add_argument(
+        "--replan",
+        action="store_true",
+        help="list the records again instead of reusing the saved plan, "
+        "needed to export other records, formats or options to the same output",
+    )
+    how.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+    export.set_defaults(func=export_command, parser=export)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+def export_command(args):
+    parser = args.parser
+    if not (args.record or args.range or args.user or args.study):
+        parser.error("export needs --record, --range, --user or --study")
+    api = make_api(parser, args)
+    try:
+        start = parse_timestamp(args.start, api.freq)
+        end = parse_timestamp(args.end, api.freq)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        exporter = StudyExporter(
+            api,
+            args.output,
+            formats=args.format or ("edf",),
+            datatypes=args.datatype,
+            start=start,
+            end=end,
+            max_workers=args.jobs,
+            per_user=args.per_user,
+            retries=args.retries,
+            on_progress=None if args.quiet else _print_progress,
+            by_day=args.by_day,
+        )
+    except (ImportError, ValueError) as e:
+        parser.error(str(e))
+    try:
+        exporter.plan(
+            users=args.user,
+            study=args.study,
+            records=args.record,
+            ranges=args.range,
+            replan=args.replan,
+        )
+    except ValueError:
+        # The saved plan was made from other arguments.
+        parser.error(
+            "%s holds the plan of another export: run the same command to "
+            "resume it, or add --replan" % exporter.plan_path
+        )
+    progress = exporter.run()
+    if not args.quiet:
+        if sys.stderr.isatty():
+            sys.stderr.write("\n")
+        print(progress, file=sys.stderr)
+        if progress.failed:
+            print(
+                "Failed units are listed in %s, run the same command again to "
+                "retry them." % exporter.manifest_path,
+                file=sys.stderr,
+            )
+    return 1 if progress.failed else 0
+
+
+def make_api(parser, args):
+    api_key = args.api_key or os.environ.get("HEXOSKIN_API_KEY")
+    api_secret = args.api_secret or os.environ.get("HEXOSKIN_API_SECRET")
+    auth = args.auth or os.environ.get("HEXOSKIN_AUTH")
+    if not (api_key and api_secret and auth):
+        parser.error(
+            "an api key, an api secret and --auth username:password are needed"
+        )
+    base_url = args.base_url or os.environ.get("HEXOSKIN_BASE_URL")
+    if not args.oauth2:
+        return HexoApi(api_key, api_secret, auth=auth, base_url=base_url)
+
+    token_store = OAuth2TokenStore(args.token_store) if args.token_store else None
+    # HexoAuth until the OAuth2 login replaces it, like example.py.
+    api = HexoApi(
+        api_key, api_secret, auth=auth, base_url=base_url, token_store=token_store
+    )
+    try:
+        api.oauth2_get_access_token(*auth.split(":", 1))
+    except HttpBadRequest:
+        # Not a password grant client, like example.py falls back to HexoAuth.
+        api = HexoApi(api_key, api_secret, auth=auth, base_url=base_url)
+    return api
+
+
+def parse_timestamp(value, freq):
+    """Ticks as they are, or an ISO date/datetime converted to ticks."""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        dt = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError("Invalid timestamp: %s" % value) from None
+    return to_ticks(dt, freq, tz=datetime.timezone.utc)
+
+
+def _add_api_arguments(parser):
+    group = parser.add_argument_group("api")
+    group.add_argument("--api-key", help="default $HEXOSKIN_API_KEY")
+    group.add_argument("--api-secret", help="default $HEXOSKIN_API_SECRET")
+    group.add_argument("--auth", help="username:password, default $HEXOSKIN_AUTH")
+    group.add_argument(
+        "--base-url", help="default $HEXOSKIN_BASE_URL or https://api.hexoskin.com"
+    )
+    group.add_argument(
+        "--oauth2", action="store_true", help="log in with an OAuth2 password grant"
+    )
+    group.add_argument(
+        "--token-store", help="file sharing the OAuth2 token between runs"
+    )
+
+
+def _print_progress(progress):
+    if sys.stderr.isatty():
+        sys.stderr.write("\r\033[K%s" % progress)
+        sys.stderr.flush()
+    else:
+        print(progress, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import atexit
 import base64
 import binascii
+import contextlib
+import copyreg
 import csv
 import datetime
 import hashlib
@@ -9,12 +12,19 @@ import hmac
 import json
 import os
 import pickle
+import queue
 import random
 import re
 import struct
 import sys
+import threading
 import time
+import uuid
+import warnings
+import weakref
 from collections import deque
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from hashlib import sha1
 from urllib.parse import parse_qsl, quote, urlparse
 from typing import Any
@@ -22,21 +32,115 @@ from typing import Any
 import requests
 from requests.auth import HTTPBasicAuth
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 from .errors import (
     ApiError,
+    HttpBadGateway,
     HttpBadRequest,
+    HttpClientError,
     HttpError,
     HttpForbidden,
+    HttpGatewayTimeout,
     HttpInternalServerError,
     HttpMethodNotAllowed,
     HttpNotFound,
     HttpNotImplemented,
+    HttpPayloadTooLarge,
+    HttpRequestTimeout,
+    HttpServerError,
+    HttpServiceUnavailable,
     HttpUnauthorized,
     NoAuthentificationMethod,
 )
+from .chunking import AdaptiveChunkSizer
+from .timestamps import to_ticks
+from .transport import RequestsTransport
 
 CACHED_API_RESOURCE_LIST = ".api_stash"
 DEFAULT_CONTENT_TYPE = "application/json"
+URI_CACHE_SIZE = 100000
+
+_URI_RE = re.compile(r"^(.+?)(\d+)/$")
+_UNDECODED = object()
+# {field names: {name: index}}, the field tables shared by every instance
+# whose fields have these names in this order.
+_FIELD_TABLES = {}
+# Every ApiHelper of the process by its id, and the ones given to
+# register_api() by base_url: what unpickled results are bound to.
+_APIS = weakref.WeakValueDictionary()
+_REGISTERED = weakref.WeakValueDictionary()
+
+
+def register_api(api):
+    """
+    Makes `api` the ApiHelper that results and instances of its base_url
+    unpickled in this process use, eg. in a multiprocessing worker.  It is
+    only needed when the process has several ApiHelpers for that base_url,
+    eg. with different credentials.
+    """
+    _REGISTERED[api.base_url] = api
+
+
+def _find_api(base_url, api_id):
+    """
+    The ApiHelper a result pickled from `api_id` binds to: the same one when
+    it exists in this process, eg. for copy.deepcopy(), else the registered
+    one or the only one of `base_url`.  None when there is none yet.
+    """
+    api = _APIS.get(api_id)
+    if api is None:
+        api = _REGISTERED.get(base_url)
+    if api is None:
+        apis = [a for a in list(_APIS.values()) if a.base_url == base_url]
+        if len(apis) > 1:
+            # Binding to one of them could send the requests with the
+            # credentials of another user.
+            raise ApiError(
+                "%s ApiHelpers for %s in this process, choose the one of "
+                "unpickled results with register_api()." % (len(apis), base_url)
+            )
+        api = apis[0] if apis else None
+    return api
+
+
+def _rebind(base_url, name, api_id=None):
+    api = _find_api(base_url, api_id)
+    if api is None:
+        return _UnboundAccessor(base_url, name, api_id)
+    return getattr(api, name)
+
+
+class _UnboundAccessor:
+    """
+    Stands for the accessor of an unpickled result until an ApiHelper for
+    its base_url exists in this process.
+    """
+
+    __slots__ = ("_base_url", "_name", "_api_id", "_accessor")
+
+    def __init__(self, base_url, name, api_id=None):
+        self._base_url = base_url
+        self._name = name
+        self._api_id = api_id
+        self._accessor = None
+
+    def __getattr__(self, attr):
+        if self._accessor is None:
+            api = _find_api(self._base_url, self._api_id)
+            if api is None:
+                raise AttributeError(
+                    "No ApiHelper for %s in this process, needed for '%s'."
+                    % (self._base_url, attr)
+                )
+            self._accessor = getattr(api, self._name)
+        return getattr(self._accessor, attr)
+
+    def __reduce__(self):
+        return _rebind, (self._base_url, self._name, self._api_id)
 
 
 def setattrs(obj: Any, **kwargs: dict[str, Any]) -> None:
@@ -56,6 +160,18 @@ class ApiResourceAccessor:
         self._name = name
         self._conf = conf
         self.api = api
+        # ApiResourceInstance, or its typed subclass, see hexoskin.models.
+        self._instance_class = api._instance_classes.get(name, ApiResourceInstance)
+        # Only these fields are looked at when linking instances.
+        self._to_one_fields = tuple(
+            k
+            for k, f in conf.get("fields", {}).items()
+            if f.get("related_type", None) == "to_one"
+        )
+
+    def __reduce__(self):
+        # Only the name travels, the receiving process has its own ApiHelper.
+        return _rebind, (self.api.base_url, self._name, self.api._api_id)
 
     def list(self, get_args=None, format=None, auth=None, **kwargs):
         self._verify_call("list", "get")
@@ -67,6 +183,131 @@ class ApiResourceAccessor:
         )
         return self._build_response(response)
 
+    def stream(self, get_args=None, auth=None, **kwargs):
+        """
+        list() for `data`, parsing the JSON body as it downloads into a
+        CompactSeries per datatype, without the list of every point, see
+        hexoskin.jsonstream:
+            api.data.stream(record=123, datatype__in=(4, 19))
+        """
+        self._verify_call("list", "get")
+        get_args = dict(get_args or {}, **kwargs)
+        get_args = self.api.convert_instances(get_args)
+        response = self.api.get(
+            self._conf["list_endpoint"],
+            get_args,
+            auth=auth,
+            stream=True,
+            **self._hdrs("application/json"),
+        )
+        self.api._decode_data_stream(response)
+        return self._build_response(response)
+
+    def download(self, fileobj, get_args=None, format=None, auth=None, **kwargs):
+        """
+        Streams the response of a list() call into `fileobj` without keeping
+        it in memory, eg. an EDF export:
+            api.data.download(f, {"record": 123}, "application/x-edf")
+        Returns the number of bytes written.
+        """
+        self._verify_call("list", "get")
+        get_args = dict(get_args or {}, **kwargs)
+        get_args = self.api.convert_instances(get_args)
+        return self.api.download(
+            self._conf["list_endpoint"],
+            fileobj,
+            get_args,
+            auth=auth,
+            **self._hdrs(format),
+        )
+
+    def extract(
+        self, output_dir, get_args=None, members=None, arrays=False, auth=None, **kwargs
+    ):
+        """
+        Requests a zip export and extracts it into `output_dir` as it
+        downloads, see hexoskin.zipstream.extract_zip():
+            api.data.extract("out/", {"record": 123}, members=["ECG_*"])
+        Returns the paths written.
+        """
+        from .zipstream import extract_zip
+
+        self._verify_call("list", "get")
+        get_args = dict(get_args or {}, **kwargs)
+        get_args = self.api.convert_instances(get_args)
+        chunks = self.api.iter_content(
+            self._conf["list_endpoint"],
+            get_args,
+            auth=auth,
+            **self._hdrs("application/octet-stream"),
+        )
+        return extract_zip(chunks, output_dir, members, arrays)
+
+    def iter_chunks(
+        self,
+        start,
+        end,
+        get_args=None,
+        format=None,
+        auth=None,
+        timeout=None,
+        retries=5,
+        **kwargs,
+    ):
+        """
+        Yields the list() results of consecutive windows covering [start, end),
+        eg. for data:
+            for result in api.data.iter_chunks(start, end, record=123, datatype=4):
+                ...
+        The window length is tuned per datatype by api.chunk_sizer as
+        responses come back.  A window failing with a timeout, a 5xx or a 413
+        is shrunk and retried, up to `retries` times in a row.  `timeout`
+        (seconds) is the requests timeout of each call.
+        """
+        self._verify_call("list", "get")
+        get_args = self.api.convert_instances(dict(get_args or {}, **kwargs))
+        datatypes = get_args.get("datatype__in", get_args.get("datatype"))
+        if datatypes is None:
+            datatypes = ()
+        elif isinstance(datatypes, (int, str)):
+            datatypes = tuple(int(d) for d in str(datatypes).split(","))
+        else:
+            datatypes = tuple(int(d) for d in datatypes)
+        sizer = self.api.chunk_sizer
+        freq = self.api.freq
+        request_kwargs = self._hdrs(format)
+        if timeout is not None:
+            request_kwargs["timeout"] = timeout
+        failures = 0
+        while start < end:
+            chunk_end = min(start + max(int(sizer.span(datatypes) * freq), 1), end)
+            span = (chunk_end - start) / freq
+            t0 = time.perf_counter()
+            try:
+                response = self.api.get(
+                    self._conf["list_endpoint"],
+                    dict(get_args, start=start, end=chunk_end),
+                    auth=auth,
+                    **request_kwargs,
+                )
+                result = self._build_response(response)
+            except (
+                HttpServerError,
+                HttpPayloadTooLarge,
+                HttpRequestTimeout,
+                requests.Timeout,
+            ) as e:
+                failures += 1
+                if failures > retries:
+                    raise
+                sizer.failure(datatypes, span)
+                self.api._emit("retry", "get", self._conf["list_endpoint"], failures, e)
+                continue
+            sizer.success(datatypes, span, time.perf_counter() - t0)
+            failures = 0
+            yield result
+            start = chunk_end
+
     def patch(self, new_objects, auth=None, *args, **kwargs):
         self._verify_call("list", "patch")
         return self.api.patch(
@@ -77,6 +318,95 @@ class ApiResourceAccessor:
             **kwargs,
         )
 
+    def bulk_create(self, objects, chunk_size=100, max_workers=4, auth=None, **kwargs):
+        """
+        Create many objects through the list endpoint PATCH instead of one
+        POST per object.
+        Args:
+            objects (): iterable of dicts, as accepted by create()
+            chunk_size (): number of objects sent per PATCH request
+            max_workers (): number of chunks sent concurrently
+        Returns:
+            ApiBulkResult
+        """
+        self._verify_call("list", "patch")
+        objects = [self.api.convert_instances(o) for o in objects]
+        return self._bulk_patch(objects, chunk_size, max_workers, auth, **kwargs)
+
+    def bulk_update(
+        self, instances, chunk_size=100, max_workers=4, auth=None, **kwargs
+    ):
+        """
+        Send many modified ApiResourceInstances (or dicts holding a
+        resource_uri) through the list endpoint PATCH.
+        See bulk_create for the arguments.
+        """
+        self._verify_call("list", "patch")
+        objects = []
+        for inst in instances:
+            fields = inst.fields if isinstance(inst, ApiResourceInstance) else inst
+            if not fields.get("resource_uri"):
+                raise ValueError("bulk_update() needs objects with a resource_uri.")
+            objects.append(self.api.convert_instances(fields))
+        return self._bulk_patch(objects, chunk_size, max_workers, auth, **kwargs)
+
+    def _bulk_patch(self, objects, chunk_size, max_workers, auth, **kwargs):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer.")
+        result = ApiBulkResult(len(objects))
+        chunks = range(0, len(objects), chunk_size)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(
+                    self.patch, objects[i : i + chunk_size], auth=auth, **kwargs
+                ): i
+                for i in chunks
+            }
+            # Responses are mapped into the object cache from this thread only.
+            for future in as_completed(futures):
+                start = futures[future]
+                chunk = objects[start : start + chunk_size]
+                try:
+                    response = future.result()
+                except (HttpError, requests.RequestException) as e:
+                    result.errors.append((start, chunk, e))
+                    continue
+                self._bulk_map_response(response, chunk, start, result)
+        return result
+
+    def _bulk_map_response(self, response, chunk, start, result):
+        try:
+            returned = self.api._take_json(response).get("objects") or []
+        except ValueError:
+            # 202 Accepted without always_return_data: the body is empty.
+            returned = []
+        if len(returned) == len(chunk):
+            for i, obj in enumerate(returned):
+                result.objects[start + i] = self.api._object_cache.set(
+                    self._instance_class(obj, self)
+                )
+            return
+        location = response.headers.get("Location")
+        if location and len(chunk) == 1 and not chunk[0].get("resource_uri"):
+            uri = self.api._object_cache._strip_host(location)
+            chunk = [dict(chunk[0], resource_uri=uri)]
+        for i, obj in enumerate(chunk):
+            # Created objects are only known when the server returns them.
+            # Only the sent fields are known, the others are loaded lazily.
+            if obj.get("resource_uri"):
+                result.objects[start + i] = self.api._object_cache.merge(
+                    self._instance_class(dict(obj), self, lazy=True)
+                )
+
+    def write_buffer(self, **kwargs):
+        """
+        Returns an ApiWriteBuffer sending the objects written to it in
+        batches through the list endpoint PATCH.  See ApiWriteBuffer for the
+        arguments.
+        """
+        self._verify_call("list", "patch")
+        return ApiWriteBuffer(self, **kwargs)
+
     def get(self, uri, format=None, auth=None, force_refresh=False):
         self._verify_call("detail", "get")
         if type(uri) is int or self._conf["list_endpoint"] not in uri:
@@ -98,15 +428,14 @@ class ApiResourceAccessor:
         self._verify_call("list", "post")
         data = self.api.convert_instances(data)
         response = self.api.post(self.endpoint, data, auth=auth, *args, **kwargs)
-        if response.json():
-            return self.api._object_cache.set(
-                ApiResourceInstance(response.json(), self)
-            )
+        body = self.api._take_json(response)
+        if body:
+            return self.api._object_cache.set(self._instance_class(body, self))
         else:
             uri = response.headers["Location"]
             rsrc_type, id = self.api.resource_and_id_from_uri(uri)
             return self.api._object_cache.set(
-                ApiResourceInstance({"resource_uri": uri, "id": id}, self, lazy=True)
+                self._instance_class({"resource_uri": uri, "id": id}, self, lazy=True)
             )
 
     @property
@@ -114,26 +443,27 @@ class ApiResourceAccessor:
         return self._conf["list_endpoint"]
 
     def _build_response(self, response):
+        from .series import CompactSeries
+
         ctype = response.headers.get("content-type", "").split(";")[0]
         if ctype == "application/json":
             is_data, is_flat = self._is_data_response(response)
             if is_data:
+                if isinstance(self.api._decode_json(response), CompactSeries):
+                    # A flat response read by stream().
+                    return ApiFlatDataSeries(response, self)
                 if is_flat:
                     return ApiFlatDataList(response, self)
                 else:
                     return ApiDataList(response, self)
             else:
+                body = self.api._decode_json(response)
                 # Lame detection of list results
-                if response.json().get("meta", {}).keys() > {
-                    "limit",
-                    "next",
-                    "previous",
-                }:
+                if body.get("meta", {}).keys() > {"limit", "next", "previous"}:
                     return ApiResourceList(response, self)
                 else:
-                    return self.api._object_cache.set(
-                        ApiResourceInstance(response.json(), self)
-                    )
+                    body = self.api._take_json(response)
+                    return self.api._object_cache.set(self._instance_class(body, self))
         elif ctype == "text/csv":
             return ApiCSVResult(response, self)
         else:
@@ -150,9 +480,13 @@ class ApiResourceAccessor:
             )
 
     def _is_data_response(self, response):
+        from .series import CompactSeries
+
         # TODO: Replace with a reasonable method of determining the response
-        # type.
-        is_data = isinstance(response.json(), (list, str))
+        # type.  A streamed flat response is decoded as a CompactSeries.
+        is_data = isinstance(
+            self.api._decode_json(response), (list, str, CompactSeries)
+        )
         is_flat = oauth_parse_qs(response.url).get("flat", False) if is_data else False
         return is_data, is_flat
 
@@ -166,6 +500,31 @@ class ApiResult:
         self._parent = parent
         self.response = response
 
+    def __reduce_ex__(self, protocol):
+        # The response and the csv reader are left behind, and the parent is
+        # looked up again when unpickled, see register_api().
+        state = dict(self.__dict__, response=None)
+        state.pop("csv", None)
+        items = iter(self) if isinstance(self, (list, deque)) else None
+        return copyreg.__newobj__, (type(self),), state, items
+
+
+class ApiBulkResult:
+    """
+    Outcome of bulk_create()/bulk_update().
+    `objects` follows the order of the input, with None where the server did
+    not return the created object or where its chunk failed.
+    `errors` holds (chunk_start_index, chunk_objects, exception) tuples.
+    """
+
+    def __init__(self, size):
+        self.objects = [None] * size
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
 
 class ApiCSVResult(ApiResult, list):
     def __init__(self, response, parent):
@@ -183,6 +542,20 @@ class ApiBinaryResult(ApiResult, bytearray):
         super(ApiBinaryResult, self).__init__(response, parent)
         bytearray.__init__(self, response.content)
 
+    def __reduce_ex__(self, protocol):
+        # Protocol 5 pickles the content without copying it, out-of-band
+        # with a buffer_callback.  Loading copies it once, into the bytearray.
+        content = pickle.PickleBuffer(self) if protocol >= 5 else bytes(self)
+        state = dict(self.__dict__, response=None)
+        return _binary_result, (type(self), content, state)
+
+
+def _binary_result(cls, content, state):
+    result = cls.__new__(cls)
+    bytearray.__init__(result, content)
+    result.__dict__.update(state)
+    return result
+
 
 class ApiResultList(ApiResult, deque):
     def __init__(self, response, parent):
@@ -190,7 +563,7 @@ class ApiResultList(ApiResult, deque):
         deque.__init__(self, self._make_list(response))
 
     def _make_list(self, response):
-        return map(self._make_list_item, response.json())
+        return map(self._make_list_item, self._parent.api._take_json(response))
 
     def _make_list_item(self, r):
         return r
@@ -200,26 +573,128 @@ class ApiDataList(ApiResultList):
     def _make_list_item(self, r):
         return ApiDataResult(r, self._parent)
 
+    def compact(self, step=None):
+        """Calls ApiDataResult.compact() on every result.  Returns self."""
+        for result in self:
+            result.compact(step)
+        return self
+
+    def to_frame(self, layout="wide", index="ticks"):
+        """
+        pandas DataFrame of the data, see hexoskin.frames.data_frame().
+
+        Args:
+            layout (): "wide", a column per datatype, or "long"
+            index (): "ticks" or "datetime"
+        """
+        from .frames import data_frame
+
+        return data_frame(self, self._parent.api.freq, layout, index)
+
+    def coverage(self, start=None, end=None, **kwargs):
+        """
+        CoverageReports of the data, per user and datatype, see
+        hexoskin.coverage.CoverageAnalyzer for the arguments.
+        """
+        from .coverage import CoverageAnalyzer
+
+        analyzer = CoverageAnalyzer(self._parent.api.freq, start, end, **kwargs)
+        analyzer.add(self)
+        return analyzer.report()
+
 
 class ApiDataResult:
     def __init__(self, row, parent):
+        records = parent.api.record
         self.record = [
-            ApiResourceInstance(r, parent.api.record) for r in row.get("record", [])
+            records._instance_class(r, records) for r in row.get("record", [])
         ]
         self.user = row["user"]
         self.data = {int(d): v for d, v in row["data"].items()}
 
+    def compact(self, step=None):
+        """
+        Replaces the points of every datatype by a CompactSeries, keeping
+        the same (timestamp, value) iteration.  Returns self.
+        """
+        from .series import CompactSeries
+
+        self.data = {
+            d: CompactSeries.from_points(v, step) for d, v in self.data.items()
+        }
+        return self
+
+    def downsample(self, n, method="minmax"):
+        """
+        {datatype: (timestamps, values)} numpy arrays of at most `n` points
+        each, see hexoskin.downsample.
+        """
+        from .downsample import downsample
+
+        return {d: downsample(v, n, method) for d, v in self.data.items()}
+
 
 class ApiFlatDataList(ApiResultList):
     def _make_list(self, response):
-        return response.json()
+        return self._parent.api._take_json(response)
 
+    def compact(self, step=None):
+        """The points as a CompactSeries, see hexoskin.series."""
+        from .series import CompactSeries
+
+        return CompactSeries.from_points(self, step)
+
+    def downsample(self, n, method="minmax"):
+        """(timestamps, values) numpy arrays of at most `n` points."""
+        from .downsample import downsample
+
+        return downsample(self, n, method)
+
+    def to_frame(self, index="ticks"):
+        """pandas DataFrame of a `value` column, indexed by "ticks" or "datetime"."""
+        from .frames import flat_frame
+
+        return flat_frame(self, self._parent.api.freq, index)
+
+
+class ApiFlatDataSeries(ApiResult):
+    """
+    ApiFlatDataList of a streamed response: wraps the CompactSeries parsed
+    from it, as `series`, instead of making a tuple per point.
+    """
 
-class ApiResourceList(ApiResultList):
     def __init__(self, response, parent):
-        super(ApiResourceList, self).__init__(response, parent)
-        self._set_next_prev(response)
+        super(ApiFlatDataSeries, self).__init__(response, parent)
+        self.series = parent.api._take_json(response)
+
+    def __len__(self):
+        return len(self.series)
+
+    def __iter__(self):
+        return iter(self.series)
 
+    def __getitem__(self, i):
+        return self.series[i]
+
+    def __repr__(self):
+        return "<ApiFlatDataSeries %r>" % (self.series,)
+
+    def compact(self, step=None):
+        """The CompactSeries, already parsed with the step it guessed."""
+        return self.series
+
+    def downsample(self, n, method="minmax"):
+        """(timestamps, values) numpy arrays of at most `n` points."""
+        return self.series.downsample(n, method)
+
+    def to_frame(self, index="ticks"):
+        """pandas DataFrame of a `value` column, indexed by "ticks" or "datetime"."""
+        from .frames import flat_frame
+
+        return flat_frame(self.series, self._parent.api.freq, index)
+
+
+class ApiResourceList(ApiResultList):
     def iter_all(self):
         """
         Get a list all the elements of a call through a generator
@@ -227,12 +702,23 @@ class ApiResourceList(ApiResultList):
         memory usage
         """
         i = 0
-        while i < self.response.json()["meta"]["total_count"]:
+        total_count = self.total_count
+        while i < total_count:
             if len(self) == 0:
                 self.load_next()
             i += 1
             yield self.popleft()
 
+    def to_frame(self, fields=None):
+        """
+        pandas DataFrame of the loaded instances, indexed by id, with a typed
+        column per field of the schema, or of `fields`.  Call prefetch_all()
+        first to get every page.
+        """
+        from .frames import resource_frame
+
+        return resource_frame(self, self._parent._conf, fields)
+
     def prefetch_all(self):
         """
         Get a list all the elements of a query.
@@ -250,10 +736,13 @@ class ApiResourceList(ApiResultList):
         return self
 
     def _make_list(self, response):
-        return map(self._make_list_item, response.json()["objects"])
+        body = self._parent.api._take_json(response)
+        self._set_next_prev(body["meta"])
+        return map(self._make_list_item, body["objects"])
 
     def _make_list_item(self, r):
-        return self._parent.api._object_cache.set(ApiResourceInstance(r, self._parent))
+        parent = self._parent
+        return parent.api._object_cache.set(parent._instance_class(r, parent))
 
     def __delitem__(self, key):
         self[key].delete()
@@ -275,7 +764,6 @@ class ApiResourceList(ApiResultList):
 
     def _append_response(self, response, prepend=False):
         try:
-            self._set_next_prev(response)
             if prepend is True:
                 self.extendleft(self._make_list(response))
             else:
@@ -286,69 +774,112 @@ class ApiResourceList(ApiResultList):
                 f"First 64 chars of content: {response.body[:64]}"
             )
 
-    def _set_next_prev(self, response):
-        self.nexturl = response.json()["meta"].get("next", None)
-        self.prevurl = response.json()["meta"].get("prev", None)
+    def _set_next_prev(self, meta):
+        self.nexturl = meta.get("next", None)
+        self.prevurl = meta.get("prev", None)
+        self.total_count = meta.get("total_count")
 
 
 class ApiResourceInstance:
     """Resource to form and access objects of the api
     /api/user/10/ , /api/range/12/, ...
+    Instances have no __dict__.  Their field values are kept in a list, the
+    names in a table shared by the instances with the same fields, see
+    ApiFields.  Setting an existing field changes `fields`, any other
+    attribute is kept on the instance only, in `_attrs`, and never sent to
+    the API.
     """
 
+    __slots__ = ("_table", "_values", "_lazy", "_parent", "_decoded_data", "_attrs")
+
     def __init__(self, obj, parent, lazy=False):
-        self.__dict__["fields"] = {}
-        self._lazy = lazy
-        self._parent = parent
-        self.update_fields(obj)
+        _setattr = object.__setattr__
+        _setattr(self, "_lazy", lazy)
+        _setattr(self, "_parent", parent)
+        _setattr(self, "_decoded_data", _UNDECODED)
+        _setattr(self, "_attrs", None)
+        self._store(obj)
+        self._link_instances()
+
+    def __reduce__(self):
+        return (
+            _new_instance,
+            (self._parent,),
+            (self.fields.copy(), self._lazy, self._parent, self._attrs),
+        )
+
+    def __setstate__(self, state):
+        _setattr = object.__setattr__
+        _setattr(self, "_lazy", state[1])
+        _setattr(self, "_parent", state[2])
+        _setattr(self, "_decoded_data", _UNDECODED)
+        _setattr(self, "_attrs", state[3])
+        self._store(state[0])
+
+    @property
+    def fields(self):
+        """The fields, as a mutable mapping, see ApiFields."""
+        return ApiFields(self)
+
+    @fields.setter
+    def fields(self, obj):
+        self._store(obj)
 
     def update_fields(self, obj):
-        # Skip __setattr__ for this one. Should we derive from
-        # parent._conf.fields instead?
-        self.__dict__["fields"] = obj
+        self._store(obj)
         self._link_instances()
 
+    def _store(self, obj):
+        """Replaces the fields by those of the mapping `obj`."""
+        if type(obj) is ApiFields:
+            table, values = obj._instance._table, list(obj._instance._values)
+        else:
+            table, values = _field_table(tuple(obj)), list(obj.values())
+        # The values first: a reader never gets a name without its value.
+        object.__setattr__(self, "_values", values)
+        object.__setattr__(self, "_table", table)
+
+    def _set_field(self, name, value):
+        i = self._table.get(name)
+        if i is not None:
+            self._values[i] = value
+            return
+        self._values.append(value)
+        object.__setattr__(self, "_table", _field_table(tuple(self._table) + (name,)))
+
+    def _del_field(self, name):
+        i = self._table[name]
+        names = tuple(self._table)
+        values = self._values[:i] + self._values[i + 1 :]
+        object.__setattr__(self, "_values", values)
+        object.__setattr__(self, "_table", _field_table(names[:i] + names[i + 1 :]))
+
     def _link_instances(self):
-        # Loop through the fields populating foreign keys.
-        for k, v in self.fields.items():
-            if (
-                k in self._parent._conf["fields"]
-                and self._parent._conf["fields"][k].get("related_type", None)
-                == "to_one"
-            ):
-                if isinstance(v, dict):
-                    rsrc_type, id = self._parent.api.resource_and_id_from_uri(
-                        v.get("resource_uri", "")
-                    )
-                    if rsrc_type:
-                        self.fields[k] = self._parent.api._object_cache.set(
-                            ApiResourceInstance(v, rsrc_type)
-                        )
-
-                elif isinstance(v, str):
-                    rsrc_type, id = self._parent.api.resource_and_id_from_uri(v)
-                    if rsrc_type:
-                        # Is there already a cached object?
-                        rsrc = self._parent.api._object_cache.get(v)
-                        # If not, create a lazy one.
-                        if not rsrc:
-                            rsrc = self._parent.api._object_cache.set(
-                                ApiResourceInstance(
-                                    {"resource_uri": v, "id": id}, rsrc_type, lazy=True
-                                )
-                            )
-                        self.fields[k] = rsrc
+        # Loop through the relation fields populating foreign keys.
+        table = self._table
+        values = self._values
+        api = self._parent.api
+        for k in self._parent._to_one_fields:
+            i = table.get(k)
+            if i is not None and isinstance(values[i], (dict, str)):
+                values[i] = _link_value(api, values[i])
 
     def __getattr__(self, name):
-        if name in self.fields:
+        if name in ApiResourceInstance.__slots__:
+            # Only reached for a slot that isn't set yet, eg. while unpickling.
+            raise AttributeError(name)
+        if self._attrs and name in self._attrs:
+            return self._attrs[name]
+        i = self._table.get(name)
+        if i is not None:
             # Special case to decode data fields.
             if name == "data":
                 return self._decode_data()
-            return self.fields[name]
+            return self._values[i]
         elif (
             self._lazy
             and name in self._parent._conf["fields"]
-            and "resource_uri" in self.fields
+            and "resource_uri" in self._table
         ):
             self._parent.api.resource_from_uri(self.fields["resource_uri"])
             self._lazy = False
@@ -358,10 +889,20 @@ class ApiResourceInstance:
         )
 
     def __setattr__(self, name, value):
-        if name in self.fields:
-            self.fields[name] = value
+        if name in ApiResourceInstance.__slots__ or name == "fields":
+            object.__setattr__(self, name, value)
+        elif name in self._table:
+            self._set_field(name, value)
         else:
-            super(ApiResourceInstance, self).__setattr__(name, value)
+            if self._attrs is None:
+                object.__setattr__(self, "_attrs", {})
+            self._attrs[name] = value
+
+    def __delattr__(self, name):
+        if self._attrs and name in self._attrs:
+            del self._attrs[name]
+        else:
+            object.__delattr__(self, name)
 
     def __repr__(self):
         # Lame exception for devices.  :(
@@ -383,8 +924,9 @@ class ApiResourceInstance:
             *args,
             **kwargs,
         )
-        if response.json():
-            self.update_fields(response.json().copy())
+        body = self._parent.api._decode_json(response)
+        if body:
+            self.update_fields(body.copy())
         return response
 
     def delete(self, *args, **kwargs):
@@ -393,7 +935,7 @@ class ApiResourceInstance:
         self.fields = {k: None for k in self.fields.keys()}
 
     def _decode_data(self):
-        if not hasattr(self, "_decoded_data"):
+        if self._decoded_data is _UNDECODED:
             self._decoded_data = None
             for fn in (self._decode_binary, self._decode_array):
                 try:
@@ -413,6 +955,93 @@ class ApiResourceInstance:
         ]
 
 
+class ApiFields(MutableMapping):
+    """
+    The fields of an ApiResourceInstance, read and written through.  It is
+    a mapping, not a dict: copy() or dict() gives one, eg. for json.dumps().
+    """
+
+    __slots__ = ("_instance",)
+
+    def __init__(self, instance):
+        self._instance = instance
+
+    def __getitem__(self, name):
+        return self._instance._values[self._instance._table[name]]
+
+    def get(self, name, default=None):
+        i = self._instance._table.get(name)
+        return default if i is None else self._instance._values[i]
+
+    def __contains__(self, name):
+        return name in self._instance._table
+
+    def __iter__(self):
+        return iter(self._instance._table)
+
+    def __len__(self):
+        return len(self._instance._table)
+
+    def __setitem__(self, name, value):
+        self._instance._set_field(name, value)
+
+    def __delitem__(self, name):
+        self._instance._del_field(name)
+
+    def copy(self):
+        return dict(zip(self._instance._table, self._instance._values))
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+
+def _field_table(names):
+    """The shared {name: index} table of the field names `names`, a tuple."""
+    table = _FIELD_TABLES.get(names)
+    if table is None:
+        table = {sys.intern(n) if type(n) is str else n: i for i, n in enumerate(names)}
+        table = _FIELD_TABLES.setdefault(names, table)
+    return table
+
+
+def _link_value(api, v):
+    """
+    The ApiResourceInstance of a related object or resource URI, `v` itself
+    when it isn't one.
+    """
+    if isinstance(v, dict):
+        rsrc_type, id = api.resource_and_id_from_uri(v.get("resource_uri", ""))
+        if rsrc_type:
+            return api._object_cache.set(rsrc_type._instance_class(v, rsrc_type))
+
+    elif isinstance(v, str):
+        rsrc_type, id = api.resource_and_id_from_uri(v)
+        if rsrc_type:
+            # Is there already a cached object?
+            rsrc = api._object_cache.get(v)
+            # If not, create a lazy one.
+            if not rsrc:
+                rsrc = api._object_cache.set(
+                    rsrc_type._instance_class(
+                        {"resource_uri": v, "id": id}, rsrc_type, lazy=True
+                    )
+                )
+            return rsrc
+    return v
+
+
+def _new_instance(parent):
+    """
+    An empty instance of the class of `parent`, for unpickling: a typed one
+    when the ApiHelper of this process has typed instances.
+    """
+    cls = getattr(parent, "_instance_class", ApiResourceInstance)
+    return cls.__new__(cls)
+
+
 class HexoAuth(HTTPBasicAuth):
     """
     Supports BasicAuth and Hexo signatures.
@@ -434,19 +1063,43 @@ class HexoAuth(HTTPBasicAuth):
         else:
             self.username = auth
             self.password = password
+        self._basic_header = None
+        self._signed_secret = None
 
     def __call__(self, request):
-        request = super(HexoAuth, self).__call__(request)
-        ts = int(time.time())
-        digest = hashlib.sha1(
-            ("%s%s%s" % (self.api_secret, ts, request.url)).encode("utf8")
-        ).hexdigest()
+        # The Basic header and the hash state of the secret prefix are only
+        # computed again when the credentials change.
+        if self._basic_header is None or self._basic_header[0] != (
+            self.username,
+            self.password,
+        ):
+            self._basic_header = (
+                (self.username, self.password),
+                _basic_auth_header(self.username, self.password),
+            )
+        if self._signed_secret is None or self._signed_secret[0] != self.api_secret:
+            self._signed_secret = (
+                self.api_secret,
+                hashlib.sha1(("%s" % self.api_secret).encode("utf8")),
+            )
+        ts = str(int(time.time()))
+        digest = self._signed_secret[1].copy()
+        digest.update((ts + request.url).encode("utf8"))
+        request.headers["Authorization"] = self._basic_header[1]
         request.headers["X-HEXOTIMESTAMP"] = ts
         request.headers["X-HEXOAPIKEY"] = self.api_key
-        request.headers["X-HEXOAPISIGNATURE"] = digest
+        request.headers["X-HEXOAPISIGNATURE"] = digest.hexdigest()
         return request
 
 
+def _basic_auth_header(username, password):
+    """
+    The Basic Authorization header value, encoded like HTTPBasicAuth does.
+    """
+    credentials = "%s:%s" % (username, password)
+    return "Basic %s" % base64.b64encode(credentials.encode("latin1")).decode("ascii")
+
+
 class OAuth1Token:
     """
     Basic OAuth1 support in combination with ApiHelper.
@@ -461,6 +1114,7 @@ class OAuth1Token:
         "oauth_authorized_realms",
         "oauth_verifier",
         "oauth_callback_confirmed",
+        "_signing",
     )
 
     _request_keys = (
@@ -480,6 +1134,12 @@ class OAuth1Token:
         self.oauth_consumer_secret = oauth_consumer_secret
         self.set(**kwargs)
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != "_signing":
+            # The precomputed signing parts depend on every oauth_* value.
+            object.__setattr__(self, "_signing", None)
+
     def set(self, **kwargs):
         setattrs(self, **kwargs)
 
@@ -491,21 +1151,33 @@ class OAuth1Token:
             )
         )
 
+    def _signing_parts(self):
+        """
+        The encoded oauth_* values that don't change between requests, and
+        an HMAC-SHA1 keyed with the consumer and token secrets.
+        """
+        if getattr(self, "_signing", None) is None:
+            oauth_vars = self._request_args()
+            token_secret = oauth_vars.pop("oauth_token_secret", "")
+            key = "&".join(
+                oauth_encode(i) for i in [self.oauth_consumer_secret, token_secret]
+            )
+            oauth_vars["oauth_consumer_key"] = self.oauth_consumer_key
+            oauth_vars["oauth_signature_method"] = "HMAC-SHA1"
+            oauth_vars.pop("oauth_nonce", None)
+            oauth_vars.pop("oauth_timestamp", None)
+            self._signing = (
+                {oauth_encode(k): oauth_encode(str(v)) for k, v in oauth_vars.items()},
+                hmac.new(key.encode("utf8"), digestmod=sha1),
+            )
+        return self._signing
+
     def __call__(self, request):
         req_params = oauth_parse_qs(request.url)
-        oauth_vars = self._request_args()
-        token_secret = oauth_vars.pop("oauth_token_secret", "")
-        key = "&".join(
-            oauth_encode(i) for i in [self.oauth_consumer_secret, token_secret]
-        )
-
-        oauth_vars["oauth_consumer_key"] = self.oauth_consumer_key
-        oauth_vars["oauth_signature_method"] = "HMAC-SHA1"
-        oauth_vars["oauth_nonce"] = random.randint(1000000, 9999999)
-        oauth_vars["oauth_timestamp"] = int(time.time())
-        oauth_vars = {
-            oauth_encode(k): oauth_encode(str(v)) for k, v in oauth_vars.items()
-        }
+        static_vars, mac = self._signing_parts()
+        oauth_vars = dict(static_vars)
+        oauth_vars["oauth_nonce"] = str(random.randint(1000000, 9999999))
+        oauth_vars["oauth_timestamp"] = str(int(time.time()))
 
         params = oauth_vars.copy()
         params.pop("realms", None)
@@ -518,8 +1190,10 @@ class OAuth1Token:
             oauth_encode(i) for i in [request.method.upper(), uri, params_str]
         )
 
+        mac = mac.copy()
+        mac.update(base_str.encode("utf8"))
         oauth_vars["oauth_signature"] = oauth_encode(
-            binascii.b2a_base64(hmac.new(key, base_str, sha1).digest())[:-1]
+            binascii.b2a_base64(mac.digest())[:-1]
         )
         request.headers["Authorization"] = "OAuth " + ",".join(
             '%s="%s"' % (k, v) for k, v in oauth_vars.items()
@@ -533,10 +1207,11 @@ class OAuth2Token:
     """
 
     __slots__ = (
+        "_expires_in",
         "_grant_type",
         "access_token",
         "callback_uri",
-        "expires_in",
+        "expires_at",
         "key",
         "refresh_token",
         "response_type",
@@ -546,9 +1221,15 @@ class OAuth2Token:
         "token_type",
     )
 
+    _persisted = ("access_token", "expires_at", "refresh_token", "scope", "token_type")
+
     def __init__(self, key=None, secret=None, **kwargs):
         self.key = key
         self.secret = secret
+        self.access_token = None
+        self.refresh_token = None
+        self.expires_at = None
+        self._expires_in = None
         self.set(**kwargs)
 
     def __call__(self, request):
@@ -562,6 +1243,19 @@ class OAuth2Token:
     def set(self, **kwargs):
         setattrs(self, **kwargs)
 
+    @property
+    def expires_in(self):
+        return self._expires_in
+
+    @expires_in.setter
+    def expires_in(self, val):
+        self._expires_in = val
+        self.expires_at = time.time() + int(val) if val is not None else None
+
+    def expires_soon(self, margin=60):
+        """True when the token expires in less than `margin` seconds."""
+        return self.expires_at is not None and time.time() > self.expires_at - margin
+
     @property
     def grant_type(self):
         return self._grant_type
@@ -577,6 +1271,84 @@ class OAuth2Token:
         self._grant_type = val
 
 
+class OAuth2TokenStore:
+    """
+    Keeps an OAuth2Token in a file so several processes share it instead of
+    each requesting its own.  With a `secret`, the file is encrypted with
+    Fernet, which needs the `cryptography` package; without one it's plain
+    JSON only readable by its owner.
+    """
+
+    def __init__(self, path, secret=None):
+        self.path = path
+        self._fernet = None
+        if secret is not None:
+            try:
+                from cryptography.fernet import Fernet
+            except ImportError as e:
+                raise ImportError(
+                    "Encrypting the token store requires the cryptography package."
+                ) from e
+            key = hashlib.pbkdf2_hmac(
+                "sha256", secret.encode("utf8"), b"hexoskin-token-store", 100000
+            )
+            self._fernet = Fernet(base64.urlsafe_b64encode(key))
+
+    def load(self, api_key):
+        """
+        Returns the stored token of client `api_key`, or None.  A store that
+        can't be decrypted with this secret is treated as empty, with a
+        warning, and replaced on the next save().
+        """
+        try:
+            with open(self.path, "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        if self._fernet is not None:
+            from cryptography.fernet import InvalidToken
+
+            try:
+                content = self._fernet.decrypt(content)
+            except InvalidToken:
+                warnings.warn(
+                    "Token store %s can't be decrypted with this secret, "
+                    "ignoring it." % self.path
+                )
+                return None
+        stored = json.loads(content)
+        if stored.pop("client", None) != api_key:
+            return None
+        token = OAuth2Token(api_key)
+        setattrs(token, **stored)
+        return token
+
+    def save(self, token):
+        stored = {k: getattr(token, k, None) for k in OAuth2Token._persisted}
+        stored["client"] = token.key
+        content = json.dumps(stored).encode("utf8")
+        if self._fernet is not None:
+            content = self._fernet.encrypt(content)
+        tmp = "%s.%s.tmp" % (self.path, os.getpid())
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, self.path)
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Serializes token refreshes between processes."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
 class ApiHelper:
     def __init__(
         self,
@@ -586,6 +1358,9 @@ class ApiHelper:
         auth: str,
         base_url: str,
         verify_ssl: bool = True,
+        transport=None,
+        token_store=None,
+        typed_instances=False,
     ):
         """
         :param api_key: public key
@@ -595,9 +1370,26 @@ class ApiHelper:
                      "username:password"
         :param base_url:
         :param verify_ssl:
+        :param transport: sends the requests, see hexoskin.transport.
+                          Defaults to RequestsTransport()
+        :param token_store: OAuth2TokenStore sharing OAuth2 tokens between
+                            processes
+        :param typed_instances: build instances of classes generated from
+                                the schema, see hexoskin.models
         """
         self.resource_conf = {}
         self.resources = {}
+        self.typed_instances = typed_instances
+        # Resource name -> typed instance class, when typed_instances.
+        self._instance_classes = {}
+        self.hooks = {
+            "before_request": [],
+            "after_request": [],
+            "json_decode": [],
+            "retry": [],
+        }
+        self._endpoint_index = {}
+        self._uri_cache = {}
         self._resource_cache = None
         self._object_cache = ApiObjectCache(self)
 
@@ -607,6 +1399,17 @@ class ApiHelper:
         self.auth = self._create_auth(auth, key=api_key, secret=api_secret)
         self.base_url = self._parse_base_url(base_url)
         self.verify_ssl = verify_ssl
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.token_store = token_store
+        # Seconds before expiry at which OAuth2 tokens are refreshed.
+        self.token_refresh_margin = 60
+        self._token_lock = threading.Lock()
+        # Data request spans learned by ApiResourceAccessor.iter_chunks().
+        self.chunk_sizer = AdaptiveChunkSizer()
+        # Unique across processes, so a copy only rebinds to this ApiHelper
+        # within the process, or a fork, it was made in.
+        self._api_id = uuid.uuid4().hex
+        _APIS[self._api_id] = self
 
         if CACHED_API_RESOURCE_LIST is not None:
             self._resource_cache = (
@@ -632,10 +1435,13 @@ class ApiHelper:
         if name in self.resources:
             return self.resources[name]
         if name in self.resource_conf:
-            self.resources[name] = ApiResourceAccessor(
-                name, self.resource_conf[name], self
-            )
-            return self.resources[name]
+            accessor = ApiResourceAccessor(name, self.resource_conf[name], self)
+            self.resources[name] = accessor
+            if not hasattr(type(self), name) and name not in self.__dict__:
+                # Later lookups are plain attribute reads, without
+                # __getattr__.
+                self.__dict__[name] = accessor
+            return accessor
         else:
             raise AttributeError(f"'{name}' is not a valid API endpoint")
 
@@ -643,26 +1449,57 @@ class ApiHelper:
         if self._resource_cache is not None:
             if os.path.isfile(self._resource_cache):
                 os.remove(self._resource_cache)
+                for name, accessor in self.resources.items():
+                    if self.__dict__.get(name) is accessor:
+                        del self.__dict__[name]
                 self.resources = {}
                 self.resource_conf = {}
+                self._instance_classes = {}
+                self._index_resources()
 
     def clear_object_cache(self):
         self._object_cache.clear()
 
     def build_resources(self):
+        from .models import SPEC_VERSION, build_classes, class_specs
+
+        specs = None
         if self._resource_cache is not None:
             try:
                 with open(self._resource_cache, "rb") as f:
                     self.resource_conf = pickle.load(f)
+                    if self.typed_instances:
+                        # The class specs follow the schema, from the same
+                        # fetch.  Older stashes only have the schema.
+                        try:
+                            version, specs = pickle.load(f)
+                        except (EOFError, pickle.UnpicklingError, ValueError):
+                            version = None
+                        if version != SPEC_VERSION:
+                            specs = None
             except IOError:
                 self._fetch_resource_list()
+                specs = class_specs(self.resource_conf)
                 try:
                     with open(self._resource_cache, "wb+") as f:
                         pickle.dump(self.resource_conf, f)
+                        pickle.dump((SPEC_VERSION, specs), f)
                 except IOError as e:
                     print("Couldn't write to stash file: %s" % e)
         else:
             self._fetch_resource_list()
+        if self.typed_instances:
+            if specs is None:
+                specs = class_specs(self.resource_conf)
+            self._instance_classes = build_classes(specs)
+        self._index_resources()
+
+    def _index_resources(self):
+        """Maps each list_endpoint to its resource name for URI routing."""
+        self._endpoint_index = {
+            r["list_endpoint"]: n for n, r in self.resource_conf.items()
+        }
+        self._uri_cache = {}
 
     def _create_auth(
         self, auth, key=None, secret=None
@@ -689,7 +1526,7 @@ class ApiHelper:
             raise NoAuthentificationMethod()
 
     def _fetch_resource_list(self):
-        resource_list = self.get("/api/").json()
+        resource_list = self._decode_json(self.get("/api/"))
         for n, r in resource_list.items():
             if n in (
                 "import",
@@ -698,7 +1535,7 @@ class ApiHelper:
             ):
                 continue
             try:
-                self.resource_conf[n] = self.get(r["schema"]).json()
+                self.resource_conf[n] = self._decode_json(self.get(r["schema"]))
                 self.resource_conf[n]["list_endpoint"] = r["list_endpoint"]
                 self.resource_conf[n]["name"] = n
             except (HttpNotFound, HttpUnauthorized):
@@ -706,6 +1543,68 @@ class ApiHelper:
                 pass
             time.sleep(0.1)
 
+    def add_hook(self, event, hook):
+        """
+        Registers a callback, called with:
+            before_request: (method, path, params, data)
+            after_request: (method, path, response, elapsed, error), response
+                is None when the request raised `error`
+            json_decode: (response, elapsed)
+            retry: (method, path, attempt, error)
+        """
+        self.hooks[event].append(hook)
+
+    def remove_hook(self, event, hook):
+        self.hooks[event].remove(hook)
+
+    def _emit(self, event, *args):
+        for hook in self.hooks[event]:
+            hook(*args)
+
+    def _decode_json(self, response):
+        """
+        Decodes a JSON response body once; the result is kept on the
+        response and shared by every later call, until _take_json().
+        """
+        try:
+            return response._hexoskin_json
+        except AttributeError:
+            pass
+        if self.hooks["json_decode"]:
+            start = time.perf_counter()
+            body = response.json()
+            self._emit("json_decode", response, time.perf_counter() - start)
+        else:
+            body = response.json()
+        response._hexoskin_json = body
+        return body
+
+    def _take_json(self, response):
+        """
+        Like _decode_json(), for a caller keeping the body, eg. as instance
+        fields: it is no longer kept on the response, a later call decodes
+        it again.
+        """
+        body = self._decode_json(response)
+        del response._hexoskin_json
+        return body
+
+    def _decode_data_stream(self, response, chunk_size=65536):
+        """
+        Decodes the body of a `data` response as it arrives, see
+        hexoskin.jsonstream.  The result is kept on the response like the
+        one of _decode_json().
+        """
+        from .jsonstream import parse_data
+
+        start = time.perf_counter()
+        with response:
+            body = parse_data(response.iter_content(chunk_size))
+        if self.hooks["json_decode"]:
+            self._emit("json_decode", response, time.perf_counter() - start)
+        response._hexoskin_json = body
+        return body
+
     def _parse_base_url(self, base_url: str) -> str:
         parsed = urlparse(base_url)
         if parsed.netloc:
@@ -725,18 +1624,25 @@ class ApiHelper:
     def _inst_arg_repr(self, k, v):
         """
         Converts all ApiResourceInstances into their uri_resource equivilant
-        and dates to hxtimestamps.
+        and dates to hxtimestamps, naive datetimes being in local time.
         """
-        if k in self.resources and type(v) is ApiResourceInstance:
+        if k in self.resources and isinstance(v, ApiResourceInstance):
             return v.resource_uri
         elif isinstance(v, datetime.datetime):
-            return int(time.mktime(v.timetuple())) * 256
+            return to_ticks(v, self.freq)
         return v
 
     def _request(
         self, path, method, data=None, params=None, auth=None, headers=None, **kwargs
     ) -> requests.Response:
         auth = self._create_auth(auth) if auth else self.auth
+        refreshable = (
+            auth is self.auth
+            and isinstance(auth, OAuth2Token)
+            and auth.refresh_token is not None
+        )
+        if refreshable and auth.expires_soon(self.token_refresh_margin):
+            self._refresh_oauth2_token(auth.access_token)
         if params:
             # Make lists or sets comma-separated strings.
             params = {
@@ -756,6 +1662,37 @@ class ApiHelper:
         ):
             data = json.dumps(data)
         kwargs.setdefault("verify", self.verify_ssl)
+        kwargs.update(data=data, params=params, headers=req_headers, auth=auth)
+        access_token = auth.access_token if refreshable else None
+        response = self._send(method, path, url, kwargs)
+        if response.status_code == 401 and refreshable:
+            # The token may have been revoked or expired early: refresh it,
+            # once for every thread that saw it fail, and retry.  A failed
+            # refresh is raised as the cause of the original 401.
+            unauthorized = HttpUnauthorized(response)
+            self._emit("retry", method, path, 1, unauthorized)
+            # Its body is read for the exception, then the connection freed.
+            _ = response.content
+            response.close()
+            try:
+                self._refresh_oauth2_token(access_token)
+            except (HttpError, requests.RequestException, ValueError) as e:
+                raise unauthorized from e
+            response = self._send(method, path, url, kwargs)
+        if response.status_code >= 400:
+            if kwargs.get("stream"):
+                # The error body is kept for the exception, and the
+                # connection released.
+                _ = response.content
+                response.close()
+            self._raise_http_exception(response)
+        return response
+
+    def _send(self, method, path, url, kwargs):
+        if self.hooks["before_request"]:
+            self._emit("before_request", method, path, kwargs["params"], kwargs["data"])
+        timed = bool(self.hooks["after_request"])
+        start = time.perf_counter() if timed else 0
         # response = ApiResponse(
         #     requests.request(
         #         method,
@@ -768,18 +1705,16 @@ class ApiHelper:
         #     ),
         #     method,
         # )
-        response = requests.request(
-            method,
-            url,
-            data=data,
-            params=params,
-            headers=req_headers,
-            auth=auth,
-            **kwargs,
-        )
-        if response.status_code >= 400:
-            # print(response.json())
-            self._raise_http_exception(response)
+        try:
+            response = self.transport.send(method, url, **kwargs)
+        except requests.RequestException as e:
+            if timed:
+                elapsed = time.perf_counter() - start
+                self._emit("after_request", method, path, None, elapsed, e)
+            raise
+        if timed:
+            elapsed = time.perf_counter() - start
+            self._emit("after_request", method, path, response, elapsed, None)
         return response
 
     def post(self, path, data=None, auth=None, headers=None, **kwargs):
@@ -799,6 +1734,24 @@ class ApiHelper:
     def delete(self, path, auth=None, headers=None, **kwargs):
         return self._request(path, "delete", auth=auth, headers=headers, **kwargs)
 
+    def download(
+        self, path, fileobj, data=None, auth=None, headers=None, chunk_size=65536
+    ):
+        """GETs `path` and writes the body to `fileobj` as it arrives."""
+        written = 0
+        for chunk in self.iter_content(path, data, auth, headers, chunk_size):
+            fileobj.write(chunk)
+            written += len(chunk)
+        return written
+
+    def iter_content(self, path, data=None, auth=None, headers=None, chunk_size=65536):
+        """GETs `path` and yields the body in chunks as it arrives."""
+        response = self._request(
+            path, "get", params=data, auth=auth, headers=headers, stream=True
+        )
+        with response:
+            yield from response.iter_content(chunk_size)
+
     def resource_from_uri(self, path):
         if path:
             if path.startswith(self.base_url):
@@ -809,11 +1762,27 @@ class ApiHelper:
         return None
 
     def resource_and_id_from_uri(self, path):
-        base_uri, id = re.match(r"^(.+?)(\d+)/$", path).groups()
-        for k, r in self.resource_conf.items():
-            if r["list_endpoint"] == base_uri:
-                return getattr(self, k), id
-        return None, None
+        try:
+            return self._uri_cache[path]
+        except KeyError:
+            pass
+        if len(self._endpoint_index) != len(self.resource_conf):
+            self._index_resources()
+        # Fast path for ".../<id>/", the regex handles anything else.
+        base_uri, _, id = path[:-1].rpartition("/")
+        if path[-1:] == "/" and id.isdigit() and id.isascii():
+            base_uri += "/"
+        else:
+            match = _URI_RE.match(path)
+            if match is None:
+                return None, None
+            base_uri, id = match.groups()
+        name = self._endpoint_index.get(base_uri)
+        result = (getattr(self, name), id) if name is not None else (None, None)
+        if len(self._uri_cache) >= URI_CACHE_SIZE:
+            self._uri_cache.clear()
+        self._uri_cache[path] = result
+        return result
 
     def _raise_http_exception(self, response):
         if response.status_code == 400:
@@ -830,6 +1799,20 @@ class ApiHelper:
             raise HttpInternalServerError(response)
         if response.status_code == 501:
             raise HttpNotImplemented(response)
+        if response.status_code == 408:
+            raise HttpRequestTimeout(response)
+        if response.status_code == 413:
+            raise HttpPayloadTooLarge(response)
+        if response.status_code == 502:
+            raise HttpBadGateway(response)
+        if response.status_code == 503:
+            raise HttpServiceUnavailable(response)
+        if response.status_code == 504:
+            raise HttpGatewayTimeout(response)
+        if 400 <= response.status_code < 500:
+            raise HttpClientError(response)
+        if 500 <= response.status_code < 600:
+            raise HttpServerError(response)
         raise HttpError(response)
 
     def oauth1_get_request_token_url(self, callback_uri):
@@ -904,6 +1887,22 @@ class ApiHelper:
                 return self.auth
         elif len(args) == 2:
             kwargs.update(zip(("username", "password"), args))
+            if self.token_store is not None:
+                with self.token_store.lock():
+                    token = self.token_store.load(self.api_key)
+                    if token is not None and token.refresh_token is not None:
+                        self.auth = token
+                        if not token.expires_soon(self.token_refresh_margin):
+                            return self.auth
+                        try:
+                            return self.refresh_access_token()
+                        except HttpClientError:
+                            # Revoked refresh token, use the password.
+                            pass
+                    self.auth = OAuth2Token(self.api_key, self.api_secret)
+                    return self._fetch_oauth2_access_token(
+                        grant_type="password", **kwargs
+                    )
             self.auth = OAuth2Token(self.api_key, self.api_secret)
             return self._fetch_oauth2_access_token(grant_type="password", **kwargs)
         else:
@@ -911,14 +1910,43 @@ class ApiHelper:
 
     def _fetch_oauth2_access_token(self, **kwargs):
         basicauth = HTTPBasicAuth(self.api_key, self.api_secret)
-        response = requests.post(
-            "%s/api/connect/oauth2/token/" % self.base_url, data=kwargs, auth=basicauth
+        response = self.transport.send(
+            "post",
+            "%s/api/connect/oauth2/token/" % self.base_url,
+            data=kwargs,
+            auth=basicauth,
         )
         if response.status_code >= 400:
             self._raise_http_exception(response)
         setattrs(self.auth, **response.json())
+        if self.token_store is not None:
+            self.token_store.save(self.auth)
         return self.auth
 
+    def _refresh_oauth2_token(self, stale_access_token):
+        """
+        Refreshes self.auth unless another thread, or another process sharing
+        the token store, already replaced `stale_access_token`.
+        """
+        with self._token_lock:
+            if self.auth.access_token != stale_access_token:
+                return
+            if self.token_store is None:
+                self.refresh_access_token()
+                return
+            with self.token_store.lock():
+                stored = self.token_store.load(self.api_key)
+                if (
+                    stored is not None
+                    and stored.access_token != stale_access_token
+                    and not stored.expires_soon(self.token_refresh_margin)
+                ):
+                    self.auth.set(
+                        **{k: getattr(stored, k) for k in OAuth2Token._persisted}
+                    )
+                else:
+                    self.refresh_access_token()
+
     def refresh_access_token(self, token=None):
         """Refreshes the current OAuth2Token if possible."""
         token = token or self.auth
@@ -933,12 +1961,17 @@ class ApiHelper:
                 "Unable to find a refresh token.  Have you loaded an OAuth2 token yet?"
             )
         basicauth = HTTPBasicAuth(self.api_key, self.api_secret)
-        response = requests.post(
-            "%s/api/connect/oauth2/token/" % self.base_url, data=data, auth=basicauth
+        response = self.transport.send(
+            "post",
+            "%s/api/connect/oauth2/token/" % self.base_url,
+            data=data,
+            auth=basicauth,
         )
         if response.status_code >= 400:
             self._raise_http_exception(response)
         setattrs(self.auth, **response.json())
+        if self.token_store is not None:
+            self.token_store.save(self.auth)
         return self.auth
 
 
@@ -951,6 +1984,9 @@ class HexoApi(ApiHelper):
         auth=None,
         base_url=None,
         verify_ssl=True,
+        transport=None,
+        token_store=None,
+        typed_instances=False,
     ):
         """
         :param api_key: public key
@@ -960,11 +1996,22 @@ class HexoApi(ApiHelper):
                      'username:password"
         :param base_url:
         :param verify_ssl:
+        :param transport: see hexoskin.transport
+        :param token_store: OAuth2TokenStore
+        :param typed_instances: see hexoskin.models
         """
         if base_url is None:
             base_url = "https://api.hexoskin.com"
         return super().__init__(
-            api_key, api_secret, api_version, auth, base_url, verify_ssl
+            api_key,
+            api_secret,
+            api_version,
+            auth,
+            base_url,
+            verify_ssl,
+            transport,
+            token_store,
+            typed_instances,
         )
 
 
@@ -1011,35 +2058,68 @@ class ApiObjectCache:
     def __init__(self, api, ttl=3600):
         self.api = api
         self.ttl = ttl
+        # Lookups are only counted while an ApiInstrumentation is attached,
+        # see hexoskin.metrics.
+        self.counting = 0
+        self.hits = 0
+        self.misses = 0
         self._objects = {}
         self._keys = self._objects.keys()
+        # ApiWriteBuffer threads map their responses into the cache too.
+        self._lock = threading.RLock()
 
     def get(self, uri):
         uri = self._strip_host(uri)
         obj = self._objects.get(uri, None)
-        if obj:
-            if time.time() - obj[0] < self.ttl:
-                return obj[1]
-            else:
-                del self._objects[uri]
-        return None
+        if obj is not None and time.time() - obj[0] >= self.ttl:
+            with self._lock:
+                # Unless another thread replaced it meanwhile.
+                if self._objects.get(uri) is obj:
+                    del self._objects[uri]
+            obj = None
+        if self.counting:
+            with self._lock:
+                if obj is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        return obj[1] if obj is not None else None
 
     def set(self, obj):
         try:
             uri = obj.resource_uri
         except AttributeError:
             return obj
-        if uri in self._objects:
-            self._objects[uri][1].update_fields(obj.fields)
-            return self._objects[uri][1]
-        else:
+        with self._lock:
+            if uri in self._objects:
+                self._objects[uri][1].update_fields(obj.fields)
+                return self._objects[uri][1]
+            else:
+                self._objects[uri] = (time.time(), obj)
+                return obj
+
+    def merge(self, obj):
+        """
+        Like set(), but the fields of `obj` are added to those of the cached
+        instance instead of replacing them, eg. for a partial update.
+        """
+        uri = obj.resource_uri
+        with self._lock:
+            if uri in self._objects:
+                cached = self._objects[uri][1]
+                cached.update_fields(dict(cached.fields, **obj.fields))
+                return cached
             self._objects[uri] = (time.time(), obj)
             return obj
 
-    def clear(self, uri):
-        uri = self._strip_host(uri)
-        if uri in self._objects:
-            del self._objects[uri]
+    def clear(self, uri=None):
+        with self._lock:
+            if uri is None:
+                self._objects.clear()
+                return
+            uri = self._strip_host(uri)
+            if uri in self._objects:
+                del self._objects[uri]
 
     def _strip_host(self, uri):
         if uri.startswith(self.api.base_url):
@@ -1047,6 +2127,161 @@ class ApiObjectCache:
         return uri
 
 
+class ApiWriteBuffer:
+    """
+    Write-behind buffer for an ApiResourceAccessor.
+    write() only queues the object; a background thread sends the queued
+    objects through the list endpoint PATCH once `batch_size` objects are
+    waiting or `flush_interval` seconds after the first one was queued.
+    At most `max_pending` objects are held: write() then blocks (or raises
+    queue.Full when given a timeout) until a batch is sent.
+    Batches failing on a server or connection error, or a 408, are retried
+    `retries` times with an exponential backoff, firing the `retry` hook,
+    then stored in `failed` as (objects, exception) and passed to
+    `on_error` if given.  An exception raised by `on_error` is passed to
+    sys.excepthook and the thread goes on.
+    close() (or leaving the `with` block, or exiting the interpreter) sends
+    everything still queued; write() raises ApiError once close() started.
+    """
+
+    _FLUSH = object()
+    _CLOSE = object()
+
+    def __init__(
+        self,
+        accessor,
+        batch_size=100,
+        flush_interval=1.0,
+        max_pending=10000,
+        retries=3,
+        retry_backoff=0.5,
+        on_error=None,
+        auth=None,
+    ):
+        self._accessor = accessor
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.on_error = on_error
+        self.auth = auth
+        self.failed = []
+        self._closed = False
+        # Orders write() and close(): nothing is queued after _CLOSE.
+        self._close_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(
+            target=self._run, name="hexoskin-write-%s" % accessor._name, daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, obj, block=True, timeout=None):
+        obj = self._accessor.api.convert_instances(obj)
+        with self._close_lock:
+            if self._closed:
+                raise ApiError("Cannot write to a closed ApiWriteBuffer.")
+            self._queue.put(obj, block=block, timeout=timeout)
+
+    def flush(self):
+        """Send everything queued so far and wait for it to be sent."""
+        with self._close_lock:
+            if self._closed:
+                raise ApiError("Cannot flush a closed ApiWriteBuffer.")
+            self._queue.put(self._FLUSH)
+        self._queue.join()
+
+    def close(self):
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(self._CLOSE)
+        atexit.unregister(self.close)
+        self._thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is not None and item is not self._FLUSH and item is not self._CLOSE:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch and (
+                item is None
+                or item is self._FLUSH
+                or item is self._CLOSE
+                or len(batch) >= self.batch_size
+            ):
+                try:
+                    self._send(batch)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                batch = []
+                deadline = None
+            if item is self._FLUSH or item is self._CLOSE:
+                self._queue.task_done()
+            if item is self._CLOSE:
+                return
+
+    def _send(self, batch):
+        """Sends `batch`; never raises, or the thread would stop."""
+        try:
+            error = self._patch(batch)
+        except Exception as e:
+            # Eg. a response body that doesn't map back to the objects.
+            error = e
+        if error is None:
+            return
+        self.failed.append((batch, error))
+        if self.on_error is not None:
+            try:
+                self.on_error(batch, error)
+            except Exception as e:
+                sys.excepthook(type(e), e, e.__traceback__)
+
+    def _patch(self, batch):
+        """Sends `batch` with retries, returns None or the last exception."""
+        for attempt in range(self.retries + 1):
+            try:
+                response = self._accessor.patch(batch, auth=self.auth)
+            except HttpClientError as e:
+                error = e
+                if not isinstance(e, HttpRequestTimeout):
+                    # Sending the same objects again won't help.
+                    return error
+            except (HttpError, requests.RequestException) as e:
+                error = e
+            else:
+                self._accessor._bulk_map_response(
+                    response, batch, 0, ApiBulkResult(len(batch))
+                )
+                return None
+            if attempt < self.retries:
+                self._accessor.api._emit(
+                    "retry",
+                    "patch",
+                    self._accessor._conf["list_endpoint"],
+                    attempt + 1,
+                    error,
+                )
+                time.sleep(self.retry_backoff * 2**attempt)
+        return error
+
+
 def oauth_parse_qs(url, fragment=False):
     """
     Accepts either an URL or just the query string, or optionally will look
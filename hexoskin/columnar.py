@@ -0,0 +1,279 @@
+"""
+Writes data results to Parquet or Arrow IPC files without building
+DataFrames first.  Needs the `pyarrow` package.
+
+    with ColumnarWriter("export/", freq=api.freq) as writer:
+        for start in range(record.start, record.end, 3600 * api.freq):
+            result = api.data.list(record=record, datatype__in=(4, 19),
+                                   start=start, end=start + 3600 * api.freq)
+            writer.write_result(result, record=record.id)
+
+Each user and datatype gets its own files, in a hive-style directory layout
+readable by pyarrow.dataset, pandas or Spark, eg.
+`export/user=99/day=2024-01-31/datatype=4/part-0.parquet` with `timestamp`
+and `value` columns.  Points are buffered per file and written one row group
+at a time, so at most `row_group_size` points per open file are held in
+memory.
+
+Numeric values are written as float64, whatever the values of the first
+chunk, so every file of a datatype has the same schema; other values, eg.
+strings, keep the type of the first values seen for the datatype.  Values
+that don't convert without loss raise pyarrow.ArrowInvalid.
+"""
+
+from __future__ import annotations
+
+import datetime
+import os
+from bisect import bisect_left
+
+from .series import CompactSeries
+
+COLUMNAR_FORMATS = ("arrow", "parquet")
+PARTITIONS = ("user", "record", "range", "day")
+
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Columnar export requires the pyarrow package.") from e
+    return pyarrow
+
+
+class ColumnarWriter:
+    """
+    Args:
+        path (): output directory
+        format (): "parquet" or "arrow" (Arrow IPC file)
+        partition_by (): directory levels, any of "user", "record", "range"
+            and "day" in that order; the datatype is always the last level
+        freq (): timestamps ticks per second, api.freq, to split days
+        row_group_size (): points per row group (Arrow record batch)
+        compression (): codec name, eg. "zstd", "snappy", "lz4" or None
+        basename (): file name, without extension, in each partition; give
+            successive writers to the same dataset different names
+    """
+
+    def __init__(
+        self,
+        path,
+        format="parquet",
+        partition_by=("user", "day"),
+        freq=256,
+        row_group_size=65536,
+        compression="zstd",
+        basename="part-0",
+    ):
+        if format not in COLUMNAR_FORMATS:
+            raise ValueError("Unknown columnar format: %s" % format)
+        unknown = set(partition_by) - set(PARTITIONS)
+        if unknown:
+            raise ValueError("Unknown partitions: %s" % ", ".join(sorted(unknown)))
+        self.pa = _import_pyarrow()
+        self.path = path
+        self.format = format
+        self.partition_by = tuple(p for p in PARTITIONS if p in partition_by)
+        self.freq = freq
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.basename = basename
+        self.rows = 0
+        self.files = []
+        self._open = {}
+        # datatype -> pyarrow type of the value column
+        self._value_types = {}
+        self._dirs = tuple(p for p in self.partition_by if p != "day")
+        self._by_day = "day" in self.partition_by
+        self._ticks_per_day = freq * 86400
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write_result(self, result, **partition):
+        """
+        Writes an ApiDataList or an ApiDataResult.  The user comes from the
+        result; `partition` gives the other values of `partition_by`, the
+        record defaults to the result's record when there is only one.
+        """
+        results = [result] if hasattr(result, "data") else result
+        for res in results:
+            values = dict(partition)
+            values.setdefault("user", res.user.rstrip("/").rpartition("/")[2])
+            if "record" in self.partition_by and len(res.record) == 1:
+                values.setdefault("record", res.record[0].fields["id"])
+            for datatype, points in res.data.items():
+                self.write(datatype, points, **values)
+
+    def write(self, datatype, points, **partition):
+        """
+        Appends `points`, an iterable of (timestamp, value) pairs sorted by
+        timestamp, eg. an ApiFlatDataList, a CompactSeries or a generator.
+        """
+        if isinstance(points, CompactSeries):
+            # A row group at a time: the timestamps of a long series are
+            # never all built.
+            for seg in points.segments:
+                for i in range(0, len(seg), self.row_group_size):
+                    j = i + self.row_group_size
+                    self.write_arrays(
+                        datatype, seg.timestamps(i, j), seg.values[i:j], **partition
+                    )
+            return
+        timestamps = []
+        values = []
+        day = None
+        for ts, value in points:
+            if self._by_day:
+                if day is None or not day_start <= ts < day_end:
+                    self._append(datatype, partition, day, timestamps, values)
+                    timestamps, values = [], []
+                    day = ts // self._ticks_per_day
+                    day_start = day * self._ticks_per_day
+                    day_end = day_start + self._ticks_per_day
+            timestamps.append(ts)
+            values.append(value)
+            if len(timestamps) >= self.row_group_size:
+                self._append(datatype, partition, day, timestamps, values)
+                timestamps, values = [], []
+        self._append(datatype, partition, day, timestamps, values)
+
+    def write_arrays(self, datatype, timestamps, values, **partition):
+        """Same as write() with separate sequences, eg. numpy arrays."""
+        i = 0
+        while i < len(timestamps):
+            j = i + self.row_group_size
+            day = None
+            if self._by_day:
+                day = int(timestamps[i]) // self._ticks_per_day
+                end = bisect_left(timestamps, (day + 1) * self._ticks_per_day, i)
+                j = min(end, j)
+            self._append(datatype, partition, day, timestamps[i:j], values[i:j])
+            i = j
+
+    def close(self):
+        """Finishes every file; they only get their final name here."""
+        for f in self._open.values():
+            self._flush(f, final=True)
+            f.writer.close()
+            os.replace(f.tmp, f.path)
+            self.files.append(f.path)
+        self._open.clear()
+
+    def abort(self):
+        """Closes and deletes the unfinished files."""
+        for f in self._open.values():
+            f.writer.close()
+            os.remove(f.tmp)
+        self._open.clear()
+
+    def _append(self, datatype, partition, day, timestamps, values):
+        if not len(timestamps):
+            return
+        key = tuple(partition.get(p) for p in self._dirs) + (day, datatype)
+        f = self._open.get(key)
+        if f is None:
+            missing = [p for p in self._dirs if partition.get(p) is None]
+            if missing:
+                raise ValueError("Missing partition values: %s" % ", ".join(missing))
+            f = self._open[key] = self._open_file(
+                key, self._value_type(datatype, values)
+            )
+        f.timestamps.append(self.pa.array(timestamps, type=self.pa.int64()))
+        values = self.pa.array(values)
+        value_type = f.schema.field("value").type
+        if values.type != value_type:
+            values = values.cast(value_type, safe=True)
+        f.values.append(values)
+        f.size += len(timestamps)
+        self.rows += len(timestamps)
+        if f.size >= self.row_group_size:
+            self._flush(f)
+
+    def _flush(self, f, final=False):
+        """Writes the full row groups buffered for `f`, and the rest if `final`."""
+        if not f.size:
+            return
+        table = self.pa.Table.from_arrays(
+            [self.pa.concat_arrays(f.timestamps), self.pa.concat_arrays(f.values)],
+            schema=f.schema,
+        )
+        full = f.size if final else f.size - f.size % self.row_group_size
+        if self.format == "parquet":
+            f.writer.write_table(
+                table.slice(0, full), row_group_size=self.row_group_size
+            )
+        else:
+            f.writer.write_table(
+                table.slice(0, full), max_chunksize=self.row_group_size
+            )
+        rest = table.slice(full)
+        f.timestamps = [rest.column(0).combine_chunks()] if len(rest) else []
+        f.values = [rest.column(1).combine_chunks()] if len(rest) else []
+        f.size = len(rest)
+
+    def _value_type(self, datatype, values):
+        """The value type of `datatype`, chosen from its first values."""
+        value_type = self._value_types.get(datatype)
+        if value_type is None:
+            pa = self.pa
+            value_type = pa.array(values[:1000]).type
+            if (
+                pa.types.is_null(value_type)
+                or pa.types.is_integer(value_type)
+                or pa.types.is_floating(value_type)
+            ):
+                # Ints and floats mix within a datatype, and a chunk of nulls
+                # says nothing of the values to come.
+                value_type = pa.float64()
+            self._value_types[datatype] = value_type
+        return value_type
+
+    def _open_file(self, key, value_type):
+        pa = self.pa
+        schema = pa.schema([("timestamp", pa.int64()), ("value", value_type)])
+        parts = ["%s=%s" % (n, v) for n, v in zip(self._dirs, key)]
+        if self._by_day:
+            day = _EPOCH + datetime.timedelta(days=int(key[-2]))
+            parts.append("day=%s" % day.isoformat())
+        parts.append("datatype=%s" % key[-1])
+        directory = os.path.join(self.path, *parts)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "%s.%s" % (self.basename, self.format))
+        tmp = path + ".part"
+        if self.format == "parquet":
+            import pyarrow.parquet
+
+            writer = pyarrow.parquet.ParquetWriter(
+                tmp, schema, compression=self.compression or "none"
+            )
+        else:
+            import pyarrow.ipc
+
+            writer = pyarrow.ipc.new_file(
+                tmp,
+                schema,
+                options=pyarrow.ipc.IpcWriteOptions(compression=self.compression),
+            )
+        return _OpenFile(writer, schema, tmp, path)
+
+
+class _OpenFile:
+    __slots__ = ("writer", "schema", "tmp", "path", "timestamps", "values", "size")
+
+    def __init__(self, writer, schema, tmp, path):
+        self.writer = writer
+        self.schema = schema
+        self.tmp = tmp
+        self.path = path
+        self.timestamps = []
+        self.values = []
+        self.size = 0
@@ -0,0 +1,382 @@
+"""
+Measures how much of a record has signal, chunk by chunk, without keeping
+the samples.  Needs the `numpy` package.
+
+    analyzer = CoverageAnalyzer(api.freq, record.start, record.end)
+    for result in api.data.iter_chunks(record.start, record.end,
+                                       record=record, datatype__in=(4, 19)):
+        analyzer.add(result)
+    for report in analyzer.report():
+        print(report)       # -> user 99, datatype 4: 97.2% covered, 3 gaps...
+
+Each sample covers one sample period, the expected interval between two
+samples of its datatype: given in `periods`, or the median interval of its
+first samples.  An interval longer than `gap_factor` periods, or than
+`min_gap` seconds, is a gap; a shorter one differing from the period by
+more than `tolerance` is an irregularity.  Per (user, datatype), only the
+last timestamp, counters and the gap intervals are kept.
+"""
+
+from __future__ import annotations
+
+from .downsample import _import_numpy
+from .export import _end, _id
+
+# Samples used to infer the period of a datatype.
+_INFER = 64
+
+
+class CoverageReport:
+    """
+    Coverage of one datatype of one user.
+
+    Attributes:
+        user (): user id
+        datatype (): datatype id
+        start (): start of the analysed span, in ticks
+        end (): end of the analysed span, in ticks, excluded
+        period (): sample period, in ticks
+        samples (): number of samples
+        gaps (): [start, end) intervals without signal, in ticks
+        irregular (): intervals off the period by more than the tolerance
+        backwards (): samples not after the previous one
+        min_interval (): shortest interval between samples, gaps excluded
+        max_interval (): longest interval between samples, gaps excluded
+    """
+
+    __slots__ = (
+        "user",
+        "datatype",
+        "freq",
+        "start",
+        "end",
+        "period",
+        "samples",
+        "gaps",
+        "irregular",
+        "backwards",
+        "min_interval",
+        "max_interval",
+    )
+
+    def __init__(self, user, datatype, freq, start, end, period, samples, gaps):
+        self.user = user
+        self.datatype = datatype
+        self.freq = freq
+        self.start = start
+        self.end = end
+        self.period = period
+        self.samples = samples
+        self.gaps = gaps
+        self.irregular = 0
+        self.backwards = 0
+        self.min_interval = None
+        self.max_interval = None
+
+    @property
+    def span(self):
+        return max(self.end - self.start, 0)
+
+    @property
+    def missing(self):
+        """Ticks without signal."""
+        return sum(end - start for start, end in self.gaps)
+
+    @property
+    def covered(self):
+        """Ticks with signal."""
+        return max(self.span - self.missing, 0)
+
+    @property
+    def coverage(self):
+        """Fraction of the span with signal, from 0 to 1."""
+        return self.covered / self.span if self.span else 0.0
+
+    @property
+    def rate(self):
+        """Samples per second, from the sample period."""
+        return self.freq / self.period if self.period else None
+
+    def longest_gap(self):
+        """The longest gap as a [start, end) pair, or None."""
+        return max(self.gaps, key=lambda g: g[1] - g[0], default=None)
+
+    def to_dict(self):
+        """The report as JSON-serializable values, durations in seconds."""
+        return {
+            "user": self.user,
+            "datatype": self.datatype,
+            "start": self.start,
+            "end": self.end,
+            "rate": self.rate,
+            "samples": self.samples,
+            "coverage": self.coverage,
+            "covered_seconds": self.covered / self.freq,
+            "gaps": [list(g) for g in self.gaps],
+            "irregular": self.irregular,
+            "backwards": self.backwards,
+        }
+
+    def __str__(self):
+        longest = self.longest_gap()
+        return (
+            "user %s, datatype %s: %.1f%% covered (%.0f s), %s samples at %s Hz, "
+            "%s gaps%s, %s irregular, %s backwards"
+            % (
+                self.user,
+                self.datatype,
+                self.coverage * 100,
+                self.covered / self.freq,
+                self.samples,
+                "?" if self.rate is None else "%.4g" % self.rate,
+                len(self.gaps),
+                (
+                    " (longest %.0f s)" % ((longest[1] - longest[0]) / self.freq)
+                    if longest
+                    else ""
+                ),
+                self.irregular,
+                self.backwards,
+            )
+        )
+
+    def __repr__(self):
+        return "<CoverageReport %s>" % self
+
+
+class CoverageAnalyzer:
+    """
+    Finds the gaps and irregularities of data added chunk by chunk, in time
+    order, eg. from ApiResourceAccessor.iter_chunks().
+
+    Args:
+        freq (): ticks per second, api.freq
+        start (): start of the analysed span; by default, the first sample
+            of each datatype
+        end (): end of the analysed span; by default, one period after the
+            last sample of each datatype
+        periods (): {datatype: sample period in ticks}, inferred otherwise
+        gap_factor (): periods between two samples making a gap
+        min_gap (): seconds between two samples making a gap, whatever
+            the period
+        tolerance (): fraction of the period an interval may differ from it
+    """
+
+    def __init__(
+        self,
+        freq,
+        start=None,
+        end=None,
+        periods=None,
+        gap_factor=2.0,
+        min_gap=None,
+        tolerance=0.1,
+    ):
+        self.np = _import_numpy()
+        self.freq = freq
+        self.start = start
+        self.end = end
+        self.periods = dict(periods or {})
+        self.gap_factor = gap_factor
+        self.min_gap = min_gap
+        self.tolerance = tolerance
+        # (user, datatype) -> _Track
+        self._tracks = {}
+
+    def add(self, results):
+        """
+        Adds an ApiDataList, an ApiDataResult, or a {datatype: points}
+        dict of a single user.
+        """
+        if isinstance(results, dict):
+            for datatype, points in results.items():
+                self.add_points(int(datatype), points)
+            return
+        if hasattr(results, "data"):
+            results = (results,)
+        for result in results:
+            user = _id(result.user)
+            for datatype, points in result.data.items():
+                self.add_points(datatype, points, user)
+
+    def add_points(self, datatype, points, user=None):
+        """
+        Adds the samples of a datatype: (timestamp, value) pairs, a
+        CompactSeries or a (timestamps, values) tuple of arrays.
+        """
+        np = self.np
+        timestamps = _timestamps(np, points)
+        if self.start is not None or self.end is not None:
+            keep = np.ones(len(timestamps), dtype=bool)
+            if self.start is not None:
+                keep &= timestamps >= self.start
+            if self.end is not None:
+                keep &= timestamps < self.end
+            if not keep.all():
+                timestamps = timestamps[keep]
+        if not len(timestamps):
+            return
+        key = (user, datatype)
+        track = self._tracks.get(key)
+        if track is None:
+            track = self._tracks[key] = _Track(self.periods.get(datatype))
+        if track.period is None:
+            track.pending.append(timestamps)
+            if sum(len(ts) for ts in track.pending) < _INFER:
+                return
+            timestamps = self._infer(track)
+        self._scan(track, timestamps)
+
+    def report(self):
+        """A CoverageReport per (user, datatype), sorted by user and datatype."""
+        reports = []
+        for (user, datatype), track in sorted(
+            self._tracks.items(), key=lambda i: (str(i[0][0]), i[0][1])
+        ):
+            if track.pending:
+                timestamps = self._infer(track)
+                if track.period is None:
+                    # No interval to infer a period from, eg. a single sample.
+                    track.pending = []
+                    track.first = int(timestamps[0])
+                    track.last = int(timestamps.max())
+                    track.samples = len(timestamps)
+                else:
+                    self._scan(track, timestamps)
+            period = 1 if track.period is None else track.period
+            start = track.first if self.start is None else self.start
+            end = track.last + period if self.end is None else self.end
+            gaps = list(track.gaps)
+            if track.first > start:
+                gaps.insert(0, (start, track.first))
+            tail = _ceil(track.last + period)
+            if tail < end:
+                gaps.append((tail, end))
+            report = CoverageReport(
+                user, datatype, self.freq, start, end, track.period, track.samples, gaps
+            )
+            report.irregular = track.irregular
+            report.backwards = track.backwards
+            report.min_interval = track.min_interval
+            report.max_interval = track.max_interval
+            reports.append(report)
+        return reports
+
+    def _infer(self, track):
+        """Sets the period of `track` from its pending samples, returns them."""
+        np = self.np
+        timestamps = np.concatenate(track.pending)
+        track.pending = []
+        intervals = np.diff(timestamps)
+        intervals = intervals[intervals > 0]
+        if len(intervals):
+            median = float(np.median(intervals))
+            # The mean of the regular intervals, precise for fractional periods.
+            regular = intervals[np.abs(intervals - median) <= median / 2]
+            track.period = float(regular.mean())
+            if track.period.is_integer():
+                track.period = int(track.period)
+        return timestamps
+
+    def _scan(self, track, timestamps):
+        np = self.np
+        if track.period is None:
+            track.pending.append(timestamps)
+            return
+        period = track.period
+        threshold = period * self.gap_factor
+        if self.min_gap is not None:
+            # Never below the period: a gap starts one period after a sample.
+            threshold = max(min(threshold, self.min_gap * self.freq), period)
+        if track.last is None:
+            track.first = int(timestamps[0])
+            previous, following = timestamps[:-1], timestamps[1:]
+        else:
+            previous, following = np.r_[track.last, timestamps[:-1]], timestamps
+        intervals = following - previous
+        track.samples += len(timestamps)
+        last = int(timestamps.max())
+        track.last = last if track.last is None else max(track.last, last)
+
+        backwards = intervals <= 0
+        gaps = intervals > threshold
+        regular = ~(backwards | gaps)
+        track.backwards += int(backwards.sum())
+        deviation = np.abs(intervals[regular] - period)
+        track.irregular += int((deviation > max(period * self.tolerance, 1)).sum())
+        if regular.any():
+            low, high = int(intervals[regular].min()), int(intervals[regular].max())
+            if track.min_interval is None or low < track.min_interval:
+                track.min_interval = low
+            if track.max_interval is None or high > track.max_interval:
+                track.max_interval = high
+        if gaps.any():
+            starts = previous[gaps]
+            ends = following[gaps]
+            track.gaps.extend(
+                (_ceil(s + period), int(e))
+                for s, e in zip(starts.tolist(), ends.tolist())
+            )
+
+
+class _Track:
+    __slots__ = (
+        "period",
+        "pending",
+        "first",
+        "last",
+        "samples",
+        "gaps",
+        "irregular",
+        "backwards",
+        "min_interval",
+        "max_interval",
+    )
+
+    def __init__(self, period):
+        self.period = period
+        self.pending = []
+        self.first = None
+        self.last = None
+        self.samples = 0
+        self.gaps = []
+        self.irregular = 0
+        self.backwards = 0
+        self.min_interval = None
+        self.max_interval = None
+
+
+def record_coverage(api, record, datatypes, **kwargs):
+    """
+    CoverageReports of the datatypes of a record, downloaded chunk by chunk
+    over [record.start, record.end), up to now for a record still being
+    recorded.
+
+    Args:
+        api (): ApiHelper
+        record (): record ApiResourceInstance
+        datatypes (): datatype ids
+        kwargs (): CoverageAnalyzer arguments
+    """
+    start, end = record.fields["start"], _end(record)
+    analyzer = CoverageAnalyzer(api.freq, start, end, **kwargs)
+    for result in api.data.iter_chunks(
+        start, end, record=record, datatype__in=tuple(datatypes)
+    ):
+        analyzer.add(result)
+    return analyzer.report()
+
+
+def _timestamps(np, points):
+    """The timestamps of `points` as an int64 numpy array."""
+    if isinstance(points, tuple) and len(points) == 2:
+        return np.asarray(points[0], dtype=np.int64)
+    if hasattr(points, "segments") and hasattr(points, "timestamps"):
+        # A CompactSeries: its "q" array converts without a copy.
+        return np.frombuffer(points.timestamps(), dtype=np.int64)
+    count = len(points) if hasattr(points, "__len__") else -1
+    return np.fromiter((p[0] for p in points), dtype=np.int64, count=count)
+
+
+def _ceil(ts):
+    return int(-(-ts // 1))
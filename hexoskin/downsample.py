@@ -0,0 +1,252 @@
+"""
+Reduces long signals to a few thousand points for plotting.  Needs the
+`numpy` package.
+
+    ts, values = api.data.list(record=record, datatype=4, flat=1).downsample(2000)
+
+The time span is cut into equal buckets, a gap giving empty buckets, and
+each bucket is reduced to:
+
+- "minmax": its lowest and highest points, in time order, so peaks survive
+- "mean": one point at the mean timestamp and value
+- "lttb": the point making the largest triangle with the point kept for
+  the previous bucket and the mean of the next one (Largest-Triangle-
+  Three-Buckets), the first and last points being kept too
+
+Downsampler does the same over chunks as they arrive, eg. from
+ApiResourceAccessor.iter_chunks(), holding at most two buckets of points.
+"""
+
+from __future__ import annotations
+
+METHODS = ("minmax", "mean", "lttb")
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("Downsampling requires the numpy package.") from e
+    return numpy
+
+
+def downsample(points, n, method="minmax", start=None, end=None):
+    """
+    Returns (timestamps, values) numpy arrays of at most `n` points.
+
+    Args:
+        points (): (timestamp, value) pairs sorted by timestamp, a
+            CompactSeries, or a (timestamps, values) tuple of arrays
+        n (): wanted number of points
+        method (): "minmax", "mean" or "lttb"
+        start (): first timestamp of the bucketed span, the first point's
+            by default
+        end (): end of the bucketed span, after the last point by default
+    """
+    np = _import_numpy()
+    timestamps, values = _as_arrays(np, points)
+    if not len(timestamps):
+        return timestamps, values
+    if start is None:
+        start = int(timestamps[0])
+    if end is None:
+        end = int(timestamps[-1]) + 1
+    sampler = Downsampler(n, start, end, method)
+    sampler.add((timestamps, values))
+    return sampler.result()
+
+
+class Downsampler:
+    """
+    Downsamples [start, end) chunk by chunk.  Points must be added in time
+    order; points outside of [start, end) are ignored.
+
+        sampler = Downsampler(2000, record.start, record.end, "lttb")
+        for result in api.data.iter_chunks(record.start, record.end,
+                                           record=record, datatype=4):
+            sampler.add(result[0].data[4])
+        ts, values = sampler.result()
+
+    Args:
+        n (): wanted number of points
+        start (): first timestamp
+        end (): end timestamp, excluded
+        method (): "minmax", "mean" or "lttb"
+    """
+
+    def __init__(self, n, start, end, method="minmax"):
+        if method not in METHODS:
+            raise ValueError("Unknown downsampling method: %s" % method)
+        if end <= start:
+            raise ValueError("end must be after start.")
+        self.np = _import_numpy()
+        self.n = n
+        self.start = start
+        self.end = end
+        self.method = method
+        if method == "minmax":
+            self.buckets = max(n // 2, 1)
+        elif method == "lttb":
+            self.buckets = max(n - 2, 1)
+        else:
+            self.buckets = max(n, 1)
+        self._ts = self.np.empty(0, dtype=self.np.int64)
+        self._values = self.np.empty(0)
+        self._out = []
+        # Last point kept, or None before the first point, for "lttb".
+        self._prev = None
+        self._last = None
+        self._done = False
+
+    def add(self, points):
+        """Adds a chunk: pairs, a CompactSeries or a (timestamps, values) tuple."""
+        np = self.np
+        if self._done:
+            raise ValueError("Downsampler.result() was already called.")
+        timestamps, values = _as_arrays(np, points)
+        keep = (timestamps >= self.start) & (timestamps < self.end)
+        if not keep.all():
+            timestamps, values = timestamps[keep], values[keep]
+        if not len(timestamps):
+            return
+        if self.method == "lttb":
+            self._last = (timestamps[-1], values[-1])
+            if self._prev is None:
+                self._prev = (timestamps[0], values[0])
+                self._out.append((timestamps[:1], values[:1]))
+                timestamps, values = timestamps[1:], values[1:]
+        if len(self._ts):
+            timestamps = np.concatenate((self._ts, timestamps))
+            values = np.concatenate((self._values, values))
+        self._ts, self._values = timestamps, values
+        self._reduce(final=False)
+
+    def result(self):
+        """Finishes the last buckets, returns (timestamps, values) arrays."""
+        np = self.np
+        if not self._done:
+            self._reduce(final=True)
+            if self.method == "lttb" and self._last is not None:
+                last_ts, last_value = self._last
+                if self._out[-1][0][-1] != last_ts:
+                    self._out.append(
+                        (
+                            np.array([last_ts]),
+                            np.array([last_value], self._values.dtype),
+                        )
+                    )
+            self._done = True
+        if not self._out:
+            return self._ts[:0], self._values[:0]
+        return (
+            np.concatenate([ts for ts, _ in self._out]),
+            np.concatenate([values for _, values in self._out]),
+        )
+
+    def _reduce(self, final):
+        """Reduces the buckets of the pending points that can't change anymore."""
+        np = self.np
+        ts, values = self._ts, self._values
+        if not len(ts):
+            return
+        bucket = (ts - self.start) * self.buckets // (self.end - self.start)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        # The last bucket may get more points, and "lttb" needs the mean of
+        # the bucket after the reduced ones.
+        ready = len(starts)
+        if not final:
+            ready -= 2 if self.method == "lttb" else 1
+        if ready <= 0:
+            return
+        stop = starts[ready] if ready < len(starts) else len(ts)
+        if self.method == "lttb":
+            self._out.append(self._lttb(ts, values, starts, ready, final))
+        else:
+            reduce = self._minmax if self.method == "minmax" else self._mean
+            self._out.append(reduce(ts[:stop], values[:stop], starts[:ready]))
+        self._ts, self._values = ts[stop:], values[stop:]
+
+    def _minmax(self, ts, values, starts):
+        np = self.np
+        counts = np.diff(np.r_[starts, len(ts)])
+        bucket = np.repeat(np.arange(len(starts)), counts)
+        kept = []
+        for reduce in (np.fmin, np.fmax):
+            extreme = np.repeat(reduce.reduceat(values, starts), counts)
+            hits = np.flatnonzero(values == extreme)
+            # The first point reaching the extreme in each bucket.
+            _, first = np.unique(bucket[hits], return_index=True)
+            kept.append(hits[first])
+        index = np.unique(np.concatenate(kept))
+        return ts[index], values[index]
+
+    def _mean(self, ts, values, starts):
+        np = self.np
+        counts = np.diff(np.r_[starts, len(ts)])
+        offsets = ts - np.repeat(ts[starts], counts)
+        mean_ts = ts[starts] + np.add.reduceat(offsets, starts) // counts
+        return mean_ts, np.add.reduceat(values.astype(float), starts) / counts
+
+    def _lttb(self, ts, values, starts, ready, final):
+        np = self.np
+        # Float offsets from the start keep the areas precise.
+        x = (ts - self.start).astype(float)
+        y = values.astype(float)
+        bounds = np.r_[starts, len(ts)]
+        prev_x = float(self._prev[0] - self.start)
+        prev_y = float(self._prev[1])
+        kept = []
+        for k in range(ready):
+            lo, hi = bounds[k], bounds[k + 1]
+            if final and k == ready - 1:
+                next_x = float(self._last[0] - self.start)
+                next_y = float(self._last[1])
+            else:
+                next_x = x[hi : bounds[k + 2]].mean()
+                next_y = y[hi : bounds[k + 2]].mean()
+            area = np.abs(
+                (prev_x - next_x) * (y[lo:hi] - prev_y)
+                - (prev_x - x[lo:hi]) * (next_y - prev_y)
+            )
+            i = lo + int(np.argmax(area))
+            kept.append(i)
+            prev_x, prev_y = x[i], y[i]
+        self._prev = (ts[kept[-1]], values[kept[-1]])
+        return ts[kept], values[kept]
+
+
+def _as_arrays(np, points):
+    """(timestamps, values) numpy arrays of `points`."""
+    if isinstance(points, tuple) and len(points) == 2:
+        timestamps, values = points
+    elif hasattr(points, "segments") and hasattr(points, "timestamps"):
+        # A CompactSeries, its timestamps computed by numpy.
+        timestamps, values = [], []
+        for seg in points.segments:
+            i = np.arange(len(seg), dtype=np.int64)
+            if isinstance(seg.step, int):
+                timestamps.append(seg.start + i * seg.step)
+            elif seg.times is not None:
+                timestamps.append(np.frombuffer(seg.times, dtype=np.int64))
+            else:
+                offsets = (i * seg.step + seg.phase).astype(np.int64)
+                timestamps.append(seg.start + offsets)
+            values.append(np.asarray(seg.values))
+        if not timestamps:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if len(values) > 1:
+            timestamps = np.concatenate(timestamps)
+            values = np.concatenate(values)
+        else:
+            # Values of a single segment share the memory of its array.
+            timestamps, values = timestamps[0], values[0]
+    else:
+        points = points if hasattr(points, "__len__") else list(points)
+        if not len(points):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        timestamps = [p[0] for p in points]
+        values = [p[1] for p in points]
+    values = np.asarray(values)
+    if values.dtype.kind not in "iuf":
+        raise ValueError("Only numeric values can be downsampled.")
+    return np.asarray(timestamps, dtype=np.int64), values
@@ -46,6 +46,14 @@ class HttpMethodNotAllowed(HttpClientError):
     pass
 
 
+class HttpRequestTimeout(HttpClientError):
+    pass
+
+
+class HttpPayloadTooLarge(HttpClientError):
+    pass
+
+
 class HttpServerError(HttpError):
     pass
 
@@ -56,3 +64,15 @@ class HttpInternalServerError(HttpServerError):
 
 class HttpNotImplemented(HttpServerError):
     pass
+
+
+class HttpBadGateway(HttpServerError):
+    pass
+
+
+class HttpServiceUnavailable(HttpServerError):
+    pass
+
+
+class HttpGatewayTimeout(HttpServerError):
+    pass
@@ -0,0 +1,395 @@
+"""
+Bulk export of every record of a set of users, or of a study.
+
+    exporter = StudyExporter(api, "export/", formats=("edf", "json"),
+                             datatypes=(4, 19), max_workers=8)
+    exporter.plan(study=42)
+    exporter.run()
+
+Ranges can be exported instead of whole records with plan(ranges=...), and
+`start`/`end` limit every download to a time span.
+
+The planned work units are saved in `<output_dir>/plan.json` and every
+finished unit is appended to `<output_dir>/manifest.jsonl`, so running the
+same export again after a crash or a kill only does the remaining units.
+The plan keeps the arguments it was made from: planning into the same
+directory with other ones raises ValueError unless replan=True.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from .columnar import COLUMNAR_FORMATS, ColumnarWriter, _import_pyarrow
+from .errors import HttpClientError, HttpError
+
+FORMATS = {
+    "csv": "text/csv",
+    "edf": "application/x-edf",
+    "json": "application/json",
+    "zip": "application/octet-stream",
+}
+
+# `record` is the id of a record or, when `source` is "range", of a range.
+ExportUnit = namedtuple(
+    "ExportUnit", "key user record format path source", defaults=("record",)
+)
+
+
+class ExportProgress:
+    """Counts finished units and bytes, and derives throughput and ETA."""
+
+    def __init__(self, total, skipped=0):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def units_per_second(self):
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def remaining(self):
+        return self.total - self.skipped - self.done - self.failed
+
+    @property
+    def eta(self):
+        """Seconds left at the current unit rate, None before the first unit."""
+        rate = self.units_per_second
+        return self.remaining / rate if rate else None
+
+    def __str__(self):
+        eta = "?" if self.eta is None else "%.0fs" % self.eta
+        return "%s/%s units, %s failed, %.1f MiB, %.2f units/s, %.2f MiB/s, ETA %s" % (
+            self.skipped + self.done,
+            self.total,
+            self.failed,
+            self.bytes / 2**20,
+            self.units_per_second,
+            self.bytes_per_second / 2**20,
+            eta,
+        )
+
+
+class StudyExporter:
+    """
+    Args:
+        api (): HexoApi
+        output_dir (): files are written to <output_dir>/user_<id>/
+        formats (): any of "edf", "csv", "zip", "json", "parquet", "arrow";
+            one unit per record and format
+        datatypes (): datatype ids for the csv, json and columnar formats
+        start (): only export data from this timestamp, in api.freq ticks
+        end (): only export data up to this timestamp
+        max_workers (): downloads running at once
+        per_user (): downloads running at once for the same user
+        retries (): new attempts of a unit failing on a server or network
+            error before it is marked failed
+        on_progress (): called with the ExportProgress after every unit
+        by_day (): also partition the columnar files by day
+    """
+
+    def __init__(
+        self,
+        api,
+        output_dir,
+        formats=("edf",),
+        datatypes=None,
+        start=None,
+        end=None,
+        max_workers=4,
+        per_user=2,
+        retries=2,
+        on_progress=None,
+        by_day=False,
+    ):
+        unknown = set(formats) - set(FORMATS) - set(COLUMNAR_FORMATS)
+        if unknown:
+            raise ValueError("Unknown export formats: %s" % ", ".join(sorted(unknown)))
+        if max_workers < 1 or per_user < 1:
+            raise ValueError("max_workers and per_user must be at least 1.")
+        if set(formats) & set(COLUMNAR_FORMATS):
+            if not datatypes:
+                raise ValueError("Columnar export formats need datatypes.")
+            _import_pyarrow()
+        self.api = api
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        self.datatypes = tuple(datatypes) if datatypes else None
+        self.start = start
+        self.end = end
+        self.max_workers = max_workers
+        self.per_user = per_user
+        self.retries = retries
+        self.on_progress = on_progress
+        self.by_day = by_day
+        self.units = []
+        self.progress = None
+        self._manifest_lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    @property
+    def plan_path(self):
+        return os.path.join(self.output_dir, "plan.json")
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.output_dir, "manifest.jsonl")
+
+    def plan(
+        self,
+        users=None,
+        study=None,
+        records=None,
+        ranges=None,
+        replan=False,
+        **filters,
+    ):
+        """
+        Lists the records to export, from `records` (ids), `users` (ids or
+        ApiResourceInstances), or the members of `study`, and the `ranges`
+        (ids).  `filters` are passed to record.list(), eg. start__gte=...
+        An existing plan.json is reused unless `replan` is True; it must have
+        been made from the same arguments, and those of the StudyExporter.
+        """
+        if users is not None:
+            users = [_id(u) for u in users]
+        args = self._plan_args(
+            users=users,
+            study=study,
+            records=None if records is None else list(records),
+            ranges=None if ranges is None else list(ranges),
+            filters=filters,
+        )
+        if not replan and os.path.exists(self.plan_path):
+            with open(self.plan_path) as f:
+                saved = json.load(f)
+            if not isinstance(saved, dict) or saved.get("args") != args:
+                raise ValueError(
+                    "%s was planned from other arguments, plan again with "
+                    "replan=True." % self.plan_path
+                )
+            self.units = [ExportUnit(*u) for u in saved["units"]]
+            return self.units
+
+        if users is None and study is not None:
+            users = self.api.user.list(study=study).iter_all()
+        if records is None and users is None and ranges is None:
+            raise ValueError("plan() needs records, ranges, users or a study.")
+        if self.start is not None:
+            filters.setdefault("end__gte", self.start)
+        if self.end is not None:
+            filters.setdefault("start__lte", self.end)
+
+        sources = []
+        for rec in records or ():
+            sources.append(("record", self.api.record.get(rec)))
+        for user in users or ():
+            for rec in self.api.record.list(user=_id(user), **filters).iter_all():
+                sources.append(("record", rec))
+        for rng in ranges or ():
+            sources.append(("range", self.api.range.get(rng)))
+
+        # A record can show up twice when pages shift during the listing.
+        units = {}
+        for source, obj in sources:
+            for fmt in self.formats:
+                unit = self._unit(
+                    _id(obj.fields["user"]), obj.fields["id"], fmt, source
+                )
+                units.setdefault(unit.key, unit)
+        self.units = list(units.values())
+        tmp = self.plan_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"args": args, "units": self.units}, f)
+        os.replace(tmp, self.plan_path)
+        return self.units
+
+    def _plan_args(self, **args):
+        """What a plan is made from, as it reads back from plan.json."""
+        args.update(
+            formats=self.formats,
+            datatypes=self.datatypes,
+            start=self.start,
+            end=self.end,
+            by_day=self.by_day,
+        )
+        return json.loads(json.dumps(args, default=str))
+
+    def finished(self):
+        """Keys of the units the manifest lists as done."""
+        done = set()
+        try:
+            with open(self.manifest_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Last line of a killed run.
+                        continue
+                    if entry["status"] == "done":
+                        done.add(entry["key"])
+        except FileNotFoundError:
+            pass
+        return done
+
+    def run(self):
+        """Exports every planned unit not done yet, returns the ExportProgress."""
+        done = self.finished()
+        pending = defaultdict(deque)
+        for unit in self.units:
+            if unit.key not in done:
+                pending[unit.user].append(unit)
+        self.progress = ExportProgress(
+            len(self.units), skipped=len(self.units) - sum(map(len, pending.values()))
+        )
+
+        running = {}
+        per_user = defaultdict(int)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                # Round-robin over the users so one big user doesn't starve
+                # the others.
+                dispatched = True
+                while dispatched and len(running) < self.max_workers:
+                    dispatched = False
+                    for user in list(pending):
+                        if len(running) >= self.max_workers:
+                            break
+                        if per_user[user] >= self.per_user:
+                            continue
+                        unit = pending[user].popleft()
+                        if not pending[user]:
+                            del pending[user]
+                        per_user[user] += 1
+                        running[pool.submit(self._export, unit)] = unit
+                        dispatched = True
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    unit = running.pop(future)
+                    per_user[unit.user] -= 1
+                    self._record(unit, future)
+        return self.progress
+
+    def _unit(self, user, id, fmt, source="record"):
+        name = "%s_%s" % (source, id)
+        if fmt in COLUMNAR_FORMATS:
+            # The unit's partition of the <output_dir>/<fmt>/ dataset.
+            path = os.path.join(
+                self.output_dir, fmt, "user=%s" % user, "%s=%s" % (source, id)
+            )
+        else:
+            path = os.path.join(
+                self.output_dir, "user_%s" % user, "%s.%s" % (name, fmt)
+            )
+        key = "%s/%s/%s" % (user, id if source == "record" else name, fmt)
+        return ExportUnit(key, user, id, fmt, path, source)
+
+    def _export(self, unit):
+        get_args = {unit.source: unit.record}
+        if self.start is not None:
+            get_args["start"] = self.start
+        if self.end is not None:
+            get_args["end"] = self.end
+        if self.datatypes and unit.format != "edf":
+            get_args["datatype__in"] = self.datatypes
+        for attempt in range(self.retries + 1):
+            try:
+                if unit.format in COLUMNAR_FORMATS:
+                    return self._write_columnar(unit, get_args)
+                return self._download(unit, get_args)
+            except HttpClientError:
+                raise
+            except (HttpError, requests.RequestException) as e:
+                if attempt == self.retries:
+                    raise
+                self.api._emit("retry", "get", self.api.data.endpoint, attempt + 1, e)
+                time.sleep(2**attempt)
+
+    def _download(self, unit, get_args):
+        os.makedirs(os.path.dirname(unit.path), exist_ok=True)
+        tmp = unit.path + ".part"
+        with open(tmp, "wb") as f:
+            written = self.api.data.download(f, get_args, FORMATS[unit.format])
+        os.replace(tmp, unit.path)
+        return written
+
+    def _write_columnar(self, unit, get_args):
+        obj = getattr(self.api, unit.source).get(unit.record)
+        # A copy: _export() passes the same get_args to every attempt.
+        get_args = dict(get_args)
+        start = max(obj.fields["start"], get_args.pop("start", obj.fields["start"]))
+        end = _end(obj)
+        end = min(end, get_args.pop("end", end))
+        partition_by = ("user", unit.source, "day") if self.by_day else None
+        writer = ColumnarWriter(
+            os.path.join(self.output_dir, unit.format),
+            unit.format,
+            partition_by=partition_by or ("user", unit.source),
+            freq=self.api.freq,
+        )
+        with writer:
+            # Window sizes adapt to each datatype's rate and the server's
+            # response times.
+            for result in self.api.data.iter_chunks(start, end, get_args):
+                writer.write_result(
+                    result, user=unit.user, **{unit.source: unit.record}
+                )
+        return sum(os.path.getsize(path) for path in writer.files)
+
+    def _record(self, unit, future):
+        entry = {"key": unit.key, "path": unit.path, "time": time.time()}
+        try:
+            entry["bytes"] = future.result()
+            entry["status"] = "done"
+            self.progress.done += 1
+            self.progress.bytes += entry["bytes"]
+        except Exception as e:
+            entry["status"] = "failed"
+            entry["error"] = repr(e)
+            self.progress.failed += 1
+        with self._manifest_lock, open(self.manifest_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        if self.on_progress is not None:
+            self.on_progress(self.progress)
+
+
+def _end(obj):
+    """
+    The end of a record or range ApiResourceInstance, the current time for a
+    record still being recorded: its data so far.
+    """
+    end = obj.fields["end"]
+    if end is None:
+        end = int(time.time() * obj._parent.api.freq)
+    return end
+
+
+def _id(value):
+    """The id of an ApiResourceInstance, a resource URI or an id."""
+    fields = getattr(value, "fields", None)
+    if fields is not None:
+        # Lazy instances get their id from the URI, as a string.
+        value = fields["id"]
+    if isinstance(value, str):
+        value = value.rstrip("/").rpartition("/")[2]
+        return int(value) if value.isdigit() else value
+    return value
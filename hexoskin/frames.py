@@ -0,0 +1,163 @@
+"""
+Builds pandas DataFrames from data and resource lists.  Needs the `pandas`
+package.
+
+    df = api.data.list(record=record, datatype__in=(19, 33)).to_frame()
+    df = api.range.list(user=99).prefetch_all().to_frame()
+
+Columns are built from numpy arrays, one per datatype or field, rather than
+from rows.  Timestamps give the index, as ticks or as UTC datetimes.
+"""
+
+from __future__ import annotations
+
+from .downsample import _as_arrays
+from .export import _id
+from .timestamps import from_ticks
+
+LAYOUTS = ("wide", "long")
+INDEXES = ("ticks", "datetime")
+
+_DTYPES = {
+    "integer": "Int64",
+    "float": "float64",
+    "boolean": "boolean",
+    "string": "string",
+    "related": "Int64",
+}
+
+
+def _import_pandas():
+    try:
+        import pandas
+    except ImportError as e:
+        raise ImportError("DataFrames require the pandas package.") from e
+    return pandas
+
+
+def data_frame(results, freq, layout="wide", index="ticks"):
+    """
+    DataFrame of ApiDataResults.
+
+    "wide" has one column per datatype, named by its id, joined on the
+    timestamps; with several users the columns are (user, datatype) pairs.
+    "long" has `user`, `datatype` and `value` columns, sorted by user,
+    datatype and timestamp.
+
+    Args:
+        results (): ApiDataList or ApiDataResults
+        freq (): ticks per second, api.freq
+        layout (): "wide" or "long"
+        index (): "ticks" or "datetime"
+    """
+    pd = _import_pandas()
+    import numpy as np
+
+    if layout not in LAYOUTS:
+        raise ValueError("Unknown layout: %s" % layout)
+    if index not in INDEXES:
+        raise ValueError("Unknown index: %s" % index)
+    results = list(results)
+    several_users = len({_id(r.user) for r in results}) > 1
+
+    columns = []
+    for result in results:
+        user = _id(result.user)
+        for datatype, points in sorted(result.data.items()):
+            timestamps, values = _as_arrays(np, points)
+            columns.append((user, datatype, timestamps, values))
+
+    if layout == "long":
+        sizes = [len(ts) for _, _, ts, _ in columns]
+        timestamps = _concat(np, [ts for _, _, ts, _ in columns], np.int64)
+        return pd.DataFrame(
+            {
+                "user": np.repeat([c[0] for c in columns], sizes).astype(np.int64),
+                "datatype": np.repeat([c[1] for c in columns], sizes).astype(np.int64),
+                "value": _concat(np, [v for _, _, _, v in columns], np.float64),
+            },
+            index=_index(pd, timestamps, freq, index),
+        )
+
+    series = [
+        pd.Series(
+            values,
+            index=_index(pd, timestamps, freq, index),
+            name=(user, datatype) if several_users else datatype,
+            copy=False,
+        )
+        for user, datatype, timestamps, values in columns
+    ]
+    if not series:
+        return pd.DataFrame(index=_index(pd, np.empty(0, np.int64), freq, index))
+    if len(series) == 1:
+        return series[0].to_frame()
+    return pd.concat(series, axis=1, sort=True)
+
+
+def flat_frame(points, freq, index="ticks"):
+    """
+    DataFrame of a `value` column from (timestamp, value) pairs, eg. an
+    ApiFlatDataList, or from values only (`no_timestamps`), with a plain
+    index then.
+    """
+    pd = _import_pandas()
+    import numpy as np
+
+    if index not in INDEXES:
+        raise ValueError("Unknown index: %s" % index)
+    if len(points) and not isinstance(points[0], (list, tuple)):
+        return pd.DataFrame({"value": np.asarray(points)})
+    timestamps, values = _as_arrays(np, points)
+    return pd.DataFrame(
+        {"value": values}, index=_index(pd, timestamps, freq, index), copy=False
+    )
+
+
+def resource_frame(instances, conf, fields=None):
+    """
+    DataFrame of ApiResourceInstances indexed by id, one column per field of
+    the resource schema but the id and URI, or of `fields`.  Related
+    resources become their id.
+
+    Args:
+        instances (): ApiResourceList or ApiResourceInstances
+        conf (): the resource schema, accessor._conf
+        fields (): field names, every field of the schema by default
+    """
+    pd = _import_pandas()
+    instances = list(instances)
+    schema = conf.get("fields", {})
+    if fields is None:
+        fields = [name for name in schema if name not in ("id", "resource_uri")]
+    rows = [inst.fields for inst in instances]
+
+    columns = {}
+    for name in fields:
+        kind = schema.get(name, {}).get("type")
+        values = [row.get(name) for row in rows]
+        if kind == "related":
+            values = [None if v is None else _id(v) for v in values]
+        if kind == "datetime":
+            columns[name] = pd.to_datetime(values, utc=True, format="ISO8601")
+        else:
+            try:
+                columns[name] = pd.array(values, dtype=_DTYPES.get(kind, object))
+            except (TypeError, ValueError):
+                # Values not matching the schema, eg. non numeric ids.
+                columns[name] = pd.array(values, dtype=object)
+    ids = [row.get("id") for row in rows]
+    return pd.DataFrame(columns, index=pd.Index(ids, name="id"))
+
+
+def _concat(np, arrays, dtype):
+    if not arrays:
+        return np.empty(0, dtype)
+    return np.concatenate(arrays) if len(arrays) > 1 else arrays[0]
+
+
+def _index(pd, timestamps, freq, index):
+    if index == "datetime":
+        times = pd.DatetimeIndex(from_ticks(timestamps, freq), name="time")
+        return times.tz_localize("UTC")
+    return pd.Index(timestamps, name="timestamp")
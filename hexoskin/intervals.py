@@ -0,0 +1,137 @@
+"""
+Finds the records or ranges containing a timestamp, or overlapping a span,
+without scanning them all.
+
+    index = IntervalIndex.from_resources(api.record.list(user=99).iter_all())
+    index.at(ts)                # -> records containing ts
+    index.overlapping(s, e)     # -> records overlapping [s, e)
+
+Intervals are half-open, [start, end).  The index is a static centered
+interval tree: queries take O(log n + k) for k matches.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+
+_OPEN = float("inf")
+
+
+class IntervalIndex:
+    """
+    Args:
+        intervals (): (start, end, item) triples; an `end` of None is open
+    """
+
+    def __init__(self, intervals):
+        self._intervals = sorted(
+            (
+                (start, _OPEN if end is None else end, item)
+                for start, end, item in intervals
+            ),
+            key=lambda i: (i[0], i[1]),
+        )
+        self._root = _build([i for i in self._intervals if i[0] < i[1]])
+
+    @classmethod
+    def from_resources(cls, resources):
+        """
+        Indexes ApiResourceInstances, eg. records or ranges, by their `start`
+        and `end` fields.  Those without a start are left out.
+        """
+        return cls(
+            (r.fields["start"], r.fields.get("end"), r)
+            for r in resources
+            if r.fields.get("start") is not None
+        )
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __iter__(self):
+        return (item for _, _, item in self._intervals)
+
+    def at(self, ts):
+        """The items containing `ts`, sorted by start."""
+        found = []
+        node = self._root
+        while node is not None:
+            if ts < node.center:
+                for interval in node.by_start:
+                    if interval[0] > ts:
+                        break
+                    found.append(interval)
+                node = node.left
+            else:
+                for interval in node.by_end:
+                    if interval[1] <= ts:
+                        break
+                    found.append(interval)
+                node = node.right
+        return _items(found)
+
+    def overlapping(self, start, end):
+        """The items overlapping [start, end), sorted by start."""
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if end <= node.center:
+                for interval in node.by_start:
+                    if interval[0] >= end:
+                        break
+                    found.append(interval)
+                stack.append(node.left)
+            elif start > node.center:
+                for interval in node.by_end:
+                    if interval[1] <= start:
+                        break
+                    found.append(interval)
+                stack.append(node.right)
+            else:
+                found.extend(node.by_start)
+                stack.append(node.left)
+                stack.append(node.right)
+        return _items(found)
+
+    def first_after(self, ts):
+        """The item starting first at or after `ts`, or None."""
+        i = bisect_left(self._intervals, ts, key=lambda i: i[0])
+        return self._intervals[i][2] if i < len(self._intervals) else None
+
+
+class _Node:
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+
+    def __init__(self, center, by_start, by_end, left, right):
+        self.center = center
+        self.by_start = by_start
+        self.by_end = by_end
+        self.left = left
+        self.right = right
+
+
+def _build(intervals):
+    """The tree of `intervals`, sorted by start."""
+    if not intervals:
+        return None
+    # The median start: its interval stays at this node, so each level has
+    # fewer intervals.
+    center = intervals[len(intervals) // 2][0]
+    left, here, right = [], [], []
+    for interval in intervals:
+        if interval[1] <= center:
+            left.append(interval)
+        elif interval[0] > center:
+            right.append(interval)
+        else:
+            here.append(interval)
+    by_end = sorted(here, key=lambda i: i[1], reverse=True)
+    return _Node(center, here, by_end, _build(left), _build(right))
+
+
+def _items(found):
+    found.sort(key=lambda i: (i[0], i[1]))
+    return [item for _, _, item in found]
@@ -0,0 +1,259 @@
+"""
+Parses the JSON body of a `data` response while it downloads, without
+building the list of every [timestamp, value] pair:
+
+    result = api.data.stream(record=record, datatype__in=(4, 19))
+    result[0].data[4]       # -> CompactSeries
+
+The body is read chunk by chunk.  Inside the points of a datatype, each run
+of numeric pairs in the buffer is parsed by a single json.loads() and
+appended to typed arrays of timestamps and values, the buffer then being
+dropped.  The arrays become a CompactSeries once the datatype is complete.
+Points that aren't pairs of numbers, eg. null values, are parsed one by
+one, and their datatype keeps a list of [timestamp, value] lists as
+response.json() would give.  Other values, eg. `user` and `record`, are
+small and decoded as usual.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from array import array
+
+from .series import CompactSeries
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Characters of numeric pairs and their separators.
+_NOT_NUMERIC = re.compile(r"[^0-9\[\],.eE+\- \t\n\r]")
+# The "]" of the last pair followed by the "]" of the points.
+_POINTS_END = re.compile(r"\][ \t\n\r]*\]")
+
+
+def parse_data(chunks):
+    """
+    The decoded body of a `data` response, from an iterable of bytes, eg.
+    response.iter_content().  Rows have a CompactSeries per datatype; a
+    flat response gives a single CompactSeries, or a list of values with
+    `no_timestamps`.  Raises ValueError for invalid or truncated JSON.
+    """
+    source = _Source(chunks)
+    source.expect("[")
+    first = source.peek()
+    if first == "{":
+        rows = []
+        while True:
+            rows.append(_row(source))
+            if source.next_item():
+                return _end(source, rows)
+    if first == "[":
+        # Flat: the body is the points of one datatype.
+        return _end(source, _points(source, opened=True))
+    values = []
+    if first != "]":
+        while True:
+            values.append(source.value())
+            if source.next_item():
+                break
+    else:
+        source.pos += 1
+    return _end(source, values)
+
+
+def _end(source, body):
+    if source.peek() != "":
+        raise source.error("Extra data")
+    return body
+
+
+def _row(source):
+    row = {}
+    source.expect("{")
+    if source.peek() == "}":
+        source.pos += 1
+        return row
+    while True:
+        key = source.value()
+        source.expect(":")
+        if key == "data":
+            row[key] = _data(source)
+        else:
+            row[key] = source.value()
+        if source.next_item("}"):
+            return row
+
+
+def _data(source):
+    data = {}
+    source.expect("{")
+    if source.peek() == "}":
+        source.pos += 1
+        return data
+    while True:
+        datatype = source.value()
+        source.expect(":")
+        data[datatype] = _points(source)
+        if source.next_item("}"):
+            return data
+
+
+def _points(source, opened=False):
+    """The points of a datatype, from its "[" or right after it if `opened`."""
+    if not opened:
+        source.expect("[")
+    points = _Points()
+    # Set once a point wasn't a pair of numbers: the others are then parsed
+    # one by one.
+    one_by_one = False
+    while True:
+        char = source.peek()
+        if char == "]":
+            source.pos += 1
+            return points.result()
+        if char == ",":
+            source.pos += 1
+            continue
+        if one_by_one or char != "[" or points.pairs is not None:
+            points.append(source.value())
+            continue
+        buf, pos = source.buf, source.pos
+        limit = _NOT_NUMERIC.search(buf, pos)
+        limit = len(buf) if limit is None else limit.start()
+        end = _POINTS_END.search(buf, pos, limit)
+        cut = end.start() + 1 if end is not None else buf.rfind("]", pos, limit) + 1
+        if cut > pos:
+            try:
+                pairs = json.loads("[%s]" % buf[pos:cut])
+            except json.JSONDecodeError:
+                # Nested lists, eg. [timestamp, [a, b]], cut at a wrong "]".
+                one_by_one = True
+                continue
+            points.extend(pairs)
+            source.pos = cut
+        elif limit == len(buf) and source.more():
+            # A pair cut by the end of the buffer.
+            continue
+        else:
+            # A pair holding something else than numbers, eg. null.
+            one_by_one = True
+
+
+class _Points:
+    """Timestamps and values in typed arrays while they are numbers."""
+
+    __slots__ = ("timestamps", "values", "pairs")
+
+    def __init__(self):
+        self.timestamps = array("q")
+        self.values = array("q")
+        # [timestamp, value] lists, once a point didn't fit the arrays.
+        self.pairs = None
+
+    def extend(self, pairs):
+        if self.pairs is None:
+            # The arrays are only extended once the whole chunk converted.
+            try:
+                timestamps = array("q", [t for t, _ in pairs])
+                values = [v for _, v in pairs]
+                try:
+                    values = array(self.values.typecode, values)
+                except TypeError:
+                    if self.values.typecode != "q":
+                        raise
+                    # Floats: the values so far become floats too.
+                    values = array("d", values)
+            except (TypeError, ValueError, OverflowError):
+                self.pairs = [
+                    [t, v]
+                    for t, v in zip(self.timestamps.tolist(), self.values.tolist())
+                ]
+            else:
+                if values.typecode != self.values.typecode:
+                    self.values = array("d", self.values)
+                self.timestamps.extend(timestamps)
+                self.values.extend(values)
+                return
+        self.pairs.extend(pairs)
+
+    def append(self, pair):
+        self.extend([pair])
+
+    def result(self):
+        if self.pairs is not None:
+            return self.pairs
+        return CompactSeries.from_arrays(self.timestamps, self.values)
+
+
+class _Source:
+    """The text of chunks of UTF-8 bytes, read as needed."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._done = False
+        self.buf = ""
+        self.pos = 0
+
+    def more(self):
+        """Appends the next chunk to `buf`, dropping the text before `pos`."""
+        while not self._done:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._done = True
+                text = self._decoder.decode(b"", final=True)
+            else:
+                text = self._decoder.decode(chunk)
+            if text:
+                self.buf = self.buf[self.pos :] + text
+                self.pos = 0
+                return True
+        return False
+
+    def peek(self):
+        """The next character but whitespace, "" at the end."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self.error("Expecting '%s'" % char)
+        self.pos += 1
+
+    def next_item(self, close="]"):
+        """Skips a "," and returns False, or `close` and returns True."""
+        char = self.peek()
+        if char == ",":
+            self.pos += 1
+            return False
+        if char == close:
+            self.pos += 1
+            return True
+        raise self.error("Expecting ',' or '%s'" % close)
+
+    def value(self):
+        """Any JSON value, read whole."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Maybe cut by the end of the buffer.
+                if self.more():
+                    continue
+                raise
+            # A number cut by the end of the buffer, eg. "3." of "3.5", is
+            # decoded up to the cut.
+            cut = end == len(self.buf) or self.buf[end] in ".eE+-"
+            if cut and self.more():
+                continue
+            self.pos = end
+            return value
+
+    def error(self, message):
+        return json.JSONDecodeError(message, self.buf, self.pos)
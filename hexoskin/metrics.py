@@ -0,0 +1,278 @@
+"""
+In-process metrics for ApiHelper requests, exportable in the Prometheus text
+format.
+
+    from hexoskin.metrics import instrument
+
+    metrics = instrument(api)
+    api.record.list()
+    print(metrics.registry.to_prometheus())
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_ID_RE = re.compile(r"/\d+(?=/)")
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms keyed by name and labels.
+    Gauges can also be read from `collectors`, callables returning a list of
+    (name, labels_dict, value) run at export time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types = {}
+        self._help = {}
+        self._values = {}
+        self._histograms = {}
+        self.collectors = []
+
+    def describe(self, name, type, help=""):
+        self._types[name] = type
+        self._help[name] = help
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def get(self, name, **labels):
+        """Current value of a counter/gauge, or the Histogram."""
+        key = (name, _label_key(labels))
+        return self._values.get(key, self._histograms.get(key))
+
+    def to_prometheus(self):
+        with self._lock:
+            values = dict(self._values)
+            histograms = {
+                k: (list(h.counts), h.sum, h.count, h.buckets)
+                for k, h in self._histograms.items()
+            }
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                values[(name, _label_key(labels))] = value
+
+        lines = []
+        described = set()
+        for name, labels in sorted(values):
+            self._header(lines, described, name, "counter")
+            lines.append(
+                "%s%s %s" % (name, _format_labels(labels), values[(name, labels)])
+            )
+        for name, labels in sorted(histograms):
+            self._header(lines, described, name, "histogram")
+            counts, total, count, buckets = histograms[(name, labels)]
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(
+                    "%s_bucket%s %s"
+                    % (name, _format_labels(labels + (("le", str(bound)),)), cumulative)
+                )
+            lines.append(
+                "%s_bucket%s %s"
+                % (name, _format_labels(labels + (("le", "+Inf"),)), count)
+            )
+            lines.append("%s_sum%s %s" % (name, _format_labels(labels), total))
+            lines.append("%s_count%s %s" % (name, _format_labels(labels), count))
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines, described, name, default_type):
+        if name in described:
+            return
+        described.add(name)
+        if name in self._help:
+            lines.append("# HELP %s %s" % (name, self._help[name]))
+        lines.append("# TYPE %s %s" % (name, self._types.get(name, default_type)))
+
+
+class ApiInstrumentation:
+    """
+    Records request metrics of an ApiHelper through its hooks into a
+    MetricsRegistry.  Nothing is recorded, and requests pay nothing, once
+    detach() is called.
+    """
+
+    def __init__(self, api, registry=None):
+        self.api = api
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self._describe()
+
+    def attach(self):
+        self.api.add_hook("before_request", self._before_request)
+        self.api.add_hook("after_request", self._after_request)
+        self.api.add_hook("json_decode", self._json_decode)
+        self.api.add_hook("retry", self._retry)
+        self.api._object_cache.counting += 1
+        self.registry.collectors.append(self._cache_stats)
+        return self
+
+    def detach(self):
+        self.api.remove_hook("before_request", self._before_request)
+        self.api.remove_hook("after_request", self._after_request)
+        self.api.remove_hook("json_decode", self._json_decode)
+        self.api.remove_hook("retry", self._retry)
+        self.api._object_cache.counting -= 1
+        self.registry.collectors.remove(self._cache_stats)
+
+    def _describe(self):
+        for name, type, help in (
+            ("hexoskin_requests_total", "counter", "Requests by status code."),
+            ("hexoskin_request_errors_total", "counter", "Requests that raised."),
+            ("hexoskin_request_seconds", "histogram", "Request latency."),
+            ("hexoskin_sent_bytes_total", "counter", "Request body bytes."),
+            ("hexoskin_received_bytes_total", "counter", "Response body bytes."),
+            ("hexoskin_retries_total", "counter", "Retried requests."),
+            ("hexoskin_json_decode_seconds", "histogram", "JSON decoding time."),
+            ("hexoskin_object_cache_hits_total", "counter", "Object cache hits."),
+            ("hexoskin_object_cache_misses_total", "counter", "Object cache misses."),
+            ("hexoskin_object_cache_hit_ratio", "gauge", "Object cache hit ratio."),
+        ):
+            self.registry.describe(name, type, help)
+
+    def _before_request(self, method, path, params, data):
+        if data:
+            size = len(data.encode("utf8") if isinstance(data, str) else data)
+            self.registry.inc(
+                "hexoskin_sent_bytes_total",
+                size,
+                method=method,
+                endpoint=endpoint_label(path),
+            )
+
+    def _after_request(self, method, path, response, elapsed, error):
+        endpoint = endpoint_label(path)
+        self.registry.observe(
+            "hexoskin_request_seconds", elapsed, method=method, endpoint=endpoint
+        )
+        if response is None:
+            self.registry.inc(
+                "hexoskin_request_errors_total",
+                method=method,
+                endpoint=endpoint,
+                error=type(error).__name__,
+            )
+            return
+        self.registry.inc(
+            "hexoskin_requests_total",
+            method=method,
+            endpoint=endpoint,
+            status=str(response.status_code),
+        )
+        length = response.headers.get("Content-Length")
+        if length is not None:
+            size = int(length)
+        elif getattr(response.raw, "closed", True):
+            # Read already, or replayed, see hexoskin.transport.
+            size = len(response.content or b"")
+        else:
+            # A streamed body, counted as it is read.
+            response.iter_content = self._counting(response, method, endpoint)
+            return
+        self.registry.inc(
+            "hexoskin_received_bytes_total", size, method=method, endpoint=endpoint
+        )
+
+    def _counting(self, response, method, endpoint):
+        """
+        Wraps response.iter_content(), through which content and
+        iter_lines() read too, to count the bytes of each chunk.
+        """
+        iter_content = response.iter_content
+
+        def counting_iter_content(chunk_size=1, decode_unicode=False):
+            for chunk in iter_content(chunk_size, decode_unicode):
+                if isinstance(chunk, str):
+                    size = len(chunk.encode(response.encoding or "utf8"))
+                else:
+                    size = len(chunk)
+                self.registry.inc(
+                    "hexoskin_received_bytes_total",
+                    size,
+                    method=method,
+                    endpoint=endpoint,
+                )
+                yield chunk
+
+        return counting_iter_content
+
+    def _json_decode(self, response, elapsed):
+        self.registry.observe("hexoskin_json_decode_seconds", elapsed)
+
+    def _retry(self, method, path, attempt, error):
+        self.registry.inc(
+            "hexoskin_retries_total", method=method, endpoint=endpoint_label(path)
+        )
+
+    def _cache_stats(self):
+        cache = self.api._object_cache
+        lookups = cache.hits + cache.misses
+        return [
+            ("hexoskin_object_cache_hits_total", {}, cache.hits),
+            ("hexoskin_object_cache_misses_total", {}, cache.misses),
+            (
+                "hexoskin_object_cache_hit_ratio",
+                {},
+                cache.hits / lookups if lookups else 0.0,
+            ),
+        ]
+
+
+def instrument(api, registry=None):
+    """Starts recording the requests of `api`, returns the ApiInstrumentation."""
+    return ApiInstrumentation(api, registry).attach()
+
+
+def endpoint_label(path):
+    """'/api/v1/record/123/' -> '/api/v1/record/:id/', to bound label values."""
+    return _ID_RE.sub("/:id", path.split("?", 1)[0])
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels
+    )
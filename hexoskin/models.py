@@ -0,0 +1,141 @@
+"""
+Typed instance classes generated from the resource schema, used instead of
+ApiResourceInstance when the ApiHelper is created with typed_instances=True:
+
+    api = HexoApi(key, secret, auth=auth, typed_instances=True)
+    record = api.record.get(123)    # -> a Record instance
+    record.start                    # a descriptor, not __getattr__
+
+Each resource gets a subclass of ApiResourceInstance, eg. Record or Range,
+with a descriptor per schema field reading the instance's field values,
+which stay the only storage.  To-one relation descriptors link a URI assigned after
+loading to its instance.  Fields missing from a lazy instance still load
+it, and fields the schema doesn't list still go through __getattr__.
+
+The class specs are computed once per schema version and saved in the
+resource schema stash, so building the classes reads no schema.
+"""
+
+from __future__ import annotations
+
+import keyword
+import re
+
+from .client import ApiResourceInstance, _link_value
+
+# Bumped when the specs change shape, so older stashes are recomputed.
+SPEC_VERSION = 1
+
+_ANNOTATIONS = {
+    "integer": "int",
+    "float": "float",
+    "boolean": "bool",
+    "string": "str",
+    "datetime": "str",
+    "date": "str",
+    "list": "list",
+    "dict": "dict",
+    "related": "ApiResourceInstance",
+}
+
+
+class _Field:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        i = instance._table.get(self.name)
+        if i is not None:
+            return instance._values[i]
+        # Loads a lazy instance, or raises AttributeError.
+        return instance.__getattr__(self.name)
+
+
+class _DataField(_Field):
+    __slots__ = ()
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if self.name in instance._table:
+            return instance._decode_data()
+        return instance.__getattr__(self.name)
+
+
+class _RelatedField(_Field):
+    __slots__ = ()
+
+    def __get__(self, instance, owner=None):
+        value = _Field.__get__(self, instance, owner)
+        if isinstance(value, (str, dict)):
+            linked = _link_value(instance._parent.api, value)
+            if linked is not value:
+                instance._set_field(self.name, linked)
+                value = linked
+        return value
+
+
+_DESCRIPTORS = {"field": _Field, "data": _DataField, "related": _RelatedField}
+
+
+def class_specs(resource_conf):
+    """
+    {resource name: (class name, ((field, kind, annotation), ...))} of a
+    resource schema, what build_classes() needs.
+    """
+    specs = {}
+    for name, conf in resource_conf.items():
+        fields = []
+        for field, schema in conf.get("fields", {}).items():
+            if (
+                not field.isidentifier()
+                or keyword.iskeyword(field)
+                or hasattr(ApiResourceInstance, field)
+            ):
+                # Not an attribute name, or shadowed by a method: left to
+                # `fields` and __getattr__, as on ApiResourceInstance.
+                continue
+            if field == "data":
+                kind = "data"
+            elif schema.get("related_type") == "to_one":
+                kind = "related"
+            else:
+                kind = "field"
+            annotation = _ANNOTATIONS.get(schema.get("type"), "object")
+            fields.append((field, kind, annotation))
+        specs[name] = (_class_name(name), tuple(fields))
+    return specs
+
+
+def build_classes(specs):
+    """{resource name: ApiResourceInstance subclass} of class_specs()."""
+    return {
+        name: _build_class(class_name, fields)
+        for name, (class_name, fields) in specs.items()
+    }
+
+
+def _build_class(class_name, fields):
+    namespace = {
+        "__slots__": (),
+        # Keeps the repr of ApiResourceInstance.
+        "__module__": ApiResourceInstance.__module__,
+        "__qualname__": class_name,
+        "__doc__": "%s instance, with the fields: %s."
+        % (class_name, ", ".join(f for f, _, _ in fields) or "none"),
+        "__annotations__": {f: annotation for f, _, annotation in fields},
+    }
+    for field, kind, _ in fields:
+        namespace[field] = _DESCRIPTORS[kind](field)
+    return type(class_name, (ApiResourceInstance,), namespace)
+
+
+def _class_name(name):
+    """The class name of a resource, eg. "Record" or "RangeTag"."""
+    parts = [p for p in re.split(r"\W|_", name) if p]
+    class_name = "".join(p[:1].upper() + p[1:] for p in parts) or "Resource"
+    return "_" + class_name if class_name[0].isdigit() else class_name
@@ -0,0 +1,164 @@
+"""
+Fetches the data of many (user, time span, datatypes) requirements with as
+few `data` requests as possible.
+
+    reqs = record_requirements(api.record.list(user=99), datatypes=(4, 19))
+    results = QueryPlanner(api).execute(reqs)
+    results[0]  # -> {4: [[ts, value], ...], 19: [...]} for the first record
+
+Spans of the same user and datatype that overlap or touch are merged,
+datatypes needed over the same spans share a `datatype__in` request and
+spans longer than `max_span` seconds are split.  Every requirement gets back the
+points of its own span and datatypes only.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .export import _end, _id
+from .intervals import IntervalIndex
+
+# `start` and `end` are timestamps in api.freq ticks, the span being
+# [start, end).
+DataRequirement = namedtuple("DataRequirement", "user start end datatypes")
+DataQuery = namedtuple("DataQuery", "user start end datatypes")
+
+
+def record_requirements(records, datatypes):
+    """
+    One DataRequirement per record or range ApiResourceInstance, up to now
+    for a record still being recorded.
+    """
+    return [
+        DataRequirement(
+            _id(r.fields["user"]), r.fields["start"], _end(r), tuple(datatypes)
+        )
+        for r in records
+    ]
+
+
+class QueryPlanner:
+    """
+    Args:
+        api (): HexoApi
+        max_datatypes (): datatypes per request at most
+        max_span (): seconds of data per request at most, None for no limit
+        merge_gap (): spans closer than this many seconds are merged too,
+            fetching the gap between them
+        max_workers (): requests running at once in execute()
+    """
+
+    def __init__(
+        self, api, max_datatypes=8, max_span=6 * 3600, merge_gap=0, max_workers=4
+    ):
+        self.api = api
+        self.max_datatypes = max_datatypes
+        self.max_span = max_span
+        self.merge_gap = merge_gap
+        self.max_workers = max_workers
+
+    def plan(self, requirements):
+        """Returns the DataQuery list covering every requirement."""
+        freq = self.api.freq
+        gap = self.merge_gap * freq
+        spans = defaultdict(list)
+        for req in requirements:
+            for datatype in req.datatypes:
+                spans[(_id(req.user), datatype)].append((req.start, req.end))
+
+        merged = defaultdict(dict)
+        for (user, datatype), dt_spans in spans.items():
+            merged[user][datatype] = _merge(dt_spans, gap)
+
+        queries = []
+        max_span = self.max_span * freq if self.max_span else None
+        for user, dt_spans in merged.items():
+            for start, end, datatypes in _segments(dt_spans):
+                step = max_span or end - start
+                for i in range(0, len(datatypes), self.max_datatypes):
+                    batch = datatypes[i : i + self.max_datatypes]
+                    for s in range(start, end, step):
+                        queries.append(DataQuery(user, s, min(s + step, end), batch))
+        queries.sort(key=lambda q: (q.user, q.start, q.datatypes))
+        return queries
+
+    def execute(self, requirements):
+        """
+        Runs the planned queries and returns, for each requirement in order,
+        a dict of {datatype: [[timestamp, value], ...]} limited to its span.
+        """
+        requirements = list(requirements)
+        queries = self.plan(requirements)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            responses = list(pool.map(self._fetch, queries))
+
+        by_user = defaultdict(list)
+        for i, req in enumerate(requirements):
+            by_user[_id(req.user)].append((req.start, req.end, i))
+        indexes = {user: IntervalIndex(spans) for user, spans in by_user.items()}
+        results = [{dt: [] for dt in req.datatypes} for req in requirements]
+        # Queries are sorted by start, so chunks are appended in time order.
+        for query, data in zip(queries, responses):
+            for i in indexes[query.user].overlapping(query.start, query.end):
+                req = requirements[i]
+                for datatype in query.datatypes:
+                    if datatype not in results[i]:
+                        continue
+                    points = data.get(datatype, ())
+                    timestamps = [p[0] for p in points]
+                    lo = bisect_left(timestamps, max(req.start, query.start))
+                    hi = bisect_left(timestamps, min(req.end, query.end))
+                    results[i][datatype].extend(points[lo:hi])
+        return results
+
+    def _fetch(self, query):
+        result = self.api.data.list(
+            user=query.user,
+            start=query.start,
+            end=query.end,
+            datatype__in=query.datatypes,
+        )
+        data = {}
+        for res in result:
+            for datatype, points in res.data.items():
+                data.setdefault(datatype, []).extend(points)
+        return data
+
+
+def _merge(spans, gap=0):
+    """Sorted union of (start, end) spans, joining those `gap` or less apart."""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + gap:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [tuple(span) for span in merged]
+
+
+def _segments(dt_spans):
+    """
+    Cuts the merged spans of every datatype of a user into the longest
+    (start, end, datatypes) segments over which the same datatypes are needed.
+    """
+    bounds = sorted({t for spans in dt_spans.values() for span in spans for t in span})
+    segments = []
+    for start, end in zip(bounds, bounds[1:]):
+        datatypes = tuple(
+            sorted(
+                dt
+                for dt, spans in dt_spans.items()
+                if any(s <= start and end <= e for s, e in spans)
+            )
+        )
+        if not datatypes:
+            continue
+        if segments and segments[-1][1] == start and segments[-1][2] == datatypes:
+            segments[-1][1] = end
+        else:
+            segments.append([start, end, datatypes])
+    return segments
@@ -0,0 +1,457 @@
+"""
+Compact storage for regularly sampled data, eg. ECG or breathing.
+
+    series = api.data.list(record=record, datatype=4, flat=1).compact()
+    for ts, value in series:
+        ...
+
+The points of a `data` response are [timestamp, value] lists, each point
+holding two Python objects.  A CompactSeries keeps runs of evenly spaced
+points as segments of (start, step, values), the values in a typed array,
+and starts a new segment at every gap or change of rate.  Timestamps are
+computed when iterated over or asked for.  Irregular data, eg. RR intervals
+or events, would need a segment every few points: it is kept as a single
+segment holding an array of timestamps instead.  to_bytes() gives the same
+layout for storage.
+"""
+
+from __future__ import annotations
+
+import json
+import pickle
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from itertools import islice
+from operator import sub
+
+# Typecodes tried, smallest first, for integer values.
+_INT_TYPECODES = tuple(
+    (tc, -(2 ** (8 * array(tc).itemsize - 1)), 2 ** (8 * array(tc).itemsize - 1) - 1)
+    for tc in ("b", "h", "i", "q")
+)
+_MAGIC = b"HXS1"
+# to_bytes() of a series with irregular segments, which older versions can't
+# read.
+_MAGIC_IRREGULAR = b"HXS2"
+_HEADER = struct.Struct("<4sI")
+_SEGMENT = struct.Struct("<qddIc")
+# Values that aren't all ints or floats, stored as JSON.
+_JSON = b"j"
+# Average points per segment under which a series is stored as irregular: a
+# segment and its array take about as much memory as 16 timestamps.
+_MIN_RUN = 16
+
+
+class Segment:
+    """
+    Points `start + offset(i)` for i in range(len(values)).  The offset is
+    `i * step` for an int step, `floor(i * step + phase)` otherwise, which
+    fits timestamps rounded either way from a rate that isn't a divisor of
+    the timestamp frequency.  An irregular segment has no step and holds its
+    timestamps in `times`, an int64 array.
+    """
+
+    __slots__ = ("start", "step", "phase", "values", "times")
+
+    def __init__(self, start, step, values, phase=0.0, times=None):
+        self.start = start
+        self.step = step
+        self.phase = phase
+        self.values = values
+        self.times = times
+
+    @classmethod
+    def irregular(cls, timestamps, values):
+        if not (isinstance(timestamps, array) and timestamps.typecode == "q"):
+            timestamps = array("q", timestamps)
+        return cls(timestamps[0], None, values, times=timestamps)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return "Segment(start=%s, step=%s, n=%s)" % (
+            self.start,
+            self.step,
+            len(self.values),
+        )
+
+    @property
+    def end(self):
+        """Timestamp of the last point."""
+        return self.timestamp(len(self.values) - 1)
+
+    def timestamp(self, i):
+        if isinstance(self.step, int):
+            return self.start + i * self.step
+        if self.times is not None:
+            return self.times[i]
+        return self.start + int(i * self.step + self.phase)
+
+    def timestamps(self, i=0, j=None):
+        """Timestamps of the points i to j, as an array of int64."""
+        j = len(self.values) if j is None else min(j, len(self.values))
+        if isinstance(self.step, int):
+            return array(
+                "q",
+                range(
+                    self.start + i * self.step, self.start + j * self.step, self.step
+                ),
+            )
+        if self.times is not None:
+            return self.times[i:j]
+        return array("q", map(self.timestamp, range(i, j)))
+
+
+class CompactSeries:
+    """
+    A read-only sequence of (timestamp, value) points sorted by timestamp.
+
+    Args:
+        segments (): Segment list, in time order
+    """
+
+    __slots__ = ("segments", "_offsets")
+
+    def __init__(self, segments=()):
+        self.segments = list(segments)
+        self._offsets = [0]
+        for seg in self.segments:
+            self._offsets.append(self._offsets[-1] + len(seg))
+
+    @classmethod
+    def from_points(cls, points, step=None):
+        """
+        Builds a series from (timestamp, value) pairs sorted by timestamp, eg.
+        the points of an ApiDataResult datatype or an ApiFlatDataList.  `step`
+        is the expected ticks between points; it is guessed from the
+        timestamps when not given.
+        """
+        points = points if hasattr(points, "__len__") else list(points)
+        return cls.from_arrays(
+            array("q", [p[0] for p in points]), [p[1] for p in points], step
+        )
+
+    @classmethod
+    def from_arrays(cls, timestamps, values, step=None):
+        """
+        Builds a series from a sequence of timestamps and one of values of
+        the same length, eg. typed arrays, without a pair per point.  With
+        an integer `step`, segments are cut at the gaps with C-level slices.
+        Irregular timestamps are kept as they are, in a single segment.
+        """
+        if step is None:
+            step = _guess_step(timestamps)
+        runs = _runs(timestamps, step, max(len(timestamps) // _MIN_RUN, 1))
+        if runs is None:
+            return cls([Segment.irregular(timestamps, _pack(values))])
+        return cls(
+            Segment(timestamps[a], step, _pack(values[a:b]), phase)
+            for a, b, phase in runs
+        )
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def __iter__(self):
+        for seg in self.segments:
+            values = seg.values
+            if isinstance(seg.step, int):
+                ts = range(seg.start, seg.start + len(values) * seg.step, seg.step)
+            elif seg.times is not None:
+                ts = seg.times
+            else:
+                ts = map(seg.timestamp, range(len(values)))
+            yield from zip(ts, values)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(islice(self, *i.indices(len(self))))
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("CompactSeries index out of range")
+        s = bisect_right(self._offsets, i) - 1
+        seg = self.segments[s]
+        j = i - self._offsets[s]
+        return seg.timestamp(j), seg.values[j]
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactSeries):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return "<CompactSeries: %s points in %s segments>" % (
+            len(self),
+            len(self.segments),
+        )
+
+    def __reduce_ex__(self, protocol):
+        if protocol < 5:
+            return _from_bytes, (self.to_bytes(),)
+        # Protocol 5 pickles the value arrays without copying them, or
+        # out-of-band with a buffer_callback.  They are in native byte order.
+        # Loading copies each buffer once, into a new array.
+        return _from_buffers, (
+            [
+                (
+                    seg.start,
+                    seg.step,
+                    seg.phase,
+                    getattr(seg.values, "typecode", None),
+                    (
+                        pickle.PickleBuffer(seg.values)
+                        if isinstance(seg.values, array)
+                        else seg.values
+                    ),
+                    None if seg.times is None else pickle.PickleBuffer(seg.times),
+                )
+                for seg in self.segments
+            ],
+        )
+
+    @property
+    def start(self):
+        return self.segments[0].start if self.segments else None
+
+    @property
+    def end(self):
+        """Timestamp of the last point."""
+        return self.segments[-1].end if self.segments else None
+
+    @property
+    def nbytes(self):
+        """Bytes held by the values, and the segments for object values."""
+        return sum(
+            (
+                seg.values.itemsize * len(seg.values)
+                if isinstance(seg.values, array)
+                else sys.getsizeof(seg.values)
+            )
+            + (0 if seg.times is None else 8 * len(seg.times))
+            for seg in self.segments
+        )
+
+    def gaps(self):
+        """
+        (end, start) of every gap between segments, end being the last point
+        before it.  Gaps within irregular data aren't listed.
+        """
+        return [(a.end, b.start) for a, b in zip(self.segments, self.segments[1:])]
+
+    def timestamps(self):
+        """Every timestamp, as an array of int64."""
+        timestamps = array("q")
+        for seg in self.segments:
+            timestamps.extend(seg.timestamps())
+        return timestamps
+
+    def values(self):
+        """Every value, as an array when they all have the same type."""
+        typecodes = {getattr(seg.values, "typecode", None) for seg in self.segments}
+        if len(typecodes) == 1 and None not in typecodes:
+            values = array(typecodes.pop())
+        else:
+            values = []
+        for seg in self.segments:
+            values.extend(seg.values)
+        return values
+
+    def downsample(self, n, method="minmax"):
+        """(timestamps, values) numpy arrays of at most `n` points."""
+        from .downsample import downsample
+
+        return downsample(self, n, method)
+
+    def to_bytes(self):
+        """A little-endian binary copy of the series, see from_bytes()."""
+        irregular = any(seg.times is not None for seg in self.segments)
+        magic = _MAGIC_IRREGULAR if irregular else _MAGIC
+        chunks = [_HEADER.pack(magic, len(self.segments))]
+        for seg in self.segments:
+            if isinstance(seg.values, array):
+                typecode = seg.values.typecode.encode()
+                body = _little_endian(seg.values)
+            else:
+                typecode = _JSON
+                body = json.dumps(seg.values, separators=(",", ":")).encode()
+                body = struct.pack("<I", len(body)) + body
+            if seg.times is not None:
+                # A NaN step marks the timestamps ahead of the values.
+                step = float("nan")
+                body = _little_endian(seg.times) + body
+            else:
+                step = seg.step
+            chunks.append(_SEGMENT.pack(seg.start, step, seg.phase, len(seg), typecode))
+            chunks.append(body)
+        return b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data)
+        magic, n = _HEADER.unpack_from(data)
+        if magic not in (_MAGIC, _MAGIC_IRREGULAR):
+            raise ValueError("Not a CompactSeries")
+        pos = _HEADER.size
+        segments = []
+        for _ in range(n):
+            start, step, phase, count, typecode = _SEGMENT.unpack_from(data, pos)
+            pos += _SEGMENT.size
+            times = None
+            if step != step:
+                step = None
+                times, pos = _read_array(data, pos, "q", count)
+            elif step.is_integer():
+                step = int(step)
+            if typecode == _JSON:
+                (size,) = struct.unpack_from("<I", data, pos)
+                pos += 4
+                values = json.loads(bytes(data[pos : pos + size]))
+                pos += size
+            else:
+                values, pos = _read_array(data, pos, typecode.decode(), count)
+            segments.append(Segment(start, step, values, phase, times))
+        return cls(segments)
+
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_array(data, pos, typecode, count):
+    """The array of `count` little-endian items at `pos`, and the next pos."""
+    values = array(typecode)
+    size = count * values.itemsize
+    values.frombytes(data[pos : pos + size])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, pos + size
+
+
+def _from_bytes(data):
+    return CompactSeries.from_bytes(data)
+
+
+def _from_buffers(segments):
+    rebuilt = []
+    for start, step, phase, typecode, values, times in segments:
+        if typecode is not None:
+            values = _from_buffer(typecode, values)
+        if times is not None:
+            times = _from_buffer("q", times)
+        rebuilt.append(Segment(start, step, values, phase, times))
+    return CompactSeries(rebuilt)
+
+
+def _from_buffer(typecode, buffer):
+    values = array(typecode)
+    values.frombytes(memoryview(buffer).cast("B"))
+    return values
+
+
+def _runs(timestamps, step, limit):
+    """
+    (first, end, phase) of each run of `timestamps` spaced by `step`, None
+    when there are more than `limit`.
+    """
+    n = len(timestamps)
+    if isinstance(step, int):
+        cuts = _cuts(timestamps, step, limit)
+        if len(cuts) >= limit:
+            return None
+        bounds = [0, *cuts, n] if n else []
+        return [(a, b, 0.0) for a, b in zip(bounds, bounds[1:])]
+    runs = []
+    first = 0
+    lo, hi = 0.0, 1.0
+    for i in range(1, n):
+        offset = timestamps[i] - timestamps[first]
+        count = i - first
+        # Narrows the phases giving every timestamp so far.
+        new_lo = max(lo, offset - count * step)
+        new_hi = min(hi, offset + 1 - count * step)
+        if new_hi - new_lo > 1e-9:
+            lo, hi = new_lo, new_hi
+            continue
+        runs.append((first, i, (lo + hi) / 2))
+        if len(runs) >= limit:
+            return None
+        first = i
+        lo, hi = 0.0, 1.0
+    if n:
+        runs.append((first, n, (lo + hi) / 2))
+    return runs
+
+
+def _cuts(timestamps, step, limit):
+    """The indexes where the spacing of `timestamps` isn't `step`, up to `limit`."""
+    n = len(timestamps)
+    if isinstance(timestamps, array) and n:
+        # Compared in C: a single segment is the common case.
+        start = timestamps[0]
+        regular = array(timestamps.typecode, range(start, start + n * step, step))
+        if timestamps == regular:
+            return []
+    deltas = map(sub, islice(timestamps, 1, None), timestamps)
+    return list(islice((i for i, d in enumerate(deltas, 1) if d != step), limit))
+
+
+def _guess_step(timestamps, n=10000):
+    """
+    The spacing of the first `n` timestamps, an int when exact, else the
+    simplest fraction matching the longest run of evenly spaced points.
+    """
+    timestamps = list(islice(timestamps, n + 1))
+    deltas = [b - a for a, b in zip(timestamps, timestamps[1:])]
+    if not deltas:
+        return 1
+    median = sorted(deltas)[len(deltas) // 2]
+    if median <= 0:
+        return 1
+    # Rates that aren't a divisor of the timestamp frequency alternate between
+    # two deltas, eg. 3 and 4 ticks for 256 Hz data at 1000 Hz.
+    best = (0, 0)
+    run_start = 0
+    for i, d in enumerate(deltas + [None]):
+        if d is None or not 0 < d <= median + 1 or abs(d - median) > 1:
+            if i - run_start > best[1] - best[0]:
+                best = (run_start, i)
+            run_start = i + 1
+    a, b = best
+    if all(d == median for d in deltas[a:b]):
+        return median
+    step = (timestamps[b] - timestamps[a]) / (b - a)
+    tolerance = 1 / (b - a)
+    for q in range(1, 1025):
+        p = round(step * q)
+        if abs(p / q - step) <= tolerance:
+            return p / q
+    return step
+
+
+def _pack(values):
+    """The values as the smallest array holding them, or a list."""
+    if isinstance(values, array):
+        if values.typecode in "fd":
+            return values if values.typecode == "d" else array("d", values)
+        # Already ints: only the narrowest typecode is left to find.
+        lo, hi = min(values, default=0), max(values, default=0)
+        for typecode, tc_min, tc_max in _INT_TYPECODES:
+            if tc_min <= lo and hi <= tc_max:
+                return array(typecode, values)
+    if all(type(v) is int for v in values):
+        lo, hi = min(values), max(values)
+        for typecode, tc_min, tc_max in _INT_TYPECODES:
+            if tc_min <= lo and hi <= tc_max:
+                return array(typecode, values)
+        return values
+    if all(type(v) is float or type(v) is int for v in values):
+        return array("d", values)
+    return values
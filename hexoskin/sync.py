@@ -0,0 +1,328 @@
+"""
+Keeps a local mirror of the records and ranges of a study, or of some users,
+up to date by fetching only what changed since the last run.
+
+    sync = StudySync(api, "mirror/state.sqlite", datatypes=(4, 19),
+                     output_dir="mirror/")
+    print(sync.run(study=42))
+
+The SQLite state file holds the known resources, the last `last_modified`
+seen per user and resource type, and the data spans already downloaded per
+user and datatype.  A run lists only the resources modified since the
+previous one and fetches the data spans not covered yet, eg. the end of a
+record still being recorded.  Data is appended to a columnar dataset (see
+hexoskin.columnar) in `output_dir`, or handed to `on_result`.  Deleted
+resources aren't detected.
+
+When a known resource changes, eg. data uploaded late, its whole span is
+downloaded again, so the dataset can hold the same points twice: drop the
+duplicate timestamps of each user and datatype when reading it.
+"""
+
+from __future__ import annotations
+
+import datetime
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .export import _id
+from .planner import DataRequirement, QueryPlanner
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    user INTEGER NOT NULL,
+    start INTEGER,
+    "end" INTEGER,
+    last_modified TEXT,
+    PRIMARY KEY (kind, id)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    user INTEGER NOT NULL,
+    datatype INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    "end" INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_user ON coverage (user, datatype, start);
+CREATE TABLE IF NOT EXISTS marks (
+    kind TEXT NOT NULL,
+    user INTEGER NOT NULL,
+    last_modified TEXT NOT NULL,
+    PRIMARY KEY (kind, user)
+);
+"""
+
+
+class SyncReport:
+    def __init__(self):
+        self.new = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.spans = 0
+        self.seconds = 0.0
+        self.started = time.monotonic()
+
+    def __str__(self):
+        return (
+            "%s new, %s changed, %s unchanged resources, "
+            "%s data spans (%.0f s of data) in %.1f s"
+            % (
+                self.new,
+                self.changed,
+                self.unchanged,
+                self.spans,
+                self.seconds,
+                time.monotonic() - self.started,
+            )
+        )
+
+
+class StudySync:
+    """
+    Args:
+        api (): HexoApi
+        path (): SQLite state file, created if needed
+        datatypes (): datatype ids to mirror
+        output_dir (): columnar dataset directory, unless `on_result` is given
+        format (): "parquet" or "arrow"
+        kinds (): resources to mirror, "record" and/or "range"
+        on_result (): called with (user, ApiDataList) for every data chunk
+            instead of writing files
+        max_workers (): users synced at once
+    """
+
+    def __init__(
+        self,
+        api,
+        path,
+        datatypes,
+        output_dir=None,
+        format="parquet",
+        kinds=("record", "range"),
+        on_result=None,
+        max_workers=4,
+    ):
+        if output_dir is None and on_result is None:
+            raise ValueError("StudySync needs an output_dir or an on_result callback.")
+        self.api = api
+        self.path = path
+        self.datatypes = tuple(datatypes)
+        self.output_dir = output_dir
+        self.format = format
+        self.kinds = tuple(kinds)
+        self.on_result = on_result
+        self.max_workers = max_workers
+        self.planner = QueryPlanner(api, max_span=None)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def run(self, users=None, study=None):
+        """
+        Syncs `users` (ids or ApiResourceInstances), the members of `study`,
+        or every user the credentials can see.  Returns a SyncReport.
+        """
+        if users is None:
+            if study is not None:
+                users = self.api.user.list(study=study).iter_all()
+            else:
+                users = self.api.user.list().iter_all()
+        users = [_id(u) for u in users]
+        report = SyncReport()
+        # Files of successive runs must not overwrite each other.
+        run_id = "%s-%s" % (time.strftime("%Y%m%dT%H%M%S"), uuid.uuid4().hex[:8])
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for future in [
+                pool.submit(self._sync_user, user, report, run_id) for user in users
+            ]:
+                future.result()
+        return report
+
+    def missing(self, user, start, end, datatypes=None):
+        """The (start, end, datatypes) spans of [start, end) not downloaded yet."""
+        spans = []
+        with self._lock:
+            for datatype in datatypes or self.datatypes:
+                covered = self._db.execute(
+                    'SELECT start, "end" FROM coverage WHERE user = ? AND datatype = ? '
+                    'AND "end" > ? AND start < ? ORDER BY start',
+                    (user, datatype, start, end),
+                ).fetchall()
+                for s, e in _subtract(start, end, covered):
+                    spans.append((s, e, (datatype,)))
+        return spans
+
+    def _sync_user(self, user, report, run_id):
+        for kind in self.kinds:
+            self._update_resources(kind, user, report)
+        # Every known resource is checked against the coverage, so data
+        # that failed to download in a previous run is fetched again.
+        with self._lock:
+            resources = self._db.execute(
+                'SELECT start, "end" FROM resources WHERE user = ? AND kind IN (%s) '
+                "AND start IS NOT NULL" % ", ".join("?" * len(self.kinds)),
+                (user,) + self.kinds,
+            ).fetchall()
+        # A record still being recorded: its data so far, like the exporter.
+        now = int(time.time() * self.api.freq)
+        requirements = [
+            DataRequirement(user, s, e, datatypes)
+            for start, end in resources
+            for s, e, datatypes in self.missing(
+                user, start, end if end is not None else now
+            )
+        ]
+        if not requirements:
+            return
+
+        for i, query in enumerate(self.planner.plan(requirements)):
+            results = self.api.data.iter_chunks(
+                query.start, query.end, user=user, datatype__in=query.datatypes
+            )
+            if self.on_result is None:
+                # A writer per query: one failing partway deletes its files,
+                # leaving the span to download again on the next run.
+                with self._writer("%s-%s" % (run_id, i)) as writer:
+                    for result in results:
+                        writer.write_result(result, user=user)
+            else:
+                for result in results:
+                    self.on_result(user, result)
+            # Coverage is only recorded for data that is on disk.
+            with self._lock, self._db:
+                for datatype in query.datatypes:
+                    self._add_coverage(user, datatype, query.start, query.end)
+                report.spans += 1
+                report.seconds += (query.end - query.start) / self.api.freq
+
+    def _writer(self, name):
+        from .columnar import ColumnarWriter
+
+        return ColumnarWriter(
+            self.output_dir,
+            self.format,
+            partition_by=("user", "day"),
+            freq=self.api.freq,
+            basename="part-%s" % name,
+        )
+
+    def _update_resources(self, kind, user, report):
+        """Stores the resources of `user` modified since the last run."""
+        accessor = getattr(self.api, kind)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT last_modified FROM marks WHERE kind = ? AND user = ?",
+                (kind, user),
+            ).fetchone()
+        filters = {"user": user}
+        if row is not None and "last_modified" in accessor._conf.get("filtering", {}):
+            filters["last_modified__gte"] = row[0]
+
+        mark = row[0] if row is not None else None
+        for obj in accessor.list(**filters).iter_all():
+            fields = obj.fields
+            values = (
+                _id(fields["user"]),
+                fields.get("start"),
+                fields.get("end"),
+                fields.get("last_modified"),
+            )
+            with self._lock, self._db:
+                known = self._db.execute(
+                    'SELECT user, start, "end", last_modified FROM resources '
+                    "WHERE kind = ? AND id = ?",
+                    (kind, fields["id"]),
+                ).fetchone()
+                if known == values:
+                    report.unchanged += 1
+                    continue
+                self._db.execute(
+                    "INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?)",
+                    (kind, fields["id"]) + values,
+                )
+                if known is None:
+                    report.new += 1
+                else:
+                    report.changed += 1
+                    # Data may have been uploaded late within spans already
+                    # downloaded: they are fetched again.
+                    now = int(time.time() * self.api.freq)
+                    for u, start, end in (known[:3], values[:3]):
+                        if start is not None:
+                            self._remove_coverage(
+                                u, start, end if end is not None else now
+                            )
+            if values[3] is not None and (mark is None or _later(values[3], mark)):
+                mark = values[3]
+
+        if mark is not None:
+            with self._lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO marks VALUES (?, ?, ?)", (kind, user, mark)
+                )
+
+    def _add_coverage(self, user, datatype, start, end):
+        """Merges [start, end) into the coverage of (user, datatype)."""
+        rows = self._db.execute(
+            'SELECT rowid, start, "end" FROM coverage WHERE user = ? AND datatype = ? '
+            'AND "end" >= ? AND start <= ?',
+            (user, datatype, start, end),
+        ).fetchall()
+        for rowid, s, e in rows:
+            start = min(start, s)
+            end = max(end, e)
+            self._db.execute("DELETE FROM coverage WHERE rowid = ?", (rowid,))
+        self._db.execute(
+            "INSERT INTO coverage VALUES (?, ?, ?, ?)", (user, datatype, start, end)
+        )
+
+    def _remove_coverage(self, user, start, end):
+        """Removes [start, end) from the coverage of every datatype of `user`."""
+        rows = self._db.execute(
+            'SELECT rowid, datatype, start, "end" FROM coverage WHERE user = ? '
+            'AND "end" > ? AND start < ?',
+            (user, start, end),
+        ).fetchall()
+        for rowid, datatype, s, e in rows:
+            self._db.execute("DELETE FROM coverage WHERE rowid = ?", (rowid,))
+            for a, b in ((s, start), (end, e)):
+                if a < b:
+                    self._db.execute(
+                        "INSERT INTO coverage VALUES (?, ?, ?, ?)",
+                        (user, datatype, a, b),
+                    )
+
+
+def _subtract(start, end, covered):
+    """[start, end) minus the sorted `covered` spans."""
+    spans = []
+    for s, e in covered:
+        if s > start:
+            spans.append((start, min(s, end)))
+        start = max(start, e)
+        if start >= end:
+            break
+    if start < end:
+        spans.append((start, end))
+    return spans
+
+
+def _later(a, b):
+    try:
+        return datetime.datetime.fromisoformat(a) > datetime.datetime.fromisoformat(b)
+    except ValueError:
+        return a > b
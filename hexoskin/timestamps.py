@@ -0,0 +1,98 @@
+"""
+Conversions between datetimes or epoch seconds and Hexoskin timestamps,
+which count ticks of `freq` per second since the epoch: api.freq, 256 on
+api.hexoskin.com.
+
+    to_ticks(datetime.datetime(2024, 1, 31, 8, tzinfo=tz), api.freq)
+    to_ticks(numpy_datetime64_array, api.freq)  # -> int64 array
+    from_ticks(record.start, api.freq)          # -> UTC datetime
+
+Naive datetimes are in local time, like datetime.timestamp(), unless `tz`
+is given; numpy datetime64 values are UTC.  Conversions are exact, in
+integer microseconds or nanoseconds, and round down to the tick containing
+the instant.  Arrays need the `numpy` package.
+"""
+
+from __future__ import annotations
+
+import datetime
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_NS = 10**9
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("Converting arrays requires the numpy package.") from e
+    return numpy
+
+
+def to_ticks(value, freq=256, tz=None):
+    """
+    Ticks of a datetime, a date (its midnight), epoch seconds, a numpy
+    datetime64, or an array or sequence of those, as an int or an int64
+    array.
+
+    Args:
+        value (): what to convert
+        freq (): ticks per second, api.freq
+        tz (): timezone of naive datetimes and dates, local time if None
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=tz) if tz is not None else value.astimezone()
+        delta = value - _EPOCH
+        us = (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+        return us * freq // 10**6
+    if isinstance(value, datetime.date):
+        return to_ticks(datetime.datetime.combine(value, datetime.time()), freq, tz)
+    if isinstance(value, int):
+        return value * freq
+    if isinstance(value, float):
+        return int(value * freq // 1)
+
+    np = _import_numpy()
+    array = np.asarray(value)
+    if array.dtype.kind == "M":
+        ns = array.astype("datetime64[ns]").astype(np.int64)
+        # Split to keep ns * freq within int64.
+        ticks = ns // _NS * freq + ns % _NS * freq // _NS
+    elif array.dtype.kind in "iu":
+        ticks = array.astype(np.int64) * freq
+    elif array.dtype.kind == "f":
+        ticks = np.floor(array * freq).astype(np.int64)
+    else:
+        ticks = np.fromiter(
+            (to_ticks(v, freq, tz) for v in array.ravel()),
+            dtype=np.int64,
+            count=array.size,
+        ).reshape(array.shape)
+    return ticks if array.ndim else int(ticks)
+
+
+def from_ticks(ticks, freq=256, tz=datetime.timezone.utc):
+    """
+    The datetime, in `tz`, of a timestamp, or the datetime64[ns] array
+    (UTC) of an array or sequence of timestamps.
+    """
+    if isinstance(ticks, int):
+        seconds, rest = divmod(ticks, freq)
+        dt = _EPOCH + datetime.timedelta(
+            seconds=seconds, microseconds=rest * 10**6 // freq
+        )
+        return dt.astimezone(tz)
+
+    np = _import_numpy()
+    ticks = np.asarray(ticks, dtype=np.int64)
+    ns = ticks // freq * _NS + ticks % freq * _NS // freq
+    return ns.astype("datetime64[ns]")
+
+
+def to_epoch(ticks, freq=256):
+    """Epoch seconds of a timestamp, or a float array of them."""
+    if isinstance(ticks, int):
+        return ticks / freq
+    np = _import_numpy()
+    return np.asarray(ticks, dtype=np.int64) / freq
@@ -0,0 +1,243 @@
+"""
+Transports send the HTTP requests built by ApiHelper._request.
+
+RequestsTransport is the default.  RecordingTransport saves the exchanges
+going through another transport to a cassette file, with credentials
+scrubbed, and ReplayTransport answers from such a cassette without network:
+
+    api = HexoApi(key, secret, auth=auth, transport=RecordingTransport("run.hxc"))
+    ...  # real requests
+    api.transport.save()
+
+    api = HexoApi(key, secret, auth=auth, transport=ReplayTransport("run.hxc"))
+    ...  # the same requests, answered from run.hxc
+"""
+
+from __future__ import annotations
+
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .errors import ApiError
+
+SCRUBBED_FIELDS = {
+    "access_token",
+    "client_secret",
+    "oauth_token",
+    "oauth_token_secret",
+    "password",
+    "refresh_token",
+}
+KEPT_RESPONSE_HEADERS = ("content-type", "location")
+
+
+class RequestsTransport:
+    """Sends requests with the `requests` library, through `session` if given."""
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def send(self, method, url, **kwargs):
+        if self.session is None:
+            return requests.request(method, url, **kwargs)
+        return self.session.request(method, url, **kwargs)
+
+
+class RecordingTransport:
+    """
+    Sends requests through `transport` and keeps every exchange until
+    save() writes them to the gzipped JSON lines cassette at `path`.
+    Request headers, where the credentials and signatures are, are never
+    recorded; request bodies are only kept as a hash, and token or password
+    fields of JSON and form-encoded responses, such as the OAuth1 token
+    exchange, are replaced by "<scrubbed>".
+    Exchanges are keyed on the requested URL, before any redirect.  A
+    streamed body is recorded as the caller reads it, once read to the end.
+    """
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.save()
+
+    def send(self, method, url, **kwargs):
+        start = time.perf_counter()
+        response = self.transport.send(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        entry = {
+            "method": method.upper(),
+            "url": _prepare(method, url, kwargs.get("params")).url,
+            "body": _body_hash(kwargs.get("data")),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                k: v
+                for k, v in response.headers.items()
+                if k.lower() in KEPT_RESPONSE_HEADERS
+            },
+            "elapsed": round(elapsed, 6),
+        }
+        if kwargs.get("stream"):
+            # response.content and iter_lines() read through iter_content().
+            response.iter_content = self._recording(response, entry)
+        else:
+            self._record(entry, response.content, response.headers)
+        return response
+
+    def _record(self, entry, content, headers):
+        entry.update(_encode_content(content, headers))
+        with self._lock:
+            self.entries.append(entry)
+
+    def _recording(self, response, entry):
+        iter_content = response.iter_content
+
+        def recording_iter_content(chunk_size=1, decode_unicode=False):
+            chunks = []
+            for chunk in iter_content(chunk_size, decode_unicode):
+                chunks.append(chunk)
+                yield chunk
+            # Later reads of the body aren't recorded again.
+            response.iter_content = iter_content
+            encoding = response.encoding or "utf8"
+            content = b"".join(
+                c if isinstance(c, bytes) else c.encode(encoding) for c in chunks
+            )
+            self._record(entry, content, response.headers)
+
+        return recording_iter_content
+
+    def save(self):
+        with self._lock:
+            entries = list(self.entries)
+        with gzip.open(self.path, "wt", encoding="utf8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+class ReplayTransport:
+    """
+    Answers requests from a cassette written by RecordingTransport.
+    Requests are matched on method, URL (query string included) and body;
+    identical requests get the recorded responses in order, the last one
+    being repeated.
+    `latency` adds a fixed delay in seconds, or the recorded duration times
+    `latency_factor` when set to "recorded".
+    """
+
+    def __init__(self, path, latency=None, latency_factor=1.0):
+        self.path = path
+        self.latency = latency
+        self.latency_factor = latency_factor
+        self._responses = defaultdict(deque)
+        self._lock = threading.Lock()
+        with gzip.open(path, "rt", encoding="utf8") as f:
+            for line in f:
+                entry = json.loads(line)
+                key = (entry["method"], entry["url"], entry["body"])
+                self._responses[key].append(entry)
+
+    def send(self, method, url, params=None, data=None, **kwargs):
+        prepared = _prepare(method, url, params)
+        key = (prepared.method, prepared.url, _body_hash(data))
+        with self._lock:
+            entries = self._responses.get(key)
+            if not entries:
+                raise ApiError(
+                    "No recorded response for %s %s in %s"
+                    % (prepared.method, prepared.url, self.path)
+                )
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+        if self.latency == "recorded":
+            time.sleep(entry["elapsed"] * self.latency_factor)
+        elif self.latency:
+            time.sleep(self.latency)
+        return _build_response(entry, prepared)
+
+
+def _prepare(method, url, params):
+    return requests.Request(method.upper(), url, params=params).prepare()
+
+
+def _body_hash(data):
+    if not data:
+        return None
+    if isinstance(data, dict):
+        data = json.dumps(_scrub(data), sort_keys=True)
+    if isinstance(data, str):
+        data = data.encode("utf8")
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def _scrub(obj):
+    if isinstance(obj, dict):
+        return {
+            k: "<scrubbed>" if k in SCRUBBED_FIELDS else _scrub(v)
+            for k, v in obj.items()
+        }
+    if isinstance(obj, list):
+        return [_scrub(v) for v in obj]
+    return obj
+
+
+def _scrub_form(text):
+    """
+    Scrubs `text` if it is a form-encoded body with token or password
+    fields, whatever its content type, and returns it as is otherwise.
+    """
+    try:
+        fields = parse_qsl(text, keep_blank_values=True, strict_parsing=True)
+    except ValueError:
+        return text
+    if not any(k in SCRUBBED_FIELDS for k, _ in fields):
+        return text
+    return urlencode(
+        [(k, "<scrubbed>" if k in SCRUBBED_FIELDS else v) for k, v in fields],
+        safe="<>",
+    )
+
+
+def _encode_content(content, headers):
+    if headers.get("content-type", "").startswith("application/json"):
+        try:
+            return {"json": _scrub(json.loads(content))}
+        except ValueError:
+            pass
+    try:
+        return {"text": _scrub_form(content.decode("utf8"))}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(content).decode("ascii")}
+
+
+def _build_response(entry, prepared):
+    response = requests.models.Response()
+    response.status_code = entry["status"]
+    response.reason = entry["reason"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.url = prepared.url
+    response.request = prepared
+    response.encoding = "utf8"
+    if "json" in entry:
+        response._content = json.dumps(entry["json"]).encode("utf8")
+    elif "text" in entry:
+        response._content = entry["text"].encode("utf8")
+    else:
+        response._content = base64.b64decode(entry["base64"])
+    response._content_consumed = True
+    return response
@@ -0,0 +1,363 @@
+"""
+Extracts a zip archive while it downloads, eg. a raw export requested as
+application/octet-stream, without holding it in memory or on disk first.
+
+    api.data.extract("export/", {"record": 123}, members=["ECG_*", "*.json"])
+
+Entries are read one after the other from their local headers, through a
+buffer of a few blocks.  Each one is written to a `.part` file, renamed once
+its CRC-32 and size have been checked; entries not matching `members` are
+read past without being written.  With `arrays`, WAV entries (one per
+channel) become `.npy` files of their samples, loadable with numpy.load().
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+import zipfile
+import zlib
+from fnmatch import fnmatch
+
+_LOCAL = b"PK\x03\x04"
+_DESCRIPTOR = b"PK\x07\x08"
+# Central directory, end of central directory, and their zip64 variants.
+_END = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06", b"PK\x06\x07")
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_BLOCK = 65536
+_NPY_HEADER_SIZE = 128
+# WAV (format, bits per sample) -> numpy dtype
+_WAV_DTYPES = {
+    (1, 8): "|u1",
+    (1, 16): "<i2",
+    (1, 32): "<i4",
+    (3, 32): "<f4",
+    (3, 64): "<f8",
+}
+
+
+def extract_zip(chunks, output_dir, members=None, arrays=False):
+    """
+    Extracts the archive in `chunks`, an iterable of bytes, eg.
+    response.iter_content(), into `output_dir`.  Returns the paths written.
+    Raises zipfile.BadZipFile for a truncated or corrupt archive, leaving the
+    entries extracted before it in place.
+
+    Args:
+        chunks (): the archive, as an iterable of bytes
+        output_dir (): extraction directory, created if needed
+        members (): glob patterns matched against entry names and their
+            base names, eg. ["ECG_*"], or a callable taking the name;
+            every entry by default
+        arrays (): write WAV entries as .npy arrays of their samples
+    """
+    reader = _Reader(chunks)
+    paths = []
+    os.makedirs(output_dir, exist_ok=True)
+    while True:
+        # The archive ends with its central directory; running out of data
+        # before it means the download was cut off, even between entries.
+        signature = reader.read_exact(4)
+        if signature in _END:
+            break
+        if signature != _LOCAL:
+            raise zipfile.BadZipFile("Bad local header signature: %r" % signature)
+        entry = _read_local_header(reader)
+        if entry.name.endswith("/"):
+            if _wanted(entry.name, members):
+                os.makedirs(_target(output_dir, entry.name), exist_ok=True)
+            _read_data(reader, entry, None)
+            continue
+        sink = None
+        if _wanted(entry.name, members):
+            path = _target(output_dir, entry.name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if arrays and entry.name.lower().endswith(".wav"):
+                sink = _WavArraySink(path)
+            else:
+                sink = _FileSink(path)
+        try:
+            _read_data(reader, entry, sink)
+        except BaseException:
+            if sink is not None:
+                sink.abort()
+            raise
+        if sink is not None:
+            paths.append(sink.close())
+    return paths
+
+
+class _Entry:
+    __slots__ = ("name", "flags", "method", "crc", "csize", "usize", "zip64")
+
+    def __init__(self, name, flags, method, crc, csize, usize, zip64):
+        self.name = name
+        self.flags = flags
+        self.method = method
+        self.crc = crc
+        self.csize = csize
+        self.usize = usize
+        self.zip64 = zip64
+
+    @property
+    def has_descriptor(self):
+        return bool(self.flags & 0x08)
+
+
+class _Reader:
+    """Exact reads from an iterable of chunks, holding one chunk at most."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def read(self, n):
+        """Up to `n` bytes, fewer only at the end of the stream."""
+        while len(self._buffer) < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer = self._buffer + chunk if self._buffer else chunk
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    def read_exact(self, n):
+        data = self.read(n)
+        if len(data) != n:
+            raise zipfile.BadZipFile("Truncated archive")
+        return data
+
+    def unread(self, data):
+        self._buffer = data + self._buffer
+
+
+def _read_local_header(reader):
+    (
+        _,
+        _,
+        flags,
+        method,
+        _,
+        _,
+        crc,
+        csize,
+        usize,
+        name_size,
+        extra_size,
+    ) = _LOCAL_HEADER.unpack(_LOCAL + reader.read_exact(_LOCAL_HEADER.size - 4))
+    raw_name = reader.read_exact(name_size)
+    extra = reader.read_exact(extra_size)
+    name = raw_name.decode("utf-8" if flags & 0x800 else "cp437")
+    zip64 = False
+    # The zip64 extra field holds the sizes that don't fit in 32 bits.
+    i = 0
+    while i + 4 <= len(extra):
+        tag, size = struct.unpack_from("<HH", extra, i)
+        if tag == 0x0001:
+            zip64 = True
+            values = iter(struct.unpack_from("<%sQ" % (size // 8), extra, i + 4))
+            if usize == 0xFFFFFFFF:
+                usize = next(values)
+            if csize == 0xFFFFFFFF:
+                csize = next(values)
+        i += 4 + size
+    if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        raise zipfile.BadZipFile(
+            "Unsupported compression method %s for %s" % (method, name)
+        )
+    return _Entry(name, flags, method, crc, csize, usize, zip64)
+
+
+def _read_data(reader, entry, sink):
+    """Reads the data of `entry`, writing it to `sink` unless None."""
+    crc = 0
+    usize = 0
+    if entry.method == zipfile.ZIP_STORED:
+        if entry.has_descriptor:
+            raise zipfile.BadZipFile(
+                "%s is stored without its size, it can't be streamed" % entry.name
+            )
+        remaining = entry.csize
+        while remaining:
+            block = reader.read_exact(min(remaining, _BLOCK))
+            remaining -= len(block)
+            crc = zlib.crc32(block, crc)
+            usize += len(block)
+            if sink is not None:
+                sink.write(block)
+    else:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        remaining = None if entry.has_descriptor else entry.csize
+        while not decompressor.eof:
+            size = _BLOCK if remaining is None else min(remaining, _BLOCK)
+            block = reader.read(size) if size else b""
+            if not block:
+                raise zipfile.BadZipFile("Truncated data for %s" % entry.name)
+            if remaining is not None:
+                remaining -= len(block)
+            # Bounded output, whatever the compression ratio.
+            data = decompressor.decompress(block, _BLOCK)
+            while True:
+                crc = zlib.crc32(data, crc)
+                usize += len(data)
+                if sink is not None and data:
+                    sink.write(data)
+                # unconsumed_tail is left as is once the stream has ended.
+                if decompressor.eof or not decompressor.unconsumed_tail:
+                    break
+                data = decompressor.decompress(decompressor.unconsumed_tail, _BLOCK)
+        if decompressor.unused_data:
+            reader.unread(decompressor.unused_data)
+
+    if entry.has_descriptor:
+        head = reader.read_exact(4)
+        if head == _DESCRIPTOR:
+            head = reader.read_exact(4)
+        sizes = reader.read_exact(16 if entry.zip64 else 8)
+        entry.crc = struct.unpack("<I", head)[0]
+        entry.csize, entry.usize = struct.unpack("<QQ" if entry.zip64 else "<II", sizes)
+    if crc != entry.crc:
+        raise zipfile.BadZipFile("Bad CRC-32 for %s" % entry.name)
+    if usize != entry.usize:
+        raise zipfile.BadZipFile("Bad size for %s" % entry.name)
+
+
+def _wanted(name, members):
+    if members is None:
+        return True
+    if callable(members):
+        return members(name)
+    base = name.rstrip("/").rpartition("/")[2]
+    return any(fnmatch(name, p) or fnmatch(base, p) for p in members)
+
+
+def _target(output_dir, name):
+    """The path of entry `name` in `output_dir`, refusing to leave it."""
+    parts = name.replace("\\", "/").split("/")
+    if name.startswith("/") or ":" in parts[0] or ".." in parts:
+        raise zipfile.BadZipFile("Unsafe entry name: %s" % name)
+    return os.path.join(output_dir, *[p for p in parts if p])
+
+
+class _FileSink:
+    def __init__(self, path):
+        self.path = path
+        self.tmp = path + ".part"
+        self.file = open(self.tmp, "wb")
+
+    def write(self, data):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        os.replace(self.tmp, self.path)
+        return self.path
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.tmp)
+
+
+class _WavArraySink:
+    """
+    Writes the samples of a PCM WAV entry as a .npy file, or the entry as is
+    when its sample format has no numpy equivalent.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.head = b""
+        self.sink = None
+        self.dtype = None
+        self.channels = 1
+        self.size = 0
+        # Bytes of sample data left in the data chunk, None if unknown.
+        self.left = None
+
+    def write(self, data):
+        if self.sink is None:
+            self.head += data
+            parsed = _parse_wav_header(self.head)
+            if parsed is None:
+                if len(self.head) > _BLOCK:
+                    self._write_as_is()
+                return
+            fmt, bits, channels, offset, data_size = parsed
+            dtype = _WAV_DTYPES.get((fmt, bits))
+            if dtype is None:
+                self._write_as_is()
+                return
+            self.dtype, self.channels = dtype, channels
+            if data_size not in (0, 0xFFFFFFFF):
+                self.left = data_size
+            self.sink = _FileSink(os.path.splitext(self.path)[0] + ".npy")
+            self.sink.write(b"\0" * _NPY_HEADER_SIZE)
+            data, self.head = self.head[offset:], b""
+        elif self.dtype is None:
+            self.sink.write(data)
+            return
+        if self.left is not None:
+            # Chunks after the samples, eg. LIST, are left out.
+            data = data[: self.left]
+            self.left -= len(data)
+        self.size += len(data)
+        self.sink.write(data)
+
+    def close(self):
+        if self.sink is None:
+            self._write_as_is()
+        if self.dtype is not None:
+            frame = int(self.dtype[2:]) * self.channels
+            n = self.size // frame
+            f = self.sink.file
+            # Drops an incomplete last frame.
+            f.truncate(_NPY_HEADER_SIZE + n * frame)
+            f.seek(0)
+            shape = (n,) if self.channels == 1 else (n, self.channels)
+            f.write(_npy_header(self.dtype, shape))
+        return self.sink.close()
+
+    def abort(self):
+        if self.sink is not None:
+            self.sink.abort()
+
+    def _write_as_is(self):
+        self.sink = _FileSink(self.path)
+        self.sink.write(self.head)
+        self.head = b""
+
+
+def _parse_wav_header(head):
+    """
+    (format, bits, channels, data offset, data size) of a RIFF WAVE header,
+    None until the data chunk is in `head`.
+    """
+    if len(head) < 12:
+        return None
+    if head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return (None, None, None, 0, 0)
+    fmt = bits = channels = None
+    i = 12
+    while i + 8 <= len(head):
+        chunk_id = head[i : i + 4]
+        (size,) = struct.unpack_from("<I", head, i + 4)
+        if chunk_id == b"data":
+            return fmt, bits, channels, i + 8, size
+        if chunk_id == b"fmt " and i + 24 <= len(head):
+            fmt, channels = struct.unpack_from("<HH", head, i + 8)
+            (bits,) = struct.unpack_from("<H", head, i + 22)
+            if fmt == 0xFFFE and i + 34 <= len(head):
+                # WAVE_FORMAT_EXTENSIBLE: the format is in the sub-format GUID.
+                (fmt,) = struct.unpack_from("<H", head, i + 32)
+        i += 8 + size + size % 2
+    return None
+
+
+def _npy_header(dtype, shape):
+    """A .npy (version 1.0) header of exactly _NPY_HEADER_SIZE bytes."""
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': %r, }" % (
+        dtype,
+        shape,
+    )
+    header = header.ljust(_NPY_HEADER_SIZE - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode()